@@ -0,0 +1,672 @@
+"""Benchmarks des chemins chauds du dashboard : rafraîchissement, rendu des panneaux, animation, assets.
+
+Tourne sans écran (widgets et canvas factices) ou sous Xvfb avec --display pour
+mesurer les vrais widgets Tk. Les résultats sont écrits en JSON ; avec --baseline,
+le script échoue si un temps médian régresse de plus de --max-regression.
+
+    python bench.py --output bench.json
+    python bench.py --baseline bench.json --max-regression 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from datetime import datetime, timezone
+
+import httpx
+
+import dashboard
+from dashboard import (
+    AssetCache,
+    ConfettiAnimation,
+    DashboardApp,
+    FramebufferDashboard,
+    HttpConnections,
+    PanelFetcher,
+    PanelHistory,
+    RedashScraper,
+    RefreshScheduler,
+    Sparkline,
+    WidgetState,
+    load_logo_image,
+    load_panels,
+    open_sink,
+    percentile,
+    project_result,
+)
+
+# Les trois panneaux par défaut du dashboard, avec une clé API factice
+LAYOUT = load_panels(None)
+for _panel in LAYOUT["panels"]:
+    _panel["api_key"] = "bench"
+CFGS = LAYOUT["panels"]
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    return {
+        "n": len(samples_ms),
+        "p50_ms": percentile(samples_ms, 50),
+        "p95_ms": percentile(samples_ms, 95),
+        "max_ms": max(samples_ms) if samples_ms else 0.0,
+    }
+
+
+# ─────────────────────────────────────────────
+# Faux Redash
+# ─────────────────────────────────────────────
+
+class FakeRedash:
+    """Sert /api/queries/{id}/results.json via httpx.MockTransport, avec latence et taille réglables.
+
+    Le résultat change tous les `change_every` appels par requête ; entre deux,
+    la même réponse (même corps, même query_result) est renvoyée. Avec `chunk_size`,
+    le corps est livré par morceaux, comme depuis le réseau. `/api/dashboards/bench`
+    liste les requêtes de CFGS avec l'id de leur dernier résultat (lecture groupée).
+    """
+
+    def __init__(self, latency_ms: float = 50.0, rows: int = 1, extra_columns: int = 0, change_every: int = 1,
+                 chunk_size: int | None = None):
+        self.latency = latency_ms / 1000
+        self.chunk_size = chunk_size
+        self.rows = rows
+        self.extra_columns = extra_columns
+        self.change_every = max(1, change_every)
+        self.calls: dict[int, int] = {}
+        self.dashboard_calls = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self._bodies: dict[tuple, bytes] = {}
+
+    def payload(self, query_id: int, generation: int) -> bytes:
+        key = (query_id, generation)
+        if key not in self._bodies:
+            rng = random.Random(hash(key))
+            columns = ["EVOL", "CA", "AVG", "MAX_DATE"] + [f"COL_{i}" for i in range(self.extra_columns)]
+            rows = []
+            for _ in range(self.rows):
+                row = {"EVOL": rng.uniform(-30, 30), "CA": rng.uniform(1000, 50000),
+                       "AVG": rng.uniform(-10, 20), "MAX_DATE": "2024-07-10 15:31"}
+                for i in range(self.extra_columns):
+                    row[f"COL_{i}"] = rng.random()
+                rows.append(row)
+            body = {"query_result": {
+                "id": query_id * 100_000 + generation,
+                "data": {"columns": [{"name": c, "type": "float"} for c in columns], "rows": rows},
+                "retrieved_at": datetime.now(timezone.utc).isoformat(),
+            }}
+            self._bodies[key] = json.dumps(body).encode()
+        return self._bodies[key]
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.latency)
+        self.requests += 1
+        parts = request.url.path.split("/")
+        if parts[2] == "dashboards":
+            self.dashboard_calls += 1
+            generation = (self.dashboard_calls - 1) // self.change_every
+            body = json.dumps({"slug": parts[3], "widgets": [
+                {"visualization": {"query": {"id": c["id"], "latest_query_data_id": c["id"] * 100_000 + generation}}}
+                for c in CFGS
+            ]}).encode()
+            return httpx.Response(200, content=body, headers={"Content-Type": "application/json"})
+        query_id = int(parts[3])
+        if len(parts) == 6:
+            # /api/queries/{id}/results/{result_id}.json : résultat immuable
+            generation = int(parts[5].removesuffix(".json")) % 100_000
+        else:
+            count = self.calls[query_id] = self.calls.get(query_id, 0) + 1
+            generation = (count - 1) // self.change_every
+        body = self.payload(query_id, generation)
+        self.bytes_sent += len(body)
+        headers = {"Content-Type": "application/json", "Content-Length": str(len(body))}
+        if self.chunk_size:
+            return httpx.Response(200, content=self._chunks(body), headers=headers)
+        return httpx.Response(200, content=body, headers=headers)
+
+    async def _chunks(self, body: bytes):
+        for i in range(0, len(body), self.chunk_size):
+            yield body[i:i + self.chunk_size]
+
+    def install(self):
+        RedashScraper.connections = HttpConnections(transport=httpx.MockTransport(self.handler))
+
+
+# ─────────────────────────────────────────────
+# Rafraîchissement
+# ─────────────────────────────────────────────
+
+def check_chunk_boundaries() -> list[str]:
+    """Décodage en flux coupé à chaque position possible : même résultat qu'en un seul morceau.
+
+    Redash renvoie des flottants (runtime) et des exposants : un nombre coupé juste
+    après « . » ou « e » ne doit pas être lu comme sa partie entière.
+    """
+    # Écrit à la main : flottants, exposants signés ou non, hors des lignes (décodées d'un bloc)
+    payload = (
+        b'{"query_result": {"id": 12345, "retrieved_at": "2026-10-17T06:00:00+00:00", "runtime": 0.0123, '
+        b'"size": 1.5e-7, "scale": 2E+10, "ratio": -12.75e2, "data": {"columns": [{"name": "CA"}], '
+        b'"rows": [{"CA": 1.5e-7, "AVG": -12.75, "MAX_DATE": "2026-10-16 10:00", "N": 10, "X": 2E+10}, '
+        b'{"CA": 3.25, "AVG": 0.5}]}}}'
+    )
+    columns = ["CA", "AVG", "MAX_DATE", "N", "X"]
+
+    async def decode(parts: list[bytes]):
+        async def chunks():
+            for part in parts:
+                yield part
+        return await project_result(chunks(), columns)
+
+    async def run():
+        expected = await decode([payload])
+        failures = []
+        for cut in range(1, len(payload)):
+            try:
+                got = await decode([payload[:cut], payload[cut:]])
+            except ValueError as e:
+                got = f"{type(e).__name__}: {e}"
+            if got != expected:
+                failures.append(f"coupure à {cut} ({payload[cut - 3:cut]!r}|{payload[cut:cut + 3]!r}) : {got}")
+        return failures
+
+    return asyncio.run(run())
+
+
+def check_update_errors() -> list[str]:
+    """Un on_update qui lève (pipe du worker fermé) : erreur du panneau, le planificateur continue"""
+    fake = FakeRedash(latency_ms=0)
+    cfgs = [dict(c, interval=0.02, max_interval=0.02) for c in CFGS]
+    delivered, cycles = [], []
+
+    def on_update(idx, panel):
+        delivered.append(idx)
+        if len(delivered) <= len(cfgs):
+            raise BrokenPipeError("pipe fermé")
+
+    async def run():
+        fake.install()
+        scrapers = [RedashScraper(c["api_key"], "http://redash.bench") for c in cfgs]
+        scheduler = RefreshScheduler(PanelFetcher(scrapers, cfgs, on_update), cfgs, 1.0, cycles.append)
+        task = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(1.0)
+        failures = []
+        if task.done():
+            failures.append(f"planificateur arrêté : {task.exception()!r}")
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await RedashScraper.connections.aclose()
+        errors = sum(stats["error"] for stats in cycles)
+        if errors != len(cfgs):
+            failures.append(f"{errors} erreurs comptées pour {len(cfgs)} livraisons en échec")
+        if len(delivered) <= 2 * len(cfgs):
+            failures.append(f"plus de rafraîchissement après les erreurs ({len(delivered)} livraisons)")
+        return failures
+
+    # Les erreurs provoquées sont attendues : pas de log
+    level = dashboard.logger.level
+    dashboard.logger.setLevel("CRITICAL")
+    try:
+        return asyncio.run(run())
+    finally:
+        dashboard.logger.setLevel(level)
+
+
+def bench_decode(repeat: int, rows: int, extra_columns: int) -> dict:
+    """Décodage d'une réponse : corps entier (resp.json) contre flux projeté (project_result)"""
+    fake = FakeRedash(latency_ms=0, rows=rows, extra_columns=extra_columns, change_every=10**9, chunk_size=64 * 1024)
+    columns = ["CA", "AVG", "MAX_DATE"]
+
+    async def once(projected: bool) -> float:
+        scraper = RedashScraper("bench", "http://redash.bench")
+        t0 = time.perf_counter()
+        await scraper.execute_query(110, conditional=False, columns=columns if projected else None)
+        return (time.perf_counter() - t0) * 1000
+
+    async def run():
+        fake.install()
+        results = {}
+        for name, projected in (("full", False), ("stream", True)):
+            samples = [await once(projected) for _ in range(repeat)]
+            # Pic mémoire mesuré à part : tracemalloc ralentit les allocations
+            tracemalloc.start()
+            await once(projected)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[name] = {**summarize(samples), "peak_kb": peak / 1024}
+        await RedashScraper.connections.aclose()
+        return results
+
+    results = asyncio.run(run())
+    results["body_kb"] = len(fake.payload(110, 0)) / 1024
+    return results
+
+
+def bench_refresh(cycles: int, latency_ms: float, rows: int, extra_columns: int, change_every: int,
+                  batch: bool = False) -> dict:
+    fake = FakeRedash(latency_ms, rows, extra_columns, change_every)
+
+    async def run():
+        fake.install()
+        PanelFetcher.DASHBOARD = ("bench", "bench") if batch else None
+        # Cycles enchaînés sans pause : une lecture du dashboard par cycle
+        dashboard.RedashDashboardBatch.TTL = 0.0
+        scrapers = [RedashScraper(c["api_key"], "http://redash.bench") for c in CFGS]
+        updates = []
+        fetcher = PanelFetcher(scrapers, CFGS, lambda idx, panel: updates.append(idx))
+        durations = []
+        for _ in range(cycles):
+            stats = await fetcher.refresh(deadline=max(5.0, latency_ms / 100))
+            durations.append(stats["elapsed"] * 1000)
+        await RedashScraper.connections.aclose()
+        PanelFetcher.DASHBOARD = None
+        return durations, updates
+
+    durations, updates = asyncio.run(run())
+    return {
+        **summarize(durations),
+        "latency_ms": latency_ms,
+        "rows": rows,
+        "extra_columns": extra_columns,
+        "change_every": change_every,
+        "updates": len(updates),
+        "requests_per_cycle": fake.requests / cycles,
+        "bytes_per_cycle": fake.bytes_sent / cycles,
+    }
+
+
+# ─────────────────────────────────────────────
+# Rendu des panneaux
+# ─────────────────────────────────────────────
+
+class NullWidget:
+    def __init__(self):
+        self.configures = 0
+
+    def configure(self, **kwargs):
+        self.configures += 1
+
+    # Canvas de la courbe du jour
+    def winfo_width(self):
+        return 600
+
+    def winfo_height(self):
+        return DashboardApp.SPARKLINE_HEIGHT
+
+    def coords(self, *args, **kwargs):
+        pass
+
+    itemconfigure = insert = dchars = coords
+
+
+class NullAnimation:
+    def start_animation(self, *args, **kwargs):
+        pass
+
+    def stop_animation(self):
+        pass
+
+
+class HeadlessPanels:
+    """Hôte sans Tk pour DashboardApp._update_quad : widgets factices, after() ignoré"""
+
+    COLORS = DashboardApp.COLORS
+    _update_quad = DashboardApp._update_quad
+    _render_slot = DashboardApp._render_slot
+    _draw_sparkline = DashboardApp._draw_sparkline
+    _style = staticmethod(DashboardApp._style)
+    _fmt = staticmethod(DashboardApp._fmt)
+    _show_celebration_block = DashboardApp._show_celebration_block
+    _hide_celebration_block = DashboardApp._hide_celebration_block
+    _update_logo_background = DashboardApp._update_logo_background
+
+    def __init__(self):
+        self.panels = CFGS
+        self.units = {i: c["unit"] for i, c in enumerate(CFGS)}
+        self.last_gift = {i: 0 for i, c in enumerate(CFGS) if c.get("thresholds")}
+        self._theme_idx = next((i for i, c in enumerate(CFGS) if c.get("theme")), None)
+        self._values = {}
+        self._history = [PanelHistory(14 * 86400 // 5) for _ in CFGS]
+        self._sparklines = [Sparkline() for _ in CFGS]
+        self._last_max_dates = {}
+        self._last_ratios = {}
+        self.view = WidgetState()
+        self._render_count = 0
+        self.confetti_animation = NullAnimation()
+        self.logo_bg = NullWidget()
+        # Une seule page : l'emplacement i affiche le panneau i
+        self._slots = {}
+        for i, panel in enumerate(CFGS):
+            self._slots[i] = {name: NullWidget() for name in ("frame", "val", "title", "detail", "spark")}
+            self._slots[i].update(idx=i, line=1, line_color=None, drawn=None, layout=(panel["detail"], True))
+        self._visible = {i: i for i in range(len(CFGS))}
+
+    def after(self, ms, func=None, *args):
+        return None
+
+
+def bench_update_quad(updates: int, distinct_values: int, display: bool) -> dict:
+    if display:
+        app = _display_app()
+        flush = app.update_idletasks
+    else:
+        app = HeadlessPanels()
+        flush = lambda: None
+    rng = random.Random(1)
+    values = [(rng.uniform(-9, 9), rng.uniform(1000, 50000), rng.uniform(-9, 9)) for _ in range(distinct_values)]
+    samples = []
+    for n in range(updates):
+        evol, ca, avg = values[n % distinct_values]
+        idx = n % 3
+        t0 = time.perf_counter()
+        if idx == 0:
+            app._update_quad(0, evol, evol)
+        else:
+            app._update_quad(idx, ca, avg)
+        flush()
+        samples.append((time.perf_counter() - t0) * 1000)
+    result = {
+        **summarize(samples),
+        "updates_per_s": updates / (sum(samples) / 1000) if samples else 0.0,
+        "distinct_values": distinct_values,
+        "configure_applied": app.view.applied,
+        "configure_skipped": app.view.skipped,
+    }
+    if display:
+        app.destroy()
+    return result
+
+
+def _display_app():
+    FakeRedash(latency_ms=0).install()
+    state_dir = tempfile.mkdtemp(prefix="bench-state-")
+    app = DashboardApp("http://redash.bench", LAYOUT, state_file=os.path.join(state_dir, "state.json"))
+    app.scheduler.paused = True
+    app.update()
+    return app
+
+
+def bench_framebuffer(updates: int, size: tuple[int, int] = (1920, 1080)) -> dict:
+    """Rendu Pillow : image complète, puis un panneau modifié à la fois (zones modifiées seules)"""
+    tmp = tempfile.mkdtemp(prefix="bench-fb-")
+    sink = open_sink(os.path.join(tmp, "frame.raw"), size)
+    app = FramebufferDashboard("http://redash.bench", LAYOUT, sink, state_file=os.path.join(tmp, "state.json"))
+    t0 = time.perf_counter()
+    app.draw()
+    full_ms = (time.perf_counter() - t0) * 1000
+    rng = random.Random(1)
+    samples, regions, written = [], 0, 0
+    for n in range(updates):
+        # Les panneaux sans thème : seule leur zone change
+        idx = 1 + n % (len(CFGS) - 1)
+        app._on_panel_fetched(idx, {"value": rng.uniform(1000, 50000), "ratio": rng.uniform(-9, 9)})
+        t0 = time.perf_counter()
+        boxes = app.draw()
+        samples.append((time.perf_counter() - t0) * 1000)
+        regions += len(boxes)
+        written += sum((x1 - x0) * (y1 - y0) * 4 for x0, y0, x1, y1 in boxes)
+    t0 = time.perf_counter()
+    app.draw()
+    idle_ms = (time.perf_counter() - t0) * 1000
+    sink.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "full_frame_ms": full_ms,
+        "idle_frame_ms": idle_ms,
+        "panel_update": summarize(samples),
+        "regions_per_update": regions / updates if updates else 0.0,
+        "kb_per_update": written / 1024 / updates if updates else 0.0,
+        "kb_full_frame": size[0] * size[1] * 4 / 1024,
+    }
+
+
+# ─────────────────────────────────────────────
+# Animation
+# ─────────────────────────────────────────────
+
+class NoDrawCanvas:
+    """Canvas factice : mêmes appels que tk.Canvas, aucun dessin"""
+
+    def __init__(self, parent, width=1920, height=1080, **kwargs):
+        self.width = width
+        self.height = height
+        self.items = 0
+        self.calls = 0
+
+    def place(self, **kwargs):
+        pass
+
+    def bind(self, *args):
+        pass
+
+    def _create(self, *args, **kwargs):
+        self.items += 1
+        return self.items
+
+    create_polygon = create_rectangle = create_text = create_image = _create
+
+    def coords(self, *args):
+        self.calls += 1
+
+    def itemconfigure(self, *args, **kwargs):
+        self.calls += 1
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def destroy(self):
+        pass
+
+
+class HeadlessWindow:
+    def winfo_width(self):
+        return 1920
+
+    def winfo_height(self):
+        return 1080
+
+    def after(self, ms, func=None, *args):
+        return None
+
+
+def bench_animation(particle_counts: list[int], frames: int, display: bool, assets: AssetCache) -> dict:
+    results = {}
+    parent = _tk_root() if display else HeadlessWindow()
+    for count in particle_counts:
+        anim = ConfettiAnimation(parent, assets)
+        anim.PARTICLE_COUNT = count
+        # Qualité figée : on mesure le coût brut d'une frame, sans le gouverneur
+        anim.QUALITY_LEVELS = [(1.0, 1, 32)]
+        if not display:
+            anim.canvas_factory = NoDrawCanvas
+        anim.start_animation(positive=True, message="10% Atteint", threshold=10)
+        samples = []
+        for _ in range(frames):
+            if not anim.animation_running:
+                break
+            t0 = time.perf_counter()
+            anim._animate()
+            if display:
+                parent.update_idletasks()
+            samples.append((time.perf_counter() - t0) * 1000)
+        anim.stop_animation()
+        results[str(count)] = summarize(samples)
+    if display:
+        parent.destroy()
+    return results
+
+
+def _tk_root():
+    import tkinter as tk
+
+    root = tk.Tk()
+    root.geometry("1920x1080")
+    root.update()
+    return root
+
+
+# ─────────────────────────────────────────────
+# Assets
+# ─────────────────────────────────────────────
+
+def bench_assets(repeat: int, display: bool) -> dict:
+    """Chargement des assets par les chemins du dashboard, à froid puis depuis le cache disque.
+
+    GIF : AssetCache.frames, comme le préchargement et le rendu framebuffer (décodage,
+    redimensionnement, écriture du cache). Logo : load_logo_image, comme DashboardApp.load_logo.
+    """
+    gifs = sorted(p for p in os.listdir("gifts") if p.endswith(".gif"))
+    results = {}
+    cache_dir = tempfile.mkdtemp(prefix="bench-assets-")
+
+    def timed(load, cold: bool) -> dict:
+        samples = []
+        for _ in range(repeat):
+            if cold:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            assets = AssetCache(cache_dir)
+            t0 = time.perf_counter()
+            load(assets)
+            samples.append((time.perf_counter() - t0) * 1000)
+        return summarize(samples)
+
+    try:
+        for name in gifs:
+            path = os.path.join("gifts", name)
+
+            def load(assets, path=path):
+                return assets.frames(path, ConfettiAnimation.GIF_SIZE)
+
+            results[name] = {"decode": timed(load, cold=True), "disk_cache": timed(load, cold=False)}
+            if display:
+                root = _tk_root()
+                assets = AssetCache(cache_dir)
+                anim = ConfettiAnimation(root, assets)
+                t0 = time.perf_counter()
+                anim.load_gif(path)
+                first = (time.perf_counter() - t0) * 1000
+                t0 = time.perf_counter()
+                anim.load_gif(path)
+                results[name]["load_gif_first_ms"] = first
+                results[name]["load_gif_lru_ms"] = (time.perf_counter() - t0) * 1000
+                root.destroy()
+
+        if any(p.lower().endswith((".png", ".jpg", ".jpeg")) for p in os.listdir(".")):
+            results["logo"] = {"decode": timed(load_logo_image, cold=True),
+                               "disk_cache": timed(load_logo_image, cold=False)}
+            if display:
+                # Avec l'image CTk créée par la fenêtre, depuis le cache disque
+                root = _tk_root()
+                host = types.SimpleNamespace(assets=AssetCache(cache_dir), logo_image=None)
+                t0 = time.perf_counter()
+                DashboardApp.load_logo(host)
+                results["logo"]["load_logo_ms"] = (time.perf_counter() - t0) * 1000
+                root.destroy()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+
+# ─────────────────────────────────────────────
+# Comparaison et main
+# ─────────────────────────────────────────────
+
+def compare(results: dict, baseline: dict, max_regression: float, path: str = "") -> list[str]:
+    """Liste les p50 qui ont régressé de plus de `max_regression` par rapport à la référence"""
+    regressions = []
+    for key, value in results.items():
+        name = f"{path}.{key}" if path else key
+        ref = baseline.get(key)
+        if isinstance(value, dict) and isinstance(ref, dict):
+            regressions += compare(value, ref, max_regression, name)
+        elif key == "p50_ms" and isinstance(ref, (int, float)) and ref > 0:
+            if value > ref * (1 + max_regression):
+                regressions.append(f"{name}: {ref:.3f} ms -> {value:.3f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="fichier JSON de sortie (défaut : stdout)")
+    parser.add_argument("--baseline", help="résultats de référence à comparer")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="régression tolérée sur les p50 (0.25 = +25 %%)")
+    parser.add_argument("--display", action="store_true", help="mesurer les vrais widgets Tk (écran ou Xvfb requis)")
+    parser.add_argument("--quick", action="store_true", help="moins d'itérations, pour un contrôle rapide")
+    parser.add_argument("--latency", type=float, default=50.0, help="latence du faux Redash (ms)")
+    parser.add_argument("--rows", type=int, default=1000, help="lignes par résultat du faux Redash")
+    parser.add_argument("--columns", type=int, default=20, help="colonnes supplémentaires par ligne")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    dashboard.logger.setLevel("WARNING")
+    logging.getLogger("httpx").setLevel("WARNING")
+    scale = 0.2 if args.quick else 1.0
+    cycles = max(3, int(20 * scale))
+    asset_cache = AssetCache(tempfile.mkdtemp(prefix="bench-anim-"))
+    # Contrôle de correction avant toute mesure : un décodage faux rendrait les temps sans objet
+    failures = check_chunk_boundaries()
+    for line in failures[:10]:
+        print(f"DÉCODAGE {line}", file=sys.stderr)
+    update_failures = check_update_errors()
+    for line in update_failures:
+        print(f"PLANIFICATEUR {line}", file=sys.stderr)
+    if failures or update_failures:
+        sys.exit(1)
+
+    results = {
+        "refresh_changed": bench_refresh(cycles, args.latency, args.rows, args.columns, change_every=1),
+        "refresh_unchanged": bench_refresh(cycles, args.latency, args.rows, args.columns, change_every=cycles),
+        "refresh_batch_changed": bench_refresh(cycles, args.latency, args.rows, args.columns, change_every=1,
+                                               batch=True),
+        "refresh_batch_unchanged": bench_refresh(cycles, args.latency, args.rows, args.columns,
+                                                 change_every=cycles, batch=True),
+        "decode": bench_decode(max(3, int(20 * scale)), args.rows, args.columns),
+        "update_quad_changed": bench_update_quad(int(3000 * scale), 3000, args.display),
+        "update_quad_repeated": bench_update_quad(int(3000 * scale), 3, args.display),
+        "framebuffer": bench_framebuffer(max(5, int(100 * scale))),
+        "animation": bench_animation([40, 200, 1000], int(200 * scale), args.display, asset_cache),
+        "assets": bench_assets(max(1, int(5 * scale)), args.display),
+    }
+    shutil.rmtree(asset_cache.cache_dir, ignore_errors=True)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "display": args.display,
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get("results", {}), args.max_regression)
+        for line in regressions:
+            print(f"RÉGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,43 @@
-import customtkinter as ctk
+import time
+# Origine de --profile-startup : tout ce qui suit compte dans la phase « imports »
+_PROCESS_T0 = time.perf_counter()
+try:
+    import customtkinter as ctk
+    import tkinter as tk
+except ImportError:
+    # Pi OS Lite, sans Tk : seul le rendu framebuffer (--framebuffer) est disponible
+    ctk = tk = None
+import argparse
 import asyncio
-import httpx
 import threading
 import logging
+import logging.handlers
 import os
-import time
+import queue
+import atexit
 import math
 import random
 import platform
 import glob
+import re
+import codecs
+import functools
+import hashlib
+import importlib.util
+import json
+import struct
+import sys
+import tempfile
+import shutil
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from PIL import Image, ImageTk, ImageDraw
-import tkinter as tk
+
+# httpx et Pillow ne servent qu'après le premier affichage : importés à la demande
+if TYPE_CHECKING:
+    import httpx
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,6 +46,7 @@ logger = logging.getLogger(__name__)
 # Helpers
 # ─────────────────────────────────────────────
 
+@functools.lru_cache(maxsize=64)
 def lighten(hex_color: str, factor: float = 0.7) -> str:
     hex_color = hex_color.lstrip("#")
     r, g, b = (int(hex_color[i : i + 2], 16) for i in (0, 2, 4))
@@ -29,6 +55,7 @@ def lighten(hex_color: str, factor: float = 0.7) -> str:
     b = int(b + (255 - b) * factor)
     return f"#{r:02x}{g:02x}{b:02x}"
 
+@functools.lru_cache(maxsize=64)
 def darken(hex_color: str, factor: float = 0.3) -> str:
     hex_color = hex_color.lstrip("#")
     r, g, b = (int(hex_color[i : i + 2], 16) for i in (0, 2, 4))
@@ -43,55 +70,2197 @@ def ceil_signed(x: float) -> int:
 def format_evolution(x: float) -> float:
     return x
 
-def get_dynamic_titles(max_dates=None):
-    now = datetime.now()
-    
-    # Formater la date du bloc 1 si disponible
-    bloc1_date = "N/A"
-    if max_dates and 1 in max_dates:
+# Couleur d'un bloc selon le signe de l'évolution de référence
+STYLE_COLORS = {"positive": "#00C853", "negative": "#FF1744", "neutral": "#9E9E9E"}
+
+def panel_style(r: float) -> tuple[str, str]:
+    if r > 0:
+        return STYLE_COLORS["positive"], "↗"
+    if r < 0:
+        return STYLE_COLORS["negative"], "↘"
+    return STYLE_COLORS["neutral"], "→"
+
+def format_amount(num: float, unit: str) -> str:
+    if unit == "€":
+        return f"{ceil_signed(num):,}€".replace(",", " ")
+    return f"{ceil_signed(num)}{unit}"
+
+def threshold_crossed(ratio: float, step: float, last: int) -> int | None:
+    """Palier (multiple signé de step) franchi au-delà du dernier célébré, sinon None"""
+    if ratio >= step or ratio <= -step:
+        current = int(ratio // step) * step
+        if (current > last) if ratio > 0 else (current < last):
+            return current
+    return None
+
+def percentile(values, q: float) -> float:
+    """Percentile (0-100) par rang le plus proche ; 0 si la série est vide"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def format_title(template: str, max_date: str | None = None) -> str:
+    # Les titres ne changent qu'à la minute : mis en cache par (modèle, minute, MAX_DATE)
+    now = datetime.now().replace(second=0, microsecond=0)
+    return _format_title(template, now, max_date)
+
+@functools.lru_cache(maxsize=256)
+def _format_title(template: str, now: datetime, max_date: str | None) -> str:
+    """Remplace {max_date} (MAX_DATE du panneau, sinon il y a un an) et {now}"""
+    if "{max_date}" in template:
         try:
             # Convertir "2024-07-10 15:31" en "10/07/2024 à 15h31"
-            max_date_str = max_dates[1]
-            parsed_date = datetime.strptime(max_date_str, "%Y-%m-%d %H:%M")
-            bloc1_date = parsed_date.strftime("%d/%m/%Y à %Hh%M")
-        except Exception:
-            bloc1_date = (now - timedelta(days=365)).strftime('%d/%m/%Y à %Hh%M')
-    else:
-        bloc1_date = (now - timedelta(days=365)).strftime('%d/%m/%Y à %Hh%M')
-    
-    titles = {
-        0: "Évolution",
-        1: f"CA {bloc1_date}",
-        2: f"CA {now.strftime('%d/%m/%Y')} à {now.strftime('%Hh%M')}"
-    }
-    return titles
+            bloc_date = datetime.strptime(max_date, "%Y-%m-%d %H:%M").strftime("%d/%m/%Y à %Hh%M")
+        except (TypeError, ValueError):
+            bloc_date = (now - timedelta(days=365)).strftime('%d/%m/%Y à %Hh%M')
+        template = template.replace("{max_date}", bloc_date)
+    if "{now}" in template:
+        template = template.replace("{now}", f"{now.strftime('%d/%m/%Y')} à {now.strftime('%Hh%M')}")
+    return template
+
+# ─────────────────────────────────────────────
+# Logging (file d'attente et écriture en tâche de fond)
+# ─────────────────────────────────────────────
+
+class LogThrottle(logging.Filter):
+    """Laisse passer `burst` messages semblables par fenêtre de `interval` secondes, compte les autres.
+
+    Deux messages sont semblables s'ils viennent du même logger, au même niveau et avec
+    le même texte ou le même modèle (`logger.info("Query %s en %.2fs", ...)` pour toutes
+    les requêtes). À la fin de la fenêtre, une seule ligne résume les messages écartés.
+    """
+
+    def __init__(self, burst: int = 5, interval: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.dropped = 0  # perdus faute de place dans la file
+        self._lock = threading.Lock()
+        # clé -> [début de la fenêtre, messages émis, messages écartés, dernier écarté]
+        self._windows: dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or (window[2] == 0 and record.created - window[0] >= self.interval):
+                self._windows[key] = [record.created, 1, 0, None]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            window[3] = record
+            return False
+
+    def summaries(self, now: float, flush: bool = False) -> list[logging.LogRecord]:
+        """Ferme les fenêtres échues (toutes avec `flush`) ; retourne un résumé pour celles qui ont écarté des messages"""
+        records = []
+        with self._lock:
+            for key, (start, _, skipped, last) in list(self._windows.items()):
+                if now - start < self.interval and not flush:
+                    continue
+                del self._windows[key]
+                if skipped:
+                    summary = logging.makeLogRecord(dict(
+                        last.__dict__, args=None, exc_info=None, exc_text=None,
+                        msg=f"{last.getMessage()} (+{skipped} messages semblables en {now - start:.0f}s)",
+                    ))
+                    records.append(summary)
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            records.append(logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": f"Journal saturé : {dropped} messages perdus",
+            }))
+        return records
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """Dépose les messages dans une file bornée sans jamais bloquer l'appelant (Tk ou asyncio)"""
+
+    def __init__(self, log_queue: queue.Queue, throttle: LogThrottle):
+        super().__init__(log_queue)
+        self.throttle = throttle
+        self.addFilter(throttle)
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.throttle.dropped += 1
+
+class LogWriter(logging.handlers.QueueListener):
+    """Écrit les messages de la file depuis un thread dédié et publie les résumés de LogThrottle"""
+
+    # Réglages passés à setup_logging, repris par le processus de données (--worker)
+    OPTIONS: dict | None = None
+    # Période de publication des résumés, même si la file reste vide
+    TICK = 1.0
+
+    def __init__(self, log_queue: queue.Queue, throttle: LogThrottle, *handlers: logging.Handler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.throttle = throttle
+        self._next_summary = 0.0
+
+    def dequeue(self, block: bool):
+        while True:
+            now = time.time()
+            if now >= self._next_summary:
+                self._next_summary = now + self.TICK
+                for record in self.throttle.summaries(now):
+                    self.handle(record)
+            try:
+                return self.queue.get(block, timeout=self.TICK)
+            except queue.Empty:
+                if not block:
+                    raise
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # bloquant : la file peut être pleine à l'arrêt
+
+    def stop(self):
+        super().stop()
+        # Résumés des fenêtres en cours, sinon perdus à l'arrêt
+        for record in self.throttle.summaries(time.time(), flush=True):
+            self.handle(record)
+
+def setup_logging(debug: bool = False, burst: int = 5, interval: float = 60.0,
+                  queue_size: int = 10000) -> LogWriter:
+    """Fait passer tous les logs par une file : les threads Tk et asyncio n'écrivent plus eux-mêmes.
+
+    Les handlers déjà installés (stderr par défaut, donc journald sous systemd) sont
+    appelés par le thread de LogWriter. Sans `debug`, les messages DEBUG et le log
+    par requête de httpx (qui contient l'URL, donc la clé API) ne sont pas produits.
+    """
+    root = logging.getLogger()
+    handlers = root.handlers[:] or [logging.StreamHandler()]
+    for handler in handlers:
+        root.removeHandler(handler)
+    throttle = LogThrottle(burst, interval)
+    root.addHandler(LogQueueHandler(queue.Queue(queue_size), throttle))
+    root.setLevel(logging.DEBUG if debug else logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.INFO if debug else logging.WARNING)
+    # Même en debug, le détail des couches basses (sockets, trames PNG) noierait le reste
+    for name in ("httpcore", "hpack", "PIL"):
+        logging.getLogger(name).setLevel(logging.INFO)
+    writer = LogWriter(root.handlers[0].queue, throttle, *handlers)
+    writer.start()
+    atexit.register(writer.stop)
+    LogWriter.OPTIONS = {"debug": debug, "burst": burst, "interval": interval, "queue_size": queue_size}
+    return writer
+
+# ─────────────────────────────────────────────
+# Metrics
+# ─────────────────────────────────────────────
+
+class MetricsRegistry:
+    """Compteurs et histogrammes en mémoire, exposés au format texte Prometheus.
+
+    Les mesures sont enregistrées en permanence (coût négligeable) ; le serveur HTTP
+    n'est démarré que si METRICS_PORT est défini. Les collecteurs enregistrés sont
+    appelés à chaque scrape pour publier des valeurs lues à la demande : jauges, ou
+    compteurs tenus par un autre objet (publiés tels quels, toujours croissants).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: dict[str, tuple[str, str, tuple]] = {}  # nom -> (type, aide, buckets)
+        self._values: dict[str, dict[tuple, object]] = {}
+        self._collectors = []
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: tuple = ()):
+        self._meta[name] = (kind, help_text, tuple(buckets))
+        self._values.setdefault(name, {})
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        buckets = self._meta[name][2]
+        with self._lock:
+            series = self._values[name]
+            hist = series.get(key)
+            if hist is None:
+                # compteurs par bucket, puis somme et nombre d'observations
+                hist = series[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def register_collector(self, collector):
+        """`collector()` retourne une liste de (nom, valeur, labels) pour des métriques décrites"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                for name, value, labels in collector():
+                    self.set(name, value, **labels)
+            except Exception as e:
+                logger.warning(f"Collecteur de métriques en erreur: {e}")
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in self._meta.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in self._values[name].items():
+                    if kind == "histogram":
+                        for bound, count in zip(buckets, value):
+                            lines.append(f"{name}_bucket{self._labels(key + (('le', repr(bound)),))} {count}")
+                        lines.append(f"{name}_bucket{self._labels(key + (('le', '+Inf'),))} {value[-1]}")
+                        lines.append(f"{name}_sum{self._labels(key)} {value[-2]}")
+                        lines.append(f"{name}_count{self._labels(key)} {value[-1]}")
+                    else:
+                        lines.append(f"{name}{self._labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(key: tuple) -> str:
+        if not key:
+            return ""
+        pairs = []
+        for k, v in key:
+            v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{k}="{v}"')
+        return "{" + ",".join(pairs) + "}"
+
+    async def serve(self, host: str, port: int):
+        """Sert GET /metrics ; à lancer dans la boucle asyncio"""
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+                while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                    pass
+                parts = request_line.decode("latin-1").split()
+                if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                    status, body = "200 OK", self.render().encode()
+                else:
+                    status, body = "404 Not Found", b"not found\n"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+            except Exception:
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        logger.info(f"Métriques Prometheus sur http://{host}:{port}/metrics")
+        return server
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+FRAME_BUCKETS = (0.002, 0.004, 0.008, 0.016, 0.032, 0.064, 0.128)
+
+METRICS = MetricsRegistry()
+METRICS.describe("redash_query_duration_seconds", "histogram", "Durée des appels Redash par requête", LATENCY_BUCKETS)
+METRICS.describe("redash_query_errors_total", "counter", "Appels Redash en erreur par requête")
+METRICS.describe("redash_query_bytes_total", "counter", "Octets reçus de Redash par requête")
+METRICS.describe("redash_dashboard_requests_total", "counter", "Lectures groupées du dashboard Redash par statut")
+METRICS.describe("redash_result_cache_total", "counter", "Lectures du cache de résultats paramétrés (hit, miss, coalesced)")
+METRICS.describe("redash_query_results_total", "counter", "Résultats par requête et statut (updated, unchanged, empty, error)")
+METRICS.describe("refresh_cycle_seconds", "histogram", "Durée de bout en bout des cycles de rafraîchissement", LATENCY_BUCKETS)
+METRICS.describe("asyncio_loop_lag_seconds", "histogram", "Retard de la boucle asyncio de fond", LAG_BUCKETS)
+METRICS.describe("tk_stall_seconds", "histogram", "Retard du battement de la boucle Tk", LAG_BUCKETS)
+METRICS.describe("animation_frame_seconds", "histogram", "Temps de calcul d'une frame de célébration", FRAME_BUCKETS)
+METRICS.describe("framebuffer_frame_seconds", "histogram", "Rendu et écriture d'une frame framebuffer", FRAME_BUCKETS)
+METRICS.describe("framebuffer_bytes_total", "counter", "Octets écrits vers le framebuffer ou le fichier de sortie")
+METRICS.describe("animation_dropped_frames_total", "counter", "Frames de célébration perdues")
+METRICS.describe("ui_configure_total", "counter", "Appels configure des panneaux, appliqués ou évités")
+METRICS.describe("ui_bus_depth", "gauge", "Mises à jour de l'interface en attente")
+METRICS.describe("ui_bus_max_depth", "gauge", "Plus grand nombre de mises à jour en attente observé")
+METRICS.describe("ui_bus_updates_total", "counter", "Mises à jour postées, et remplacées par une plus récente avant affichage")
+METRICS.describe("ui_bus_batches_total", "counter", "Lots de mises à jour appliqués par le thread Tk")
+METRICS.describe("panel_history_bytes", "gauge", "Mémoire occupée par l'historique des panneaux")
+METRICS.describe("worker_restarts_total", "counter", "Relances du processus de données")
+METRICS.describe("http_requests_total", "counter", "Requêtes HTTP envoyées par le client partagé")
+METRICS.describe("http_connections_opened_total", "counter", "Connexions TCP ouvertes par le client partagé")
+METRICS.describe("http_tls_handshakes_total", "counter", "Négociations TLS du client partagé")
+
+async def monitor_loop_lag(interval: float = 0.5):
+    """Mesure en continu le retard de réveil de la boucle asyncio courante"""
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        METRICS.observe("asyncio_loop_lag_seconds", max(0.0, loop.time() - t0 - interval))
+
+class StartupProfile:
+    """Chronologie du démarrage, phase par phase, depuis le début des imports"""
+
+    def __init__(self, t0: float = _PROCESS_T0):
+        self.t0 = t0
+        self._last = t0
+        self.phases: list[tuple[str, float, float]] = []  # (phase, durée, cumul) en secondes
+
+    def mark(self, phase: str):
+        """Clôt la phase en cours sous le nom donné"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last, now - self.t0))
+        self._last = now
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def report(self) -> str:
+        lines = [f"{'phase':<28}{'durée':>12}{'cumul':>12}"]
+        for phase, duration, total in self.phases:
+            lines.append(f"{phase:<28}{duration * 1000:>10.1f}ms{total * 1000:>10.1f}ms")
+        return "\n".join(lines)
 
 # ─────────────────────────────────────────────
 # Data layer
 # ─────────────────────────────────────────────
 
+# Renvoyé par execute_query quand le résultat Redash n'a pas changé depuis l'appel précédent
+NOT_MODIFIED = object()
+
+class JsonStream:
+    """Lecture pas à pas d'un document JSON reçu par morceaux.
+
+    Seules les valeurs demandées sont construites (json.raw_decode, en C) ; le
+    tampon ne garde que la partie non encore lue, la mémoire reste donc bornée par
+    la plus grosse valeur lue d'un coup (une ligne de résultat), pas par le document.
+    """
+
+    _DECODER = json.JSONDecoder()
+    # Caractères qui peuvent encore prolonger un nombre décodé en fin de tampon
+    _NUMBER_CHARS = frozenset("0123456789.eE+-")
+    # Suite d'objets « plats » (sans objet ni tableau imbriqué) séparés par des virgules :
+    # les lignes Redash, sautées en un seul appel C sans rien construire
+    _FLAT_OBJECTS = re.compile(r'(?:\s*,\s*\{(?:[^{}\[\]"]++|"(?:[^"\\]++|\\.)*+")*+\})*+')
+
+    def __init__(self, chunks):
+        self._chunks = chunks.__aiter__()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    async def _fill(self):
+        try:
+            chunk = self._utf8.decode(await self._chunks.__anext__())
+        except StopAsyncIteration:
+            chunk = self._utf8.decode(b"", final=True)
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    async def peek(self) -> str:
+        """Prochain caractère significatif, sans le consommer"""
+        while True:
+            self.pos = json.decoder.WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                raise ValueError("JSON tronqué")
+            await self._fill()
+
+    async def expect(self, char: str):
+        found = await self.peek()
+        if found != char:
+            raise ValueError(f"JSON inattendu : {found!r} au lieu de {char!r}")
+        self.pos += 1
+
+    async def value(self):
+        """Décode la valeur suivante en entier"""
+        await self.peek()
+        while True:
+            try:
+                value, end = self._DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # Un nombre coupé en fin de tampon se décode sans erreur, y compris juste
+                # avant « . », « e » ou un signe d'exposant (« 0. » + « 0123 » donnerait 0) :
+                # on attend la suite
+                if self.eof or not self._maybe_cut(value, end):
+                    self.pos = end
+                    return value
+            await self._fill()
+
+    def _maybe_cut(self, value, end: int) -> bool:
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return False
+        return end == len(self.buf) or self.buf[end] in self._NUMBER_CHARS
+
+    async def members(self):
+        """Parcourt un objet : produit chaque clé, l'appelant doit lire ou sauter la valeur"""
+        await self.expect("{")
+        if await self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = await self.value()
+            await self.expect(":")
+            yield key
+            char = await self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"JSON inattendu : {char!r} dans un objet")
+
+    async def rows(self, max_rows: int, columns):
+        """Lit un tableau de lignes : garde les `max_rows` premières, réduites à `columns`.
+
+        Appelée sur le '[' ; s'arrête après la dernière ligne gardée, avant ',' ou ']'
+        (skip_rest() saute alors le reste), ou après le ']' si le tableau est plus court.
+        """
+        await self.expect("[")
+        rows = []
+        if await self.peek() == "]":
+            self.pos += 1
+            return rows
+        while True:
+            row = await self.value()
+            rows.append({c: row[c] for c in columns if c in row} if isinstance(row, dict) else row)
+            if len(rows) >= max_rows:
+                return rows
+            char = await self.peek()
+            self.pos += 1
+            if char == "]":
+                return rows
+            if char != ",":
+                raise ValueError(f"JSON inattendu : {char!r} dans un tableau")
+
+    async def skip_rest(self):
+        """Saute les éléments restants d'un tableau, ']' compris"""
+        while True:
+            self.pos = self._FLAT_OBJECTS.match(self.buf, self.pos).end()
+            char = await self.peek()
+            if char == "]":
+                self.pos += 1
+                return
+            if char != ",":
+                raise ValueError(f"JSON inattendu : {char!r} dans un tableau")
+            # Élément coupé en fin de tampon ou non plat : décodé normalement
+            self.pos += 1
+            await self.value()
+
+async def project_result(chunks, columns, max_rows: int = 1, known_result_id=None):
+    """Décode une réponse Redash en ne gardant que `max_rows` lignes et les colonnes demandées.
+
+    Renvoie un dict de même forme que la réponse complète (query_result.id,
+    retrieved_at, data.rows, ou job), ou NOT_MODIFIED dès que query_result.id vaut
+    `known_result_id` : un query_result Redash ne change jamais, la suite est inutile.
+    Les autres lignes et les métadonnées de colonnes sont lues puis aussitôt jetées ;
+    la lecture s'arrête dès que tout ce qui est attendu a été vu.
+    """
+    stream = JsonStream(chunks)
+    result = {}
+    async for key in stream.members():
+        if key == "job":
+            result["job"] = await stream.value()
+        elif key == "query_result" and await stream.peek() == "{":
+            query_result = result["query_result"] = {}
+            async for field in stream.members():
+                if field in ("id", "retrieved_at"):
+                    query_result[field] = await stream.value()
+                    if field == "id" and known_result_id is not None and query_result["id"] == known_result_id:
+                        return NOT_MODIFIED
+                elif field == "data" and await stream.peek() == "{":
+                    data = query_result["data"] = {}
+                    async for name in stream.members():
+                        if name != "rows":
+                            await stream.value()
+                            continue
+                        data["rows"] = await stream.rows(max_rows, columns)
+                        if len(data["rows"]) >= max_rows:
+                            # id et retrieved_at déjà vus : inutile de lire les lignes suivantes
+                            if "id" in query_result and "retrieved_at" in query_result:
+                                return result
+                            await stream.skip_rest()
+                else:
+                    await stream.value()
+                if "data" in query_result and "id" in query_result and "retrieved_at" in query_result:
+                    return result
+        else:
+            await stream.value()
+    return result
+
+class HttpConnections:
+    """Client HTTP partagé par tous les panneaux, propriété de la boucle asyncio.
+
+    Le pool est borné et les connexions restent ouvertes `keepalive_expiry` secondes ;
+    avec le paquet h2, HTTP/2 multiplexe toutes les requêtes sur une seule connexion.
+    httpx annonce gzip/deflate, et br si le paquet brotli est installé. Les ouvertures
+    de connexion et négociations TLS sont comptées (trace httpcore) pour suivre le
+    taux de réutilisation.
+    """
+
+    # Résumé dans les logs toutes les N requêtes
+    LOG_EVERY = 500
+
+    def __init__(self, max_connections: int = 6, max_keepalive: int | None = None,
+                 keepalive_expiry: float = 60.0, connect_timeout: float = 5.0, read_timeout: float = 10.0,
+                 pool_timeout: float = 10.0, http2: bool | None = None, transport=None):
+        self.max_connections = max_connections
+        self.max_keepalive = max_connections if max_keepalive is None else max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_timeout = pool_timeout
+        # None : HTTP/2 si le paquet h2 est installé
+        has_h2 = importlib.util.find_spec("h2") is not None
+        if http2 and not has_h2:
+            logger.warning("HTTP/2 demandé mais le paquet h2 est absent (pip install httpx[http2]) : HTTP/1.1")
+        self.http2 = has_h2 if http2 is None else bool(http2) and has_h2
+        self.transport = transport
+        self._client: "httpx.AsyncClient | None" = None
+        self.requests = 0
+        self.connections = 0
+        self.handshakes = 0
+
+    def client(self) -> "httpx.AsyncClient":
+        """Client partagé, créé au premier appel ; à n'utiliser que dans la boucle asyncio"""
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_keepalive,
+                                    keepalive_expiry=self.keepalive_expiry),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout, pool=self.pool_timeout),
+                transport=self.transport,
+                event_hooks={"request": [self._on_request]},
+            )
+            logger.info(
+                f"Client HTTP : {self.max_connections} connexions max, keep-alive {self.keepalive_expiry:.0f}s, "
+                f"{'HTTP/2' if self.http2 else 'HTTP/1.1'}, Accept-Encoding: {self._client.headers.get('Accept-Encoding')}"
+            )
+        return self._client
+
+    async def _on_request(self, request):
+        self.requests += 1
+        METRICS.inc("http_requests_total")
+        request.extensions["trace"] = self._trace
+        if self.requests % self.LOG_EVERY == 0:
+            logger.info(f"HTTP : {self.requests} requêtes, {self.connections} connexions ouvertes, "
+                        f"{self.handshakes} négociations TLS (réutilisation {self.reuse_ratio():.0%})")
+
+    async def _trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            self.connections += 1
+            METRICS.inc("http_connections_opened_total")
+        elif event == "connection.start_tls.complete":
+            self.handshakes += 1
+            METRICS.inc("http_tls_handshakes_total")
+
+    def reuse_ratio(self) -> float:
+        """Part des requêtes servies sans ouvrir de nouvelle connexion"""
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1 - self.connections / self.requests)
+
+    async def aclose(self):
+        """Ferme les connexions ; le prochain client() en rouvrira"""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+            logger.info(f"Client HTTP fermé ({self.requests} requêtes, réutilisation {self.reuse_ratio():.0%})")
+
 class RedashScraper:
-    _client: httpx.AsyncClient | None = None
+    # Remplaçable avant le premier appel (main, bench)
+    connections = HttpConnections()
+    _poller: "RedashJobPoller | None" = None
     def __init__(self, api_key: str, base_url: str):
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
-        if RedashScraper._client is None:
-            RedashScraper._client = httpx.AsyncClient(timeout=10.0)
-        self.client = RedashScraper._client
+        # Par requête (et jeu de paramètres) : ETag, Last-Modified, empreinte du corps, id et retrieved_at
+        self._validators: dict[int | tuple, dict] = {}
 
-    async def execute_query(self, query_id: int) -> dict:
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        return RedashScraper.connections.client()
+
+    # Réponse lue en partie : vidée si le reste est plus petit, sinon la connexion est abandonnée
+    DRAIN_LIMIT = 256 * 1024
+
+    async def execute_query(self, query_id: int, conditional: bool = True, max_age: int | None = None,
+                            columns: list[str] | None = None, parameters: dict | None = None):
+        """Retourne le JSON de résultats, ou NOT_MODIFIED si rien n'a changé depuis le dernier appel.
+
+        La requête est conditionnelle (If-None-Match / If-Modified-Since) quand le serveur
+        a fourni des validateurs ; à défaut, un corps identique au précédent n'est pas décodé.
+        Avec `max_age`, Redash exécute la requête si son cache est plus vieux que `max_age`
+        secondes et le job est suivi par le RedashJobPoller partagé.
+        Avec `columns`, la réponse est décodée au fil de l'eau (project_result) : seule la
+        première ligne, réduite à ces colonnes, est construite.
+        Avec `parameters`, la requête paramétrée passe toujours par un job (POST), le
+        résultat de chaque jeu de paramètres étant suivi séparément.
+        """
+        if parameters is not None:
+            key = (query_id, normalize_parameters(parameters))
+            previous = self._validators.get(key) if conditional else None
+            return await self._execute_job(query_id, -1 if max_age is None else max_age, previous, columns,
+                                           parameters, key)
+        previous = self._validators.get(query_id) if conditional else None
+        if max_age is not None:
+            return await self._execute_job(query_id, max_age, previous, columns)
         url = f"{self.base_url}/api/queries/{query_id}/results.json"
-        resp = await self.client.get(url, params={"api_key": self.api_key})
+        headers = {}
+        if previous:
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+        if columns is not None:
+            data, resp = await self._get_projected("GET", url, query_id, columns, previous, headers=headers)
+            validators = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+            if data is NOT_MODIFIED:
+                if previous:
+                    self._validators[query_id] = {**previous, **validators}
+                return NOT_MODIFIED
+            return self._remember_result(query_id, data, validators, previous)
+        resp = await self.client.get(url, params={"api_key": self.api_key}, headers=headers)
+        METRICS.inc("redash_query_bytes_total", len(resp.content), query=str(query_id))
+        if resp.status_code == 304 and previous:
+            return NOT_MODIFIED
+        resp.raise_for_status()
+
+        digest = hashlib.blake2b(resp.content, digest_size=16).digest()
+        validators = {
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "digest": digest,
+        }
+        if previous and previous.get("digest") == digest:
+            self._validators[query_id] = {**previous, **validators}
+            return NOT_MODIFIED
+        return self._remember_result(query_id, resp.json(), validators, previous)
+
+    async def _get_projected(self, method: str, url: str, query_id: int, columns: list[str],
+                             previous: dict | None, **kwargs):
+        """Envoie la requête et décode la réponse en flux ; retourne (données ou NOT_MODIFIED, réponse)"""
+        async with self.client.stream(method, url, params={"api_key": self.api_key}, **kwargs) as resp:
+            if resp.status_code == 304 and previous:
+                data = NOT_MODIFIED
+            else:
+                if resp.is_error:
+                    await resp.aread()
+                    resp.raise_for_status()
+                chunks = resp.aiter_bytes()
+                data = await project_result(chunks, columns,
+                                            known_result_id=previous.get("result_id") if previous else None)
+                # En HTTP/1.1, une réponse non lue jusqu'au bout ferme la connexion : petit reste vidé
+                remaining = int(resp.headers.get("Content-Length", -1)) - resp.num_bytes_downloaded
+                if resp.http_version != "HTTP/2" and 0 < remaining <= self.DRAIN_LIMIT:
+                    async for _ in chunks:
+                        pass
+        METRICS.inc("redash_query_bytes_total", resp.num_bytes_downloaded, query=str(query_id))
+        return data, resp
+
+    async def _execute_job(self, query_id: int, max_age: int, previous: dict | None, columns: list[str] | None = None,
+                           parameters: dict | None = None, key: int | tuple | None = None):
+        """Demande un résultat d'au plus `max_age` secondes ; Redash relance la requête si besoin."""
+        url = f"{self.base_url}/api/queries/{query_id}/results"
+        body = {"max_age": max_age}
+        if parameters is not None:
+            body["parameters"] = parameters
+        if columns is not None:
+            data, _ = await self._get_projected("POST", url, query_id, columns, previous, json=body)
+            if data is NOT_MODIFIED:
+                return NOT_MODIFIED
+        else:
+            resp = await self.client.post(url, params={"api_key": self.api_key}, json=body)
+            METRICS.inc("redash_query_bytes_total", len(resp.content), query=str(query_id))
+            resp.raise_for_status()
+            data = resp.json()
+        if "job" in data:
+            if RedashScraper._poller is None:
+                RedashScraper._poller = RedashJobPoller(RedashScraper.connections)
+            result_id = await RedashScraper._poller.wait(self.base_url, self.api_key, data["job"]["id"])
+            if previous and previous.get("result_id") == result_id:
+                return NOT_MODIFIED
+            data = await self._get_result(query_id, result_id, columns)
+        return self._remember_result(query_id if key is None else key, data, {}, previous)
+
+    async def fetch_result(self, query_id: int, result_id: int, columns: list[str] | None = None):
+        """Résultat `result_id` de la requête (lecture groupée) ; NOT_MODIFIED, sans appel, si c'est le dernier lu"""
+        previous = self._validators.get(query_id)
+        if previous and previous.get("result_id") == result_id:
+            return NOT_MODIFIED
+        data = await self._get_result(query_id, result_id, columns)
+        return self._remember_result(query_id, data, {}, previous)
+
+    async def _get_result(self, query_id: int, result_id: int, columns: list[str] | None):
+        """Un query_result par son id : immuable, jamais conditionnel"""
+        result_url = f"{self.base_url}/api/queries/{query_id}/results/{result_id}.json"
+        if columns is not None:
+            data, _ = await self._get_projected("GET", result_url, query_id, columns, None)
+            return data
+        resp = await self.client.get(result_url, params={"api_key": self.api_key})
+        METRICS.inc("redash_query_bytes_total", len(resp.content), query=str(query_id))
         resp.raise_for_status()
         return resp.json()
 
+    def _remember_result(self, key: int | tuple, data: dict, validators: dict, previous: dict | None):
+        query_result = data.get("query_result", {})
+        validators["result_id"] = query_result.get("id")
+        validators["retrieved_at"] = query_result.get("retrieved_at")
+        self._validators[key] = validators
+        if (
+            previous
+            and validators["result_id"] is not None
+            and (previous.get("result_id"), previous.get("retrieved_at"))
+            == (validators["result_id"], validators["retrieved_at"])
+        ):
+            return NOT_MODIFIED
+        return data
+
+class RedashJobPoller:
+    """Suit tous les jobs Redash en attente depuis une seule boucle de polling.
+
+    Chaque job a son propre délai, qui s'allonge à chaque statut encore en cours ;
+    la boucle dort jusqu'au prochain job à interroger et s'arrête quand il n'y en a plus.
+    """
+
+    # Statuts de /api/jobs/{id}
+    PENDING, STARTED, SUCCESS, FAILURE, CANCELLED = 1, 2, 3, 4, 5
+
+    def __init__(self, connections: HttpConnections, min_delay: float = 0.5, max_delay: float = 5.0,
+                 factor: float = 1.6, timeout: float = 120.0):
+        self.connections = connections
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.timeout = timeout
+        self._jobs: dict[str, dict] = {}
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+
+    def wait(self, base_url: str, api_key: str, job_id: str) -> asyncio.Future:
+        """Retourne un futur résolu avec le query_result_id du job une fois terminé."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            now = time.monotonic()
+            job = {
+                "url": f"{base_url}/api/jobs/{job_id}",
+                "api_key": api_key,
+                "future": asyncio.get_running_loop().create_future(),
+                "delay": self.min_delay,
+                "due": now + self.min_delay,
+                "deadline": now + self.timeout,
+            }
+            self._jobs[job_id] = job
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+        # shield : un appelant qui abandonne n'annule pas le job pour les autres
+        return asyncio.shield(job["future"])
+
+    async def _run(self):
+        while self._jobs:
+            now = time.monotonic()
+            due = [job_id for job_id, job in self._jobs.items() if job["due"] <= now]
+            if not due:
+                next_due = min(job["due"] for job in self._jobs.values())
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=next_due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await asyncio.gather(*(self._poll(job_id) for job_id in due))
+
+    async def _poll(self, job_id: str):
+        job = self._jobs[job_id]
+        future = job["future"]
+        try:
+            resp = await self.connections.client().get(job["url"], params={"api_key": job["api_key"]})
+            resp.raise_for_status()
+            info = resp.json().get("job", {})
+            status = info.get("status")
+            if status == self.SUCCESS:
+                future.set_result(info.get("query_result_id"))
+            elif status in (self.FAILURE, self.CANCELLED):
+                future.set_exception(RuntimeError(f"Job Redash {job_id} en échec : {info.get('error') or status}"))
+            elif time.monotonic() > job["deadline"]:
+                future.set_exception(TimeoutError(f"Job Redash {job_id} toujours en cours après {self.timeout:.0f}s"))
+        except Exception as e:
+            future.set_exception(e)
+        if future.done():
+            del self._jobs[job_id]
+        else:
+            job["delay"] = min(job["delay"] * self.factor, self.max_delay)
+            job["due"] = time.monotonic() + job["delay"]
+
+class RedashDashboardBatch:
+    """Lit en un appel `/api/dashboards/{slug}` le dernier query_result de chaque requête du dashboard.
+
+    Redash y donne, pour chaque widget, l'id du dernier résultat de sa requête
+    (`latest_query_data_id`). Une seule lecture sert tous les panneaux d'un cycle ;
+    seuls les résultats dont l'id a changé sont ensuite téléchargés. Les panneaux
+    absents du dashboard restent interrogés un par un.
+    """
+
+    # Durée (s) pendant laquelle une lecture, réussie ou non, sert les panneaux suivants
+    TTL = 2.0
+
+    def __init__(self, base_url: str, slug: str, api_key: str):
+        self.url = f"{base_url.rstrip('/')}/api/dashboards/{slug}"
+        self.slug = slug
+        self.api_key = api_key
+        self._task: asyncio.Task | None = None
+        self._fetched_at = 0.0
+        self._missing: set[int] = set()
+
+    async def result_id(self, query_id: int) -> int | None:
+        """Id du dernier résultat de la requête, ou None si elle n'est pas sur le dashboard"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or (self._task.done() and loop.time() - self._fetched_at > self.TTL):
+            self._task = asyncio.ensure_future(self._fetch())
+        # shield : un panneau annulé (échéance du cycle) n'annule pas la lecture des autres
+        result_ids = await asyncio.shield(self._task)
+        result_id = result_ids.get(query_id)
+        if result_id is None and query_id not in self._missing:
+            self._missing.add(query_id)
+            logger.warning(f"Requête {query_id} absente du dashboard {self.slug} : lue séparément")
+        return result_id
+
+    async def _fetch(self) -> dict[int, int]:
+        try:
+            resp = await RedashScraper.connections.client().get(self.url, params={"api_key": self.api_key})
+            resp.raise_for_status()
+            result_ids = {}
+            for widget in resp.json().get("widgets", []):
+                # Les widgets texte n'ont pas de visualisation
+                query = (widget.get("visualization") or {}).get("query") or {}
+                if query.get("id") is not None and query.get("latest_query_data_id") is not None:
+                    result_ids[query["id"]] = query["latest_query_data_id"]
+            METRICS.inc("redash_dashboard_requests_total", status="ok")
+            return result_ids
+        except Exception as e:
+            METRICS.inc("redash_dashboard_requests_total", status="error")
+            logger.warning(f"Dashboard {self.slug} illisible ({e}) : panneaux lus séparément")
+            raise
+        finally:
+            self._fetched_at = asyncio.get_running_loop().time()
+
+def normalize_parameters(parameters: dict | None) -> str:
+    """Forme canonique d'un jeu de paramètres Redash : clés triées, valeurs en texte.
+
+    {"store": 12} et {"store": "12"} donnent la même clé, comme pour Redash.
+    """
+    def norm(value):
+        if isinstance(value, dict):
+            return {str(k): norm(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [norm(v) for v in value]
+        return str(value)
+    return json.dumps(norm(parameters or {}), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+class ResultCache:
+    """Résultats Redash partagés entre panneaux, par (requête, paramètres normalisés).
+
+    Une entrée sert pendant `ttl` secondes ; au-delà de `max_entries`, la moins
+    récemment utilisée est évincée. Les appels concurrents pour une clé absente
+    attendent la même requête HTTP (single-flight). Les hits, misses et appels
+    regroupés sont comptés dans `redash_result_cache_total`.
+    """
+
+    # Résumé dans les logs toutes les N lectures
+    LOG_EVERY = 500
+
+    def __init__(self, ttl: float = 10.0, max_entries: int = 64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # clé -> (expiration en time.monotonic(), données), du moins au plus récemment utilisé
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self.hits = self.misses = self.coalesced = 0
+
+    @staticmethod
+    def key(query_id: int, parameters: dict | None) -> tuple:
+        return (query_id, normalize_parameters(parameters))
+
+    async def get(self, key: tuple, fetch):
+        """Données de la clé ; `fetch(conditional)` est appelé au plus une fois à la fois par clé.
+
+        `conditional` est faux quand l'entrée a été évincée : le scraper ne doit pas
+        répondre NOT_MODIFIED pour un résultat que le cache n'a plus.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._count("hit")
+            return entry[1]
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            self._count("miss")
+            task = self._inflight[key] = asyncio.ensure_future(self._load(key, fetch, entry))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            self._count("coalesced")
+        # shield : un panneau qui abandonne n'annule pas la requête des autres
+        return await asyncio.shield(task)
+
+    async def _load(self, key: tuple, fetch, entry):
+        data = await fetch(entry is not None)
+        if data is NOT_MODIFIED:
+            data = entry[1]
+        self._entries[key] = (time.monotonic() + self.ttl, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return data
+
+    def _count(self, result: str):
+        METRICS.inc("redash_result_cache_total", result=result)
+        total = self.hits + self.misses + self.coalesced
+        if total % self.LOG_EVERY == 0:
+            logger.info(f"Cache de résultats : {total} lectures, {self.hits / total:.0%} servies du cache, "
+                        f"{self.coalesced} regroupées, {len(self._entries)} entrées")
+
+class ResponseRecorder:
+    """Enregistre les réponses Redash reçues par le PanelFetcher, une ligne JSON horodatée par appel.
+
+    Le fichier (REDASH_RECORD) sert de scénario à `soak.py replay`. Une réponse
+    inchangée est notée `"data": null`, une erreur par son message. Les paramètres
+    d'une requête paramétrée sont notés à côté de son id : chaque jeu se rejoue à part.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, query_id: int, data=None, error: Exception | None = None, parameters: dict | None = None):
+        line = {"t": time.time(), "query": query_id}
+        if parameters is not None:
+            line["parameters"] = parameters
+        line["data"] = None if data is NOT_MODIFIED else data
+        if error is not None:
+            # Pas le message complet : l'URL des erreurs httpx contient la clé API
+            response = getattr(error, "response", None)
+            line["error"] = f"HTTP {response.status_code}" if response is not None else type(error).__name__
+        # Réponses projetées : quelques centaines d'octets, écrites au fil de l'eau
+        self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.records += 1
+
+class PanelFetcher:
+    """Interroge les requêtes Redash de tous les panneaux en parallèle.
+
+    Une seule requête par panneau est en vol à la fois : un cycle qui démarre
+    alors que le précédent n'est pas terminé se greffe sur les requêtes en cours
+    au lieu d'en relancer de nouvelles. Chaque requête livre son résultat via
+    `on_update` dès qu'elle aboutit, même après l'échéance du cycle.
+    """
+
+    # Décodage en flux des seules colonnes utiles (REDASH_DECODE=full pour décoder les réponses entières)
+    STREAM_DECODE = True
+    # (slug, clé API utilisateur) : lecture groupée via RedashDashboardBatch (REDASH_DASHBOARD)
+    DASHBOARD: tuple[str, str] | None = None
+    # Fichier JSONL où enregistrer les réponses pour soak.py (REDASH_RECORD)
+    RECORD_PATH: str | None = None
+    # Cache des requêtes paramétrées : durée de vie (s) et nombre d'entrées (REDASH_CACHE_TTL, REDASH_CACHE_SIZE)
+    RESULT_TTL = 10.0
+    RESULT_CACHE_SIZE = 64
+    # Réglages ci-dessus, faits par main() et repris par le processus de données (--worker)
+    OPTIONS = ("STREAM_DECODE", "DASHBOARD", "RECORD_PATH", "RESULT_TTL", "RESULT_CACHE_SIZE")
+
+    def __init__(self, scrapers: list[RedashScraper], cfgs: list[dict], on_update):
+        self.scrapers = scrapers
+        self.queries = [c["id"] for c in cfgs]
+        self.parameters = [c.get("parameters") for c in cfgs]
+        self.mappings = [c["mapping"] for c in cfgs]
+        # max_age : None pour lire le dernier résultat en cache, sinon exécution via job
+        self.max_ages = [c.get("max_age") for c in cfgs]
+        # MAX_DATE sert au titre des blocs dont le modèle contient {max_date}
+        self.columns = [list(dict.fromkeys([*c["mapping"].values(), "MAX_DATE"])) for c in cfgs]
+        # Panneaux paramétrés : un résultat par (requête, paramètres), partagé par tous les panneaux
+        # qui l'affichent, donc décodé avec l'union de leurs colonnes
+        self.results = ResultCache(self.RESULT_TTL, self.RESULT_CACHE_SIZE)
+        self._shared_columns: dict[tuple, list[str]] = {}
+        for idx, params in enumerate(self.parameters):
+            if params is not None:
+                key = ResultCache.key(self.queries[idx], params)
+                self._shared_columns[key] = list(dict.fromkeys([*self._shared_columns.get(key, []),
+                                                                *self.columns[idx]]))
+        self._seen_results: dict[int, tuple] = {}
+        self.on_update = on_update
+        self.batch = RedashDashboardBatch(scrapers[0].base_url, *self.DASHBOARD) if self.DASHBOARD and scrapers else None
+        self.recorder = ResponseRecorder(self.RECORD_PATH) if self.RECORD_PATH else None
+        self._inflight: dict[int, asyncio.Task] = {}
+        # Dernier retrieved_at Redash et dernière erreur de chaque panneau (pour le RefreshScheduler)
+        self.retrieved_at: dict[int, str] = {}
+        self.last_error: dict[int, Exception] = {}
+
+    async def _fetch_one(self, idx: int) -> str:
+        """Récupère un panneau ; retourne "updated", "unchanged", "empty" ou "error"."""
+        status = await self._fetch_panel(idx)
+        METRICS.inc("redash_query_results_total", query=str(self.queries[idx]), status=status)
+        return status
+
+    async def _fetch_panel(self, idx: int) -> str:
+        qid, mp = self.queries[idx], self.mappings[idx]
+        t0 = time.perf_counter()
+        try:
+            columns = self.columns[idx] if self.STREAM_DECODE else None
+            try:
+                data = await self._query(idx, columns)
+            except Exception as e:
+                if self.recorder:
+                    self.recorder.record(qid, error=e, parameters=self.parameters[idx])
+                raise
+            if self.recorder:
+                self.recorder.record(qid, data, parameters=self.parameters[idx])
+            duration = time.perf_counter() - t0
+            METRICS.observe("redash_query_duration_seconds", duration, query=str(qid))
+            logger.debug("Query %s en %.2fs", qid, duration)
+            self.last_error.pop(idx, None)
+            if data is NOT_MODIFIED:
+                return "unchanged"
+            query_result = data.get("query_result", {})
+            if query_result.get("retrieved_at"):
+                self.retrieved_at[idx] = query_result["retrieved_at"]
+            rows = query_result.get("data", {}).get("rows", [])
+            if not rows:
+                return "empty"
+            row = rows[0]
+            panel = {
+                "value": float(row.get(mp["value"], 0)),
+                "ratio": float(row.get(mp["ratio"], 0)),
+                # MAX_DATE sert au titre du bloc CA année dernière
+                "max_date": row.get("MAX_DATE"),
+            }
+        except Exception as e:
+            logger.error(f"Erreur query {qid}: {e}")
+            METRICS.inc("redash_query_errors_total", query=str(qid))
+            self.last_error[idx] = e
+            return "error"
+        logger.debug("Query %s: value=%s, ratio=%s", qid, panel["value"], panel["ratio"])
+        try:
+            self.on_update(idx, panel)
+        except Exception as e:
+            # Ex. pipe vers le processus parent fermé (--worker) : compté comme une erreur du
+            # panneau, pour que l'exception ne remonte pas jusqu'au RefreshScheduler et ne l'arrête pas
+            logger.error(f"Erreur à la livraison du panneau {qid}: {e!r}")
+            METRICS.inc("redash_query_errors_total", query=str(qid))
+            self.last_error[idx] = e
+            return "error"
+        return "updated"
+
+    async def _query(self, idx: int, columns: list[str] | None):
+        """Lecture groupée via le dashboard si possible, sinon requête par requête"""
+        scr, qid, max_age = self.scrapers[idx], self.queries[idx], self.max_ages[idx]
+        if self.parameters[idx] is not None:
+            return await self._query_parameterized(idx, columns)
+        # Avec max_age, la requête doit être exécutée : pas de lecture groupée
+        if self.batch is not None and max_age is None:
+            try:
+                result_id = await self.batch.result_id(qid)
+            except Exception:
+                result_id = None  # déjà logué par le batch
+            if result_id is not None:
+                return await scr.fetch_result(qid, result_id, columns)
+        return await scr.execute_query(qid, max_age=max_age, columns=columns)
+
+    async def _query_parameterized(self, idx: int, columns: list[str] | None):
+        """Résultat partagé via le ResultCache ; NOT_MODIFIED si ce panneau l'a déjà affiché"""
+        scr, qid, params = self.scrapers[idx], self.queries[idx], self.parameters[idx]
+        key = ResultCache.key(qid, params)
+        data = await self.results.get(key, lambda conditional: scr.execute_query(
+            qid, conditional=conditional, max_age=self.max_ages[idx],
+            columns=self._shared_columns[key] if columns is not None else None, parameters=params))
+        query_result = data.get("query_result", {})
+        seen = (query_result.get("id"), query_result.get("retrieved_at"))
+        if seen[0] is not None and self._seen_results.get(idx) == seen:
+            return NOT_MODIFIED
+        self._seen_results[idx] = seen
+        return data
+
+    def _task_for(self, idx: int) -> asyncio.Task:
+        task = self._inflight.get(idx)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._fetch_one(idx))
+            self._inflight[idx] = task
+        return task
+
+    async def refresh(self, deadline: float, indices=None) -> dict:
+        """Lance un cycle et attend au plus `deadline` secondes ; retourne ses statistiques."""
+        t0 = time.perf_counter()
+        if indices is None:
+            indices = range(len(self.queries))
+        tasks = {self._task_for(idx): idx for idx in indices}
+        stats = {"updated": 0, "unchanged": 0, "empty": 0, "error": 0, "statuses": {}}
+        pending = set(tasks)
+        while pending:
+            remaining = t0 + deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                status = task.result()
+                stats[status] += 1
+                stats["statuses"][tasks[task]] = status
+        # Les requêtes hors délai continuent en tâche de fond : le cycle suivant s'y greffera
+        stats["late"] = len(pending)
+        stats["elapsed"] = time.perf_counter() - t0
+        METRICS.observe("refresh_cycle_seconds", stats["elapsed"])
+        logger.info(
+            "Cycle de rafraîchissement en %.2fs (%d/%d panneaux mis à jour, %d inchangés, %d erreurs, %d hors délai)",
+            stats["elapsed"], stats["updated"], len(tasks), stats["unchanged"], stats["error"], stats["late"],
+        )
+        return stats
+
+class RefreshScheduler:
+    """Planifie le rafraîchissement de chaque panneau selon son propre intervalle.
+
+    Tant que le résultat Redash ne change pas, l'intervalle s'allonge jusqu'à
+    `max_interval` ; dès que les `retrieved_at` successifs révèlent la cadence de
+    Redash, le prochain appel est calé juste après le rafraîchissement attendu.
+    En cas d'erreur, recul exponentiel avec jitter, en respectant Retry-After.
+    Les panneaux hors de la page affichée sont interrogés BACKGROUND_FACTOR fois
+    moins souvent, sauf ceux marqués `pinned` (thème, célébrations).
+    """
+
+    STRETCH = 1.5
+    MAX_BACKOFF = 300.0
+    # Marge (s) après le prochain rafraîchissement Redash attendu
+    ALIGN_SLACK = 2.0
+    BACKGROUND_FACTOR = 6.0
+
+    def __init__(self, fetcher: PanelFetcher, cfgs: list[dict], deadline: float, on_cycle=None):
+        self.fetcher = fetcher
+        self.deadline = deadline
+        self.on_cycle = on_cycle
+        self.paused = False
+        self._wakeup: asyncio.Event | None = None
+        now = time.monotonic()
+        self._state = []
+        for c in cfgs:
+            base = float(c.get("interval", 5))
+            self._state.append({
+                "base": base,
+                "max": float(c.get("max_interval", base)),
+                "interval": base,
+                "due": now,
+                "errors": 0,
+                "retrieved_at": None,
+                "period": None,
+                "visible": True,
+                "pinned": bool(c.get("pinned")),
+                "fetched_at": None,
+            })
+
+    def trigger(self, indices=None):
+        """Rend les panneaux dus immédiatement ; à appeler dans la boucle asyncio."""
+        now = time.monotonic()
+        for idx in range(len(self._state)) if indices is None else indices:
+            self._state[idx]["due"] = now
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def set_visible(self, indices):
+        """Déclare la page affichée ; à appeler dans la boucle asyncio.
+
+        Un panneau qui redevient visible avec une valeur plus vieille que son
+        intervalle de base est rafraîchi tout de suite.
+        """
+        visible = set(indices)
+        now = time.monotonic()
+        stale = []
+        for idx, st in enumerate(self._state):
+            was_visible = st["visible"]
+            st["visible"] = st["pinned"] or idx in visible
+            if st["visible"] and not was_visible and (st["fetched_at"] is None or now - st["fetched_at"] > st["base"]):
+                stale.append(idx)
+        if stale:
+            self.trigger(stale)
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            now = time.monotonic()
+            due = [] if self.paused else [i for i, st in enumerate(self._state) if st["due"] <= now]
+            if not due:
+                timeout = None if self.paused else min(st["due"] for st in self._state) - now
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            stats = await self.fetcher.refresh(self.deadline, due)
+            for idx in due:
+                # Une requête hors délai reste en vol : le prochain passage s'y greffera
+                self._reschedule(idx, stats["statuses"].get(idx, "late"))
+            if self.on_cycle:
+                try:
+                    self.on_cycle(stats)
+                except Exception as e:
+                    logger.error(f"Erreur à la livraison du cycle: {e!r}")
+
+    def _reschedule(self, idx: int, status: str):
+        st = self._state[idx]
+        if status == "error":
+            st["errors"] += 1
+            delay = min(st["base"] * 2 ** st["errors"], self.MAX_BACKOFF) * random.uniform(0.5, 1.5)
+            delay = max(delay, self._retry_after(self.fetcher.last_error.get(idx)))
+        else:
+            st["errors"] = 0
+            if status == "updated":
+                st["interval"] = st["base"]
+            elif status == "unchanged":
+                st["interval"] = min(st["interval"] * self.STRETCH, st["max"])
+            delay = st["interval"]
+            aligned = self._aligned_delay(idx)
+            if aligned is not None:
+                delay = min(max(aligned, st["base"]), st["max"])
+            st["fetched_at"] = time.monotonic()
+            if not st["visible"]:
+                delay *= self.BACKGROUND_FACTOR
+        st["due"] = time.monotonic() + delay
+
+    def _aligned_delay(self, idx: int) -> float | None:
+        """Délai jusqu'au prochain rafraîchissement Redash attendu, si sa cadence est connue."""
+        st = self._state[idx]
+        raw = self.fetcher.retrieved_at.get(idx)
+        if not raw:
+            return None
+        try:
+            retrieved_at = datetime.fromisoformat(raw).timestamp()
+        except ValueError:
+            return None
+        if st["retrieved_at"] is not None and retrieved_at > st["retrieved_at"]:
+            st["period"] = retrieved_at - st["retrieved_at"]
+        st["retrieved_at"] = retrieved_at
+        if not st["period"]:
+            return None
+        remaining = retrieved_at + st["period"] + self.ALIGN_SLACK - time.time()
+        # Rafraîchissement attendu déjà passé : Redash est en retard, on garde l'étirement
+        return remaining if remaining > 0 else None
+
+    @staticmethod
+    def _retry_after(exc: Exception | None) -> float:
+        import httpx
+        if isinstance(exc, httpx.HTTPStatusError):
+            try:
+                return float(exc.response.headers.get("Retry-After", 0))
+            except ValueError:
+                return 0.0
+        return 0.0
+
+# ─────────────────────────────────────────────
+# Broadcast (démon partagé et écrans abonnés)
+# ─────────────────────────────────────────────
+
+class PanelBroadcaster:
+    """Diffuse les valeurs des panneaux en Server-Sent Events à tous les écrans abonnés.
+
+    Un seul processus interroge Redash ; chaque écran reçoit à la connexion la
+    dernière valeur de chaque panneau, puis chaque mise à jour au même moment.
+    Les panneaux sont désignés par panel_key() : l'ordre des panneaux peut
+    différer d'un écran à l'autre.
+    """
+
+    KEEPALIVE = 15.0
+    # Un abonné qui accumule plus d'événements en retard est déconnecté (il se reconnectera)
+    MAX_BACKLOG = 100
+
+    def __init__(self, keys: list):
+        self.keys = keys
+        self._clients: dict[asyncio.Queue, asyncio.StreamWriter] = {}
+        self._last: dict[int | str, dict] = {}
+
+    def publish(self, idx: int, panel: dict):
+        """À appeler dans la boucle asyncio du démon"""
+        key = self.keys[idx]
+        event = {"key": key, **panel, "fetched_at": time.time()}
+        self._last[key] = event
+        self._send("panel", event)
+
+    def publish_cycle(self, stats: dict):
+        self._send("cycle", {k: v for k, v in stats.items() if k != "statuses"})
+
+    def _send(self, event: str, data: dict):
+        for client_queue, writer in list(self._clients.items()):
+            try:
+                client_queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                del self._clients[client_queue]
+                writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self._handle, host, port)
+        logger.info(f"Diffusion des panneaux sur http://{host}:{port}/events")
+        return server
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client_queue: asyncio.Queue = asyncio.Queue(self.MAX_BACKLOG)
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?")[0] if len(parts) >= 2 else ""
+            if path == "/panels":
+                body = json.dumps(list(self._last.values())).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                return
+            if path != "/events":
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+                return
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n"
+            )
+            for event in list(self._last.values()):
+                writer.write(self._format("panel", event))
+            await writer.drain()
+            self._clients[client_queue] = writer
+            logger.info(f"Écran abonné ({len(self._clients)} au total)")
+            while True:
+                try:
+                    item = await asyncio.wait_for(client_queue.get(), timeout=self.KEEPALIVE)
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                else:
+                    writer.write(self._format(*item))
+                await writer.drain()
+        except Exception:
+            pass
+        finally:
+            if self._clients.pop(client_queue, None) is not None:
+                logger.info(f"Écran désabonné ({len(self._clients)} restants)")
+            writer.close()
+
+    @staticmethod
+    def _format(event: str, data: dict) -> bytes:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+class PanelSubscriber:
+    """Reçoit les panneaux d'un PanelBroadcaster au lieu d'interroger Redash.
+
+    Même interface de rappel que PanelFetcher : `on_update(idx, panel)` à chaque
+    panneau reçu, `on_cycle(stats)` à chaque fin de cycle du démon. La clé de
+    panneau reçue est ramenée à l'index local ; un panneau absent de la
+    configuration de l'écran est ignoré. Reconnexion automatique avec recul exponentiel.
+    """
+
+    def __init__(self, url: str, keys: list, on_update, on_cycle=None):
+        self.url = url
+        self._index = {key: idx for idx, key in enumerate(keys)}
+        self.on_update = on_update
+        self.on_cycle = on_cycle
+
+    async def run(self):
+        import httpx
+        delay = 1.0
+        while True:
+            try:
+                # Le démon envoie un ping toutes les 15 s : un silence plus long = connexion morte
+                timeout = httpx.Timeout(10.0, read=3 * PanelBroadcaster.KEEPALIVE)
+                async with httpx.AsyncClient(timeout=timeout) as client:
+                    async with client.stream("GET", self.url, headers={"Accept": "text/event-stream"}) as resp:
+                        resp.raise_for_status()
+                        logger.info(f"Abonné au démon {self.url}")
+                        delay = 1.0
+                        event, data = "message", []
+                        async for line in resp.aiter_lines():
+                            if line:
+                                if not line.startswith(":"):
+                                    field, _, value = line.partition(":")
+                                    value = value[1:] if value.startswith(" ") else value
+                                    if field == "event":
+                                        event = value
+                                    elif field == "data":
+                                        data.append(value)
+                                continue
+                            if data:
+                                self._dispatch(event, json.loads("\n".join(data)))
+                            event, data = "message", []
+                logger.warning(f"Flux {self.url} fermé par le démon")
+            except Exception as e:
+                logger.warning(f"Abonnement à {self.url} interrompu: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def _dispatch(self, event: str, data: dict):
+        if event == "panel":
+            idx = self._index.get(data.pop("key", None))
+            if idx is None:
+                return  # panneau que cet écran n'affiche pas
+            self.on_update(idx, data)
+        elif event == "cycle" and self.on_cycle:
+            self.on_cycle(data)
+
+async def serve_panels(base_url: str, cfgs: list[dict], host: str, port: int, deadline: float,
+                       metrics_port: int | None = None, metrics_host: str = "127.0.0.1",
+                       hours: "BusinessHours | None" = None):
+    """Mode démon : seule la couche données tourne, les panneaux sont diffusés aux écrans"""
+    broadcaster = PanelBroadcaster([panel_key(c) for c in cfgs])
+    scrapers = [RedashScraper(c["api_key"], base_url) for c in cfgs]
+    fetcher = PanelFetcher(scrapers, cfgs, broadcaster.publish)
+    scheduler = RefreshScheduler(fetcher, cfgs, deadline, broadcaster.publish_cycle)
+    await broadcaster.serve(host, port)
+    if metrics_port:
+        await METRICS.serve(metrics_host, metrics_port)
+    asyncio.ensure_future(monitor_loop_lag())
+    if hours:
+        asyncio.ensure_future(follow_business_hours(hours, scheduler))
+    try:
+        await scheduler.run()
+    finally:
+        await RedashScraper.connections.aclose()
+
+# ─────────────────────────────────────────────
+# Worker (couche données dans un processus fils)
+# ─────────────────────────────────────────────
+
+def run_worker(conn, base_url: str, cfgs: list[dict], deadline: float, connections: HttpConnections,
+               fetch_options: dict, paused: bool = False, visible: list[int] | None = None,
+               log_options: dict | None = None):
+    """Point d'entrée du processus de données : mêmes scrapers et planificateur, résultats par le pipe"""
+    if log_options is not None:
+        setup_logging(**log_options)
+    try:
+        asyncio.run(_worker_main(conn, base_url, cfgs, deadline, connections, fetch_options, paused, visible))
+    except KeyboardInterrupt:
+        pass
+
+async def _worker_main(conn, base_url, cfgs, deadline, connections, fetch_options, paused, visible):
+    # Réglages de PanelFetcher faits par main() dans le parent (PanelFetcher.OPTIONS)
+    RedashScraper.connections = connections
+    for name, value in fetch_options.items():
+        setattr(PanelFetcher, name, value)
+    loop = asyncio.get_running_loop()
+    scrapers = [RedashScraper(c["api_key"], base_url) for c in cfgs]
+    # Messages compacts : des tuples de quelques nombres, pas les JSON Redash
+    fetcher = PanelFetcher(scrapers, cfgs, lambda idx, panel: conn.send(
+        ("panel", idx, panel["value"], panel["ratio"], panel.get("max_date"))))
+    scheduler = RefreshScheduler(fetcher, cfgs, deadline, lambda stats: conn.send(
+        ("cycle", {k: v for k, v in stats.items() if k != "statuses"})))
+    # Un fils relancé reprend la page affichée et la pause en cours dès son premier cycle
+    scheduler.paused = paused
+    if visible is not None:
+        scheduler.set_visible(visible)
+    stopped = loop.create_future()
+
+    def on_command():
+        try:
+            command, arg = conn.recv()
+        except (EOFError, OSError):
+            command, arg = "stop", None  # processus parent disparu
+        if command == "visible":
+            scheduler.set_visible(arg)
+        elif command == "paused":
+            scheduler.paused = arg
+            if arg:
+                # Pause (veille, mode test) : pas de connexions gardées ouvertes pour rien
+                asyncio.ensure_future(connections.aclose())
+            else:
+                scheduler.trigger()
+        elif command == "trigger":
+            scheduler.trigger(arg)
+        elif command == "stop" and not stopped.done():
+            stopped.set_result(None)
+
+    loop.add_reader(conn.fileno(), on_command)
+    task = asyncio.ensure_future(scheduler.run())
+    try:
+        await stopped
+    finally:
+        loop.remove_reader(conn.fileno())
+        task.cancel()
+        await connections.aclose()
+
+class PanelWorker:
+    """Fait tourner la couche données (Redash, décodage, mapping) dans un processus fils.
+
+    Le GIL du processus Tk reste aux animations et aux redessins ; seules les valeurs
+    décodées reviennent par un pipe. Le fils est relancé s'il s'arrête, avec un recul
+    exponentiel, et l'écran garde les dernières valeurs en attendant. Même interface
+    que RefreshScheduler pour DashboardApp : run(), trigger(), set_visible(), paused.
+    """
+
+    RESTART_MIN = 1.0
+    RESTART_MAX = 60.0
+    # Un fils qui a tenu plus longtemps est considéré stable : le recul repart du minimum
+    STABLE_AFTER = 60.0
+
+    def __init__(self, base_url: str, cfgs: list[dict], deadline: float, on_update, on_cycle=None):
+        self.base_url = base_url
+        self.cfgs = cfgs
+        self.deadline = deadline
+        self.on_update = on_update
+        self.on_cycle = on_cycle
+        self.restarts = 0
+        self._paused = False
+        self._visible = None
+        self._conn = None
+        self._process = None
+        self._closing = False
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @paused.setter
+    def paused(self, value: bool):
+        self._paused = value
+        self._send("paused", value)
+
+    def set_visible(self, indices):
+        self._visible = list(indices)
+        self._send("visible", self._visible)
+
+    def trigger(self, indices=None):
+        self._send("trigger", None if indices is None else list(indices))
+
+    def _send(self, command: str, arg):
+        """À appeler dans la boucle asyncio ; ignoré tant que le fils redémarre"""
+        if self._conn is None:
+            return
+        try:
+            self._conn.send((command, arg))
+        except (OSError, ValueError):
+            pass
+
+    async def run(self):
+        import multiprocessing
+        # spawn : un fork hériterait de la connexion X et de l'état Tk du parent
+        ctx = multiprocessing.get_context("spawn")
+        loop = asyncio.get_running_loop()
+        delay = self.RESTART_MIN
+        while not self._closing:
+            conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=run_worker, name="dashboard-worker", daemon=True,
+                args=(child_conn, self.base_url, self.cfgs, self.deadline, RedashScraper.connections,
+                      {name: getattr(PanelFetcher, name) for name in PanelFetcher.OPTIONS},
+                      self._paused, self._visible, LogWriter.OPTIONS),
+            )
+            process.start()
+            child_conn.close()
+            self._conn, self._process = conn, process
+            logger.info(f"Processus de données démarré (pid {process.pid})")
+            started = time.monotonic()
+            await self._receive(loop, conn)
+            self._conn = None
+            await loop.run_in_executor(None, process.join, 5)
+            conn.close()
+            if self._closing:
+                break
+            self.restarts += 1
+            METRICS.inc("worker_restarts_total")
+            if time.monotonic() - started > self.STABLE_AFTER:
+                delay = self.RESTART_MIN
+            logger.error(f"Processus de données arrêté (code {process.exitcode}) : relance dans {delay:.1f}s, "
+                         f"dernières valeurs conservées à l'écran")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.RESTART_MAX)
+
+    async def _receive(self, loop, conn):
+        """Relaie les messages du fils jusqu'à la fermeture du pipe (fin ou plantage du fils)"""
+        closed = loop.create_future()
+
+        def on_readable():
+            try:
+                while conn.poll():
+                    message = conn.recv()
+                    if message[0] == "panel":
+                        _, idx, value, ratio, max_date = message
+                        self.on_update(idx, {"value": value, "ratio": ratio, "max_date": max_date})
+                    elif message[0] == "cycle" and self.on_cycle:
+                        self.on_cycle(message[1])
+            except (EOFError, OSError):
+                loop.remove_reader(conn.fileno())
+                if not closed.done():
+                    closed.set_result(None)
+
+        loop.add_reader(conn.fileno(), on_readable)
+        await closed
+
+    async def aclose(self):
+        """Arrête le fils proprement (fermeture de la fenêtre)"""
+        self._closing = True
+        process = self._process
+        self._send("stop", None)
+        if process is not None:
+            await asyncio.get_running_loop().run_in_executor(None, process.join, 3)
+            if process.is_alive():
+                process.terminate()
+
+# ─────────────────────────────────────────────
+# Persistence
+# ─────────────────────────────────────────────
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+DEFAULT_STATE_FILE = os.path.join(CACHE_DIR, "state.json")
+
+class StateCache:
+    """Dernières valeurs connues des panneaux, conservées sur disque entre deux démarrages.
+
+    L'écriture est atomique (fichier temporaire puis os.replace) et n'a lieu que si
+    le contenu a changé, pour épargner la carte SD.
+    """
+
+    def __init__(self, path: str = DEFAULT_STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_written: str | None = None
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                raw = f.read()
+            state = json.loads(raw)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Cache d'état illisible ({self.path}): {e}")
+            return {}
+        self._last_written = raw
+        # Les clés JSON sont des chaînes : on revient aux index de panneaux
+        return {
+            "panels": {int(k): v for k, v in state.get("panels", {}).items()},
+            "max_dates": {int(k): v for k, v in state.get("max_dates", {}).items()},
+            "last_gift": {int(k): v for k, v in state.get("last_gift", {}).items()},
+            # Requêtes des panneaux au moment de l'écriture : les index n'ont de sens que pour elles
+            "queries": state.get("queries"),
+        }
+
+    def save(self, state: dict) -> bool:
+        """Écrit l'état s'il a changé ; sûr depuis n'importe quel thread."""
+        raw = json.dumps(state, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            if raw == self._last_written:
+                return False
+            directory = os.path.dirname(self.path) or "."
+            try:
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".state-", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        f.write(raw)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            except Exception as e:
+                logger.warning(f"Impossible d'écrire le cache d'état {self.path}: {e}")
+                return False
+            self._last_written = raw
+            return True
+
+# ─────────────────────────────────────────────
+# History
+# ─────────────────────────────────────────────
+
+class PanelHistory:
+    """Historique borné (horodatage, valeur, ratio) d'un panneau, en tableaux compacts.
+
+    12 octets par point (secondes en uint32, valeur et ratio en float32) : une
+    journée d'échantillons à 5 s tient en 200 Ko. Les tableaux grandissent jusqu'à
+    `capacity` puis deviennent circulaires (le plus ancien point est écrasé). Les
+    points restent triés : un point plus ancien que le dernier est ignoré.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.times = array("I")
+        self.values = array("f")
+        self.ratios = array("f")
+        self._head = 0  # index du plus ancien point, une fois le tampon plein
+        self._unsaved = 0  # points ajoutés depuis le dernier take_unsaved()
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.times, self.values, self.ratios))
+
+    def last_time(self) -> int | None:
+        if not self.times:
+            return None
+        return self.times[(self._head - 1) % len(self.times)]
+
+    def append(self, t: float, value: float, ratio: float):
+        last = self.last_time()
+        if last is not None and int(t) <= last:
+            return  # horloge recalée en arrière, ou point du cache d'état déjà connu
+        self._unsaved = min(self._unsaved + 1, self.capacity)
+        if len(self.times) < self.capacity:
+            self.times.append(int(t))
+            self.values.append(value)
+            self.ratios.append(ratio)
+            return
+        head = self._head
+        self.times[head] = int(t)
+        self.values[head] = value
+        self.ratios[head] = ratio
+        self._head = (head + 1) % self.capacity
+
+    def since(self, t0: float):
+        """Points (horodatage, valeur, ratio) postérieurs à t0, du plus ancien au plus récent"""
+        n = len(self.times)
+        # Recherche dichotomique sur l'ordre logique (du plus ancien au plus récent)
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[(self._head + mid) % n] < t0:
+                lo = mid + 1
+            else:
+                hi = mid
+        for i in range(lo, n):
+            j = (self._head + i) % n
+            yield self.times[j], self.values[j], self.ratios[j]
+
+    def take_unsaved(self) -> list[tuple]:
+        """Points ajoutés depuis l'appel précédent, du plus ancien au plus récent (pour HistoryStore)"""
+        n, self._unsaved = self._unsaved, 0
+        size = len(self.times)
+        return [(self.times[j], self.values[j], self.ratios[j])
+                for j in ((self._head + i) % size for i in range(size - n, size))]
+
+    def load(self, times: array, values: array, ratios: array):
+        """Place des points relus du disque avant ceux déjà en mémoire (plus récents)"""
+        newer = list(self.since(times[-1] + 1)) if times else []
+        self.times, self.values, self.ratios = times, values, ratios
+        self._head = 0
+        for t, value, ratio in newer:
+            self.times.append(t)
+            self.values.append(value)
+            self.ratios.append(ratio)
+        extra = len(self.times) - self.capacity
+        if extra > 0:
+            del self.times[:extra], self.values[:extra], self.ratios[:extra]
+        self._unsaved = min(len(newer), len(self.times))
+
+class HistoryStore:
+    """Historique des panneaux sur disque : un journal binaire par panneau, relu au démarrage.
+
+    À chaque sauvegarde de l'état, seuls les points ajoutés depuis la précédente sont
+    écrits en fin de fichier (12 octets chacun). Au-delà du double de la capacité de
+    l'historique, le fichier est réécrit avec les seuls points encore gardés en mémoire.
+    """
+
+    RECORD = struct.Struct("<Iff")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, key) -> str:
+        return os.path.join(self.directory, hashlib.sha1(str(key).encode()).hexdigest()[:16] + ".bin")
+
+    def _read(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            raw = f.read()
+        # Dernier enregistrement tronqué par une coupure de courant : ignoré
+        return raw[:len(raw) - len(raw) % self.RECORD.size]
+
+    def load(self, key, history: PanelHistory):
+        """Relit l'historique d'un panneau (thread appelant) ; les points déjà en mémoire sont gardés"""
+        try:
+            raw = self._read(self._path(key))
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning(f"Historique illisible pour {key}: {e}")
+            return
+        # Enregistrements entrelacés (uint32, float32, float32) : relus en bloc puis séparés
+        words, floats = array("I"), array("f")
+        words.frombytes(raw)
+        floats.frombytes(raw)
+        if sys.byteorder == "big":
+            words.byteswap()
+            floats.byteswap()
+        start = max(0, len(words) // 3 - history.capacity) * 3
+        history.load(words[start::3], floats[start + 1::3], floats[start + 2::3])
+
+    def pending(self, keys: list, histories: list[PanelHistory]) -> list[tuple]:
+        """Points à écrire, pris sur le thread qui alimente les historiques"""
+        return [(key, h.capacity, h.take_unsaved()) for key, h in zip(keys, histories)]
+
+    def append(self, pending: list[tuple]):
+        """Ajoute les points de pending() aux journaux ; sûr depuis n'importe quel thread"""
+        size = self.RECORD.size
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                for key, capacity, points in pending:
+                    if not points:
+                        continue
+                    path = self._path(key)
+                    data = b"".join(self.RECORD.pack(*point) for point in points)
+                    try:
+                        records = os.path.getsize(path) // size
+                    except FileNotFoundError:
+                        records = 0
+                    if records + len(points) <= 2 * capacity:
+                        with open(path, "ab") as f:
+                            f.write(data)
+                        continue
+                    raw = (self._read(path) + data)[-capacity * size:]
+                    fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".history-", suffix=".tmp")
+                    try:
+                        with os.fdopen(fd, "wb") as f:
+                            f.write(raw)
+                        os.replace(tmp_path, path)
+                    except BaseException:
+                        os.unlink(tmp_path)
+                        raise
+            except Exception as e:
+                logger.warning(f"Impossible d'écrire l'historique dans {self.directory}: {e}")
+
+def restore_histories(store: HistoryStore, keys: list, histories: list[PanelHistory], sparklines: list):
+    """Relit les historiques et en reconstruit la courbe du jour de chaque panneau"""
+    day_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    for key, history, sparkline in zip(keys, histories, sparklines):
+        store.load(key, history)
+        if sparkline is not None:
+            sparkline.load(history.since(day_start))
+
+class Sparkline:
+    """Courbe de la journée en cours, réduite à un min et un max par intervalle de temps.
+
+    La journée est découpée en `buckets` intervalles ; un nouveau point ne modifie que
+    le dernier, et render() ne renvoie que les coordonnées qui ont changé depuis le
+    rendu précédent. Tout est recalculé seulement si la taille du canvas ou l'échelle
+    verticale change, ou au changement de jour.
+    """
+
+    def __init__(self, buckets: int = 288, pad: float = 4.0):
+        self.buckets = buckets
+        self.step = 86400 / buckets
+        self.pad = pad
+        self.day_start: float | None = None
+        self._day_end: float | None = None
+        self._buckets: list[list] = []  # [index, t_min, v_min, t_max, v_max]
+        self._coords: list[float] = []
+        self._offsets: list[int] = []  # indice de la première coordonnée de chaque intervalle
+        self._size: tuple[int, int] | None = None
+        self._scale: tuple[float, float] | None = None
+        self._dirty_from: int | None = 0  # premier intervalle à recalculer ; None = rien
+
+    def load(self, points):
+        """Reconstruit la courbe à partir de points (horodatage, valeur, …) triés, ex. PanelHistory.since()"""
+        self.day_start = self._day_end = None
+        self._buckets = []
+        self._dirty_from = 0
+        for t, value, *_ in points:
+            self.add(t, value)
+
+    def add(self, t: float, value: float):
+        if self.day_start is None or not self.day_start <= t < self._day_end:
+            day = datetime.fromtimestamp(t).replace(hour=0, minute=0, second=0, microsecond=0)
+            if self.day_start is not None and day.timestamp() < self.day_start:
+                return
+            self.day_start = day.timestamp()
+            # Lendemain par le calendrier : une journée de changement d'heure ne fait pas 86400 s
+            self._day_end = (day + timedelta(days=1)).timestamp()
+            self._buckets = []
+            self._dirty_from = 0
+        index = min(int((t - self.day_start) // self.step), self.buckets - 1)
+        last = self._buckets[-1] if self._buckets else None
+        if last is not None and last[0] == index:
+            if value < last[2]:
+                last[1], last[2] = t, value
+            if value > last[4]:
+                last[3], last[4] = t, value
+            pos = len(self._buckets) - 1
+        elif last is None or index > last[0]:
+            self._buckets.append([index, t, value, t, value])
+            pos = len(self._buckets) - 1
+        else:
+            return  # point plus ancien que le dernier intervalle : ignoré
+        self._dirty_from = pos if self._dirty_from is None else min(self._dirty_from, pos)
+
+    def render(self, width: int, height: int, full: bool = False) -> tuple[int, list[float]]:
+        """(indice de la première coordonnée à remplacer, coordonnées à partir de là)"""
+        if not self._buckets:
+            return 0, []
+        lo = min(b[2] for b in self._buckets)
+        hi = max(b[4] for b in self._buckets)
+        if full or (width, height) != self._size or (lo, hi) != self._scale:
+            self._size, self._scale = (width, height), (lo, hi)
+            self._dirty_from = 0
+        elif self._dirty_from is None:
+            return len(self._coords), []
+        start = self._dirty_from
+        del self._coords[self._offsets[start] if start < len(self._offsets) else len(self._coords):]
+        del self._offsets[start:]
+        span = (hi - lo) or 1.0
+        usable = max(1.0, height - 2 * self.pad)
+        x_scale = width / self.buckets
+        for index, t_min, v_min, t_max, v_max in self._buckets[start:]:
+            self._offsets.append(len(self._coords))
+            x = (index + 0.5) * x_scale
+            # Le min et le max dans l'ordre où ils sont survenus
+            for v in ((v_min, v_max) if t_min <= t_max else (v_max, v_min)):
+                y = height / 2 if hi == lo else self.pad + (hi - v) / span * usable
+                self._coords += (x, y)
+        self._dirty_from = None
+        first = self._offsets[start]
+        return first, self._coords[first:]
+
+    @property
+    def coords(self) -> list[float]:
+        return self._coords
+
+# ─────────────────────────────────────────────
+# Assets
+# ─────────────────────────────────────────────
+
+class AssetCache:
+    """Images pré-redimensionnées : cache disque, décodage en arrière-plan et LRU de PhotoImage.
+
+    Les frames redimensionnées sont stockées en PNG sous `cache_dir`, indexées par le
+    chemin source, son mtime et la taille cible ; une entrée n'est décodée et écrite
+    que par un thread à la fois. Les PhotoImage (thread Tk uniquement) sont gardées
+    dans un LRU borné à `memory_budget` octets.
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(CACHE_DIR, "assets"), memory_budget: int = 64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self._lock = threading.Lock()
+        self._entry_locks: dict[str, threading.Lock] = {}  # entrée disque -> verrou d'écriture
+        # (chemin, taille) -> (frames PIL, durée) ; vidé dès la conversion en PhotoImage
+        self._decoded: dict[tuple, tuple[list, int]] = {}
+        # (chemin, taille) -> (PhotoImage, durée, octets), du moins au plus récemment utilisé
+        self._photos: OrderedDict = OrderedDict()
+        self._photo_bytes = 0
+        self._preloaded = threading.Event()
+
+    def _entry_dir(self, path: str, size: tuple[int, int]) -> str:
+        st = os.stat(path)
+        raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{size[0]}x{size[1]}"
+        return os.path.join(self.cache_dir, hashlib.sha1(raw.encode()).hexdigest())
+
+    def frames(self, path: str, size: tuple[int, int]) -> tuple[list, int]:
+        """Frames PIL redimensionnées, lues du cache disque si possible ; sûr depuis n'importe quel thread."""
+        with self._lock:
+            cached = self._decoded.get((path, size))
+        if cached:
+            return cached
+        entry_dir = self._entry_dir(path, size)
+        result = self._read_entry(entry_dir)
+        if result is None:
+            with self._lock:
+                entry_lock = self._entry_locks.setdefault(entry_dir, threading.Lock())
+            with entry_lock:
+                # Un autre thread a pu écrire l'entrée pendant l'attente du verrou
+                result = self._read_entry(entry_dir)
+                if result is None:
+                    result = self._decode(path, size)
+                    self._write_entry(entry_dir, path, size, *result)
+        with self._lock:
+            self._decoded[(path, size)] = result
+        return result
+
+    def image(self, path: str, size: tuple[int, int]):
+        """Première frame redimensionnée, sans la garder en mémoire (logo)"""
+        frames, _ = self.frames(path, size)
+        with self._lock:
+            self._decoded.pop((path, size), None)
+        return frames[0]
+
+    @staticmethod
+    def _decode(path: str, size: tuple[int, int]) -> tuple[list, int]:
+        from PIL import Image
+        frames = []
+        with Image.open(path) as img:
+            duration = img.info.get("duration") or 100
+            for i in range(getattr(img, "n_frames", 1)):
+                img.seek(i)
+                frames.append(img.convert("RGBA").resize(size, Image.Resampling.LANCZOS))
+        return frames, duration
+
+    @staticmethod
+    def _read_entry(entry_dir: str):
+        from PIL import Image
+        try:
+            with open(os.path.join(entry_dir, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            frames = []
+            for i in range(meta["frames"]):
+                with Image.open(os.path.join(entry_dir, f"{i:04d}.png")) as frame:
+                    frame.load()
+                    frames.append(frame.copy())
+            return frames, meta["duration"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Cache d'asset illisible {entry_dir}: {e}")
+            return None
+
+    def _write_entry(self, entry_dir: str, source: str, size: tuple[int, int], frames: list, duration: int):
+        tmp_dir = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Les anciennes versions de la même source à la même taille (mtime différent) sont
+            # supprimées ; les autres tailles de la même image restent utilisables
+            source = os.path.abspath(source)
+            for name in os.listdir(self.cache_dir):
+                old_dir = os.path.join(self.cache_dir, name)
+                if name.startswith(".") or old_dir == entry_dir:
+                    continue
+                try:
+                    with open(os.path.join(old_dir, "meta.json"), encoding="utf-8") as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                # Entrée sans taille : écrite par une version précédente, reconstruite à la demande
+                if meta.get("source") == source and meta.get("size", list(size)) == list(size):
+                    shutil.rmtree(old_dir, ignore_errors=True)
+            tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".asset-")
+            for i, frame in enumerate(frames):
+                frame.save(os.path.join(tmp_dir, f"{i:04d}.png"), compress_level=1)
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"source": source, "size": list(size), "frames": len(frames), "duration": duration}, f)
+            try:
+                os.replace(tmp_dir, entry_dir)
+            except OSError:
+                # Entrée déjà écrite par un autre processus (même contenu) : la nôtre est abandonnée
+                if not os.path.exists(os.path.join(entry_dir, "meta.json")):
+                    raise
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception as e:
+            logger.warning(f"Impossible d'écrire le cache d'asset {entry_dir}: {e}")
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def preload(self, paths: list[str], size: tuple[int, int]):
+        """Décode les assets dans un thread d'arrière-plan"""
+        def run():
+            for path in paths:
+                try:
+                    self.frames(path, size)
+                except Exception as e:
+                    logger.warning(f"Préchargement impossible pour {path}: {e}")
+            self._preloaded.set()
+        threading.Thread(target=run, daemon=True).start()
+
+    def warm(self, widget, paths: list[str], size: tuple[int, int], interval: int = 200):
+        """Convertit en PhotoImage, un asset par passage, ce que preload a décodé (thread Tk)"""
+        pending = list(paths)
+
+        def step():
+            while pending:
+                key = (pending[0], size)
+                with self._lock:
+                    decoded = key in self._decoded
+                if key in self._photos or (not decoded and self._preloaded.is_set()):
+                    pending.pop(0)
+                    continue
+                if decoded:
+                    self.photo_frames(*key)
+                    pending.pop(0)
+                break
+            if pending:
+                widget.after(interval, step)
+
+        widget.after(interval, step)
+
+    def photo_frames(self, path: str, size: tuple[int, int]) -> tuple[list, int]:
+        """PhotoImage prêtes à afficher, depuis le LRU si possible (thread Tk uniquement)"""
+        key = (path, size)
+        entry = self._photos.get(key)
+        if entry is not None:
+            self._photos.move_to_end(key)
+            return entry[0], entry[1]
+        from PIL import ImageTk
+        frames, duration = self.frames(path, size)
+        photos = [ImageTk.PhotoImage(frame) for frame in frames]
+        nbytes = size[0] * size[1] * 4 * len(photos)
+        self._photos[key] = (photos, duration, nbytes)
+        self._photo_bytes += nbytes
+        with self._lock:
+            self._decoded.pop(key, None)
+        # Les PhotoImage encore affichées restent référencées par l'animation qui les utilise
+        while self._photo_bytes > self.memory_budget and len(self._photos) > 1:
+            _, (_, _, evicted) = self._photos.popitem(last=False)
+            self._photo_bytes -= evicted
+        return photos, duration
+
+    def clear(self):
+        """Libère les PhotoImage et les frames décodées gardées en mémoire"""
+        self._photos.clear()
+        self._photo_bytes = 0
+        with self._lock:
+            self._decoded.clear()
+
+def load_logo_image(assets: AssetCache):
+    """Premier logo PNG/JPEG du répertoire courant, ramené à 198 px de large ; None si absent"""
+    logo_extensions = ['*.png', '*.PNG', '*.jpg', '*.JPG', '*.jpeg', '*.JPEG']
+    for pattern in logo_extensions:
+        for path in glob.glob(pattern):
+            try:
+                # Resize ONLY, pas de fond blanc
+                from PIL import Image
+                with Image.open(path) as probe:
+                    original_width, original_height = probe.size
+
+                # D'abord réduire la taille du logo à 80% de sa taille originale
+                new_width = int(original_width * 0.8)
+                new_height = int(original_height * 0.8)
+
+                # Ensuite, s'assurer que la largeur vaut 198px (réduction ou agrandissement)
+                if new_width != 198:
+                    ratio = 198 / new_width
+                    new_width = 198
+                    new_height = int(new_height * ratio)
+
+                image = assets.image(path, (new_width, new_height))
+                logger.info(f"Logo chargé (sans fond ajouté) : {path}")
+                return image
+            except Exception as e:
+                logger.warning(f"Erreur lors du chargement du logo {path}: {e}")
+    logger.warning("Aucun logo trouvé dans le répertoire courant")
+    return None
+
 # ─────────────────────────────────────────────
 # Animation Components
 # ─────────────────────────────────────────────
 
 class ConfettiAnimation:
-    def __init__(self, parent_window):
+    GIF_SIZE = (500, 400)
+    # Cadence nominale : une frame toutes les 32 ms, physique et GIF calés dessus
+    FRAME_MS = 32
+    # Durée d'affichage du message quand il n'y a pas de confettis (s)
+    MESSAGE_DURATION = 3.5
+    # Niveaux de qualité du gouverneur : (part de confettis gardée, 1 frame de GIF sur n, intervalle en ms)
+    QUALITY_LEVELS = [(1.0, 1, 32), (0.5, 1, 32), (0.25, 2, 48), (0.25, 2, 64)]
+    PARTICLE_COUNT = 40
+    # Remplaçable (bench sans affichage) par un canvas qui ne dessine rien
+    canvas_factory = tk.Canvas if tk else None
+
+    def __init__(self, parent_window, assets: AssetCache | None = None):
         self.parent_window = parent_window
+        self.assets = assets or AssetCache()
         self.canvas = None
         self.particles = []
         self.animation_running = False
@@ -102,44 +2271,26 @@ class ConfettiAnimation:
         self.gif_frame_index = 0
         self.gif_delay = 100
         self.current_gif_path = ""
+        self._message_items = None  # (fond, texte, GIF) du message central
+        self.last_stats = {}  # Statistiques de la dernière célébration
+        self._initial_particles = []
 
     def load_gif(self, gif_path):
-        """Charge un GIF et extrait toutes ses frames"""
+        """Récupère les frames du GIF, pré-redimensionnées, depuis le cache d'assets"""
         try:
             self.gift_frames = []
-            gif = Image.open(gif_path)
-
-            # Extraire toutes les frames du GIF
-            frame_count = 0
-            while True:
-                try:
-                    gif.seek(frame_count)
-                    frame = gif.copy()
-                    # Redimensionner le frame pour l'affichage
-                    frame = frame.resize((500, 400), Image.Resampling.LANCZOS)
-                    # Convertir en PhotoImage pour tkinter
-                    photo = ImageTk.PhotoImage(frame)
-                    self.gift_frames.append(photo)
-                    frame_count += 1
-                except EOFError:
-                    break
-
-            # Récupérer le délai d'animation du GIF
-            try:
-                self.gif_delay = gif.info.get('duration', 100)
-            except:
-                self.gif_delay = 100
-
+            self.gift_frames, self.gif_delay = self.assets.photo_frames(gif_path, self.GIF_SIZE)
             self.gif_frame_index = 0
             self.current_gif_path = gif_path
-            logger.info(f"GIF chargé: {gif_path} avec {len(self.gift_frames)} frames")
+            logger.debug("GIF chargé: %s avec %d frames", gif_path, len(self.gift_frames))
             return True
 
         except Exception as e:
             logger.error(f"Erreur lors du chargement du GIF {gif_path}: {e}")
             return False
 
-    def get_appropriate_gif(self, threshold):
+    @staticmethod
+    def get_appropriate_gif(threshold):
         """Retourne le chemin du GIF approprié selon le seuil"""
         abs_threshold = abs(threshold)
         if threshold > 0:
@@ -168,7 +2319,7 @@ class ConfettiAnimation:
         # Couleur de fond selon si c'est positif ou négatif
         self.bg_color = "#1B5E20" if positive else "#B71C1C"  # Vert foncé si positif, rouge foncé si négatif
 
-        self.canvas = tk.Canvas(
+        self.canvas = self.canvas_factory(
             self.parent_window,
             highlightthickness=0,
             width=canvas_width,
@@ -181,8 +2332,15 @@ class ConfettiAnimation:
 
         self.particles = []
 
-        # Réinitialiser le compteur d'animation
-        self._animation_frame_count = 0
+        # Mesures de la célébration : temps de calcul par frame, frames perdues, niveau de qualité
+        self._started_at = self._last_frame_at = time.perf_counter()
+        self._frame_times = []
+        self._dropped_frames = 0
+        self._work_ema = 0.0
+        self._interval_ema = float(self.FRAME_MS)
+        self._quality = 0
+        self._calm_frames = 0
+        self._frames_since_change = 0
 
         # Zone centrale pour le message (éviter les confettis dans cette zone)
         center_x = canvas_width // 2
@@ -192,7 +2350,7 @@ class ConfettiAnimation:
 
         # Générer les confettis seulement si c'est positif
         if positive:
-            for _ in range(40):
+            for _ in range(self.PARTICLE_COUNT):
                 # Générer des positions qui évitent la zone du message
                 while True:
                     x = random.uniform(0, canvas_width)
@@ -212,203 +2370,671 @@ class ConfettiAnimation:
                 self.particles.append({
                     'x': x, 'y': y, 'vx': vx, 'vy': vy, 'color': color, 'size': size, 'angle': angle, 'spin': random.uniform(-8, 8)
                 })
+        self._initial_particles = list(self.particles)
+        self._create_items(canvas_width, canvas_height)
         self._animate()
 
+    def _create_items(self, canvas_width, canvas_height):
+        """Crée une fois pour toutes les items du canvas ; _animate ne fait ensuite que les déplacer"""
+        for p in self.particles:
+            p['item'] = self.canvas.create_polygon(self._particle_points(p), fill=p['color'], outline='', width=0)
+
+        # Message au centre, par-dessus les confettis
+        self._message_items = None
+        if self.message_text:
+            rect = self.canvas.create_rectangle(0, 0, 0, 0, fill=self.bg_color, outline="")
+            # Texte du message (taille augmentée de 6px : 42 + 6 = 48px, maintenant +10px = 58px, +5px = 63px, +10px = 73px)
+            text = self.canvas.create_text(
+                0, 0,
+                text=self.message_text,
+                font=("Montserrat", 73, "bold"),
+                fill=self.message_color,
+                anchor="center"
+            )
+            # GIF animé en dessous du texte avec gap ; seule son image change à chaque frame
+            gif = self.canvas.create_image(0, 0, anchor="center")
+            if self.gift_frames:
+                self.canvas.itemconfigure(gif, image=self.gift_frames[self.gif_frame_index])
+            self._message_items = (rect, text, gif)
+            self._place_message(canvas_width, canvas_height)
+            self.canvas.bind("<Configure>", lambda e: self._place_message(e.width, e.height))
+
+    def _place_message(self, canvas_width, canvas_height):
+        rect, text, gif = self._message_items
+        center_x = canvas_width // 2
+        center_y = canvas_height // 2
+        self.canvas.coords(rect, center_x - 400, center_y - 250, center_x + 400, center_y + 250)
+        self.canvas.coords(text, center_x, center_y - 150)
+        self.canvas.coords(gif, center_x, center_y + 120)
+
+    @staticmethod
+    def _particle_points(p):
+        size = p['size']
+        angle_rad = math.radians(p['angle'])
+        hw = size * 0.6
+        hh = size * 0.3
+        cos_a = math.cos(angle_rad)
+        sin_a = math.sin(angle_rad)
+        points = []
+        for cx, cy in ((-hw, -hh), (hw, -hh), (hw, hh), (-hw, hh)):
+            points.append(cx * cos_a - cy * sin_a + p['x'])
+            points.append(cx * sin_a + cy * cos_a + p['y'])
+        return points
+
     def _animate(self):
         if not self.animation_running:
             return
-        self.canvas.delete("all")
+        now = time.perf_counter()
+        keep, gif_every, interval_ms = self.QUALITY_LEVELS[self._quality]
+
+        # Physique calée sur le temps réel écoulé, pas sur le nombre de frames
+        frame_interval = (now - self._last_frame_at) * 1000
+        self._last_frame_at = now
+        if frame_interval > 1.5 * interval_ms:
+            dropped = round(frame_interval / interval_ms) - 1
+            self._dropped_frames += dropped
+            METRICS.inc("animation_dropped_frames_total", dropped)
+        step = min(frame_interval / self.FRAME_MS, 4.0)
+        elapsed = now - self._started_at
 
-        # Dessiner les confettis seulement s'il y en a
         alive_particles = []
         canvas_height = self.canvas.winfo_height()
-        canvas_width = self.canvas.winfo_width()
 
         for p in self.particles:
-            p['x'] += p['vx']
-            p['y'] += p['vy']
-            p['vy'] += 0.15
-            p['angle'] += p['spin']
-            p['vx'] *= 0.999
+            p['x'] += p['vx'] * step
+            p['y'] += p['vy'] * step
+            p['vy'] += 0.15 * step
+            p['angle'] += p['spin'] * step
+            p['vx'] *= 0.999 ** step
             if p['y'] < canvas_height + 20:
                 alive_particles.append(p)
-                size = p['size']
-                angle_rad = math.radians(p['angle'])
-                hw = size * 0.6
-                hh = size * 0.3
-                cos_a = math.cos(angle_rad)
-                sin_a = math.sin(angle_rad)
-                points = []
-                corners = [(-hw, -hh), (hw, -hh), (hw, hh), (-hw, hh)]
-                for cx, cy in corners:
-                    rx = cx * cos_a - cy * sin_a + p['x']
-                    ry = cx * sin_a + cy * cos_a + p['y']
-                    points.extend([rx, ry])
-                self.canvas.create_polygon(points, fill=p['color'], outline='', width=0)
-
-        # Dessiner le message au centre par-dessus les confettis
-        if self.message_text:
-            center_x = canvas_width // 2
-            center_y = canvas_height // 2
-
-            # Fond de la même couleur que le canvas avec transparence
-            self.canvas.create_rectangle(
-                center_x - 400, center_y - 250,
-                center_x + 400, center_y + 250,
-                fill=self.bg_color, outline=""
-            )
-
-            # Texte du message (taille augmentée de 6px : 42 + 6 = 48px, maintenant +10px = 58px, +5px = 63px, +10px = 73px)
-            self.canvas.create_text(
-                center_x, center_y - 150,
-                text=self.message_text,
-                font=("Montserrat", 73, "bold"),
-                fill=self.message_color,
-                anchor="center"
-            )
+                self.canvas.coords(p['item'], self._particle_points(p))
+            else:
+                # Tombée hors de l'écran : l'item est masqué, plus jamais mis à jour
+                self.canvas.itemconfigure(p['item'], state="hidden")
 
-            # Affichage du GIF animé en dessous du texte avec gap
-            if self.gift_frames and len(self.gift_frames) > 0:
-                current_frame = self.gift_frames[self.gif_frame_index]
-                self.canvas.create_image(
-                    center_x, center_y + 120,
-                    image=current_frame,
-                    anchor="center"
-                )
-                # Passer à la frame suivante
-                self.gif_frame_index = (self.gif_frame_index + 1) % len(self.gift_frames)
+        if self._message_items and self.gift_frames:
+            # Le GIF avance au rythme nominal d'une frame par FRAME_MS : les frames en retard sont sautées
+            index = int(elapsed * 1000 / self.FRAME_MS) % len(self.gift_frames)
+            if index != self.gif_frame_index and index % gif_every == 0:
+                self.gif_frame_index = index
+                self.canvas.itemconfigure(self._message_items[2], image=self.gift_frames[index])
 
         self.particles = alive_particles
-        
+
+        work_ms = (time.perf_counter() - now) * 1000
+        self._frame_times.append(work_ms)
+        METRICS.observe("animation_frame_seconds", work_ms / 1000)
+        self._govern(work_ms, frame_interval, interval_ms)
+
         # Continuer l'animation tant qu'il y a des particules OU qu'on a un message à afficher
-        # Pour les cas négatifs sans confettis, on limite à 3.5 secondes (environ 110 frames à 32ms)
-        if len(self.particles) > 0 or (self.message_text and hasattr(self, '_animation_frame_count')):
-            if not hasattr(self, '_animation_frame_count'):
-                self._animation_frame_count = 0
-            self._animation_frame_count += 1
-            
-            # Arrêter après ~3.5 secondes si pas de confettis
-            if len(self.particles) == 0 and self._animation_frame_count > 110:
-                self.stop_animation()
-            else:
-                self.parent_window.after(32, self._animate)
+        # Pour les cas négatifs sans confettis, on s'arrête après MESSAGE_DURATION secondes
+        if self.particles or (self.message_text and elapsed <= self.MESSAGE_DURATION):
+            interval_ms = self.QUALITY_LEVELS[self._quality][2]
+            self.parent_window.after(max(1, int(interval_ms - work_ms)), self._animate)
         else:
             self.stop_animation()
 
+    def _govern(self, work_ms, frame_interval, interval_ms):
+        """Ajuste le niveau de qualité pour tenir le budget de frame"""
+        self._work_ema = 0.8 * self._work_ema + 0.2 * work_ms
+        self._interval_ema = 0.8 * self._interval_ema + 0.2 * frame_interval
+        self._frames_since_change += 1
+        # Laisser les moyennes se stabiliser après chaque changement de niveau
+        if self._frames_since_change < 15:
+            return
+        late = self._interval_ema > 1.25 * interval_ms
+        if (self._work_ema > 0.6 * interval_ms or late) and self._quality < len(self.QUALITY_LEVELS) - 1:
+            self._quality += 1
+            self._frames_since_change = self._calm_frames = 0
+            self._cull_particles(self.QUALITY_LEVELS[self._quality][0])
+            logger.info(f"Animation : qualité abaissée au niveau {self._quality} (frame {work_ms:.1f} ms)")
+        elif self._work_ema < 0.2 * interval_ms and not late and self._quality > 0:
+            self._calm_frames += 1
+            # Les confettis retirés ne reviennent pas ; seuls la cadence et le GIF remontent
+            if self._calm_frames >= 60:
+                self._quality -= 1
+                self._frames_since_change = self._calm_frames = 0
+        else:
+            self._calm_frames = 0
+
+    def _cull_particles(self, keep: float):
+        target = int(len(self._initial_particles) * keep)
+        while len(self.particles) > target:
+            p = self.particles.pop()
+            self.canvas.itemconfigure(p['item'], state="hidden")
+
+    def _log_stats(self):
+        if not self._frame_times:
+            return
+        duration = time.perf_counter() - self._started_at
+        self.last_stats = {
+            "frames": len(self._frame_times),
+            "duration": duration,
+            "p50_ms": percentile(self._frame_times, 50),
+            "p95_ms": percentile(self._frame_times, 95),
+            "dropped": self._dropped_frames,
+            "quality": self._quality,
+        }
+        logger.info(
+            "Célébration : %d frames en %.2fs (%.1f fps), frame p50=%.1f ms p95=%.1f ms, %d frames perdues, qualité %d",
+            self.last_stats["frames"], duration, self.last_stats["frames"] / duration if duration else 0,
+            self.last_stats["p50_ms"], self.last_stats["p95_ms"], self._dropped_frames, self._quality,
+        )
+
     def stop_animation(self):
+        if self.animation_running:
+            self._log_stats()
         self.animation_running = False
         if self.canvas:
             self.canvas.destroy()
             self.canvas = None
         self.particles = []
+        self._initial_particles = []
+        self._message_items = None
+
+# ─────────────────────────────────────────────
+# Panels
+# ─────────────────────────────────────────────
+
+# max_age par défaut (s) des panneaux paramétrés (REDASH_MAX_AGE s'applique aussi)
+PARAMETERS_MAX_AGE = 300
+
+# Les trois panneaux historiques, utilisés si DASHBOARD_PANELS n'est pas défini
+DEFAULT_PANELS = {
+    "columns": 2,
+    "per_page": 3,
+    "page_seconds": 20,
+    "panels": [
+        {"id": 111, "api_key_env": "KEY_EVOL", "mapping": {"value": "EVOL", "ratio": "EVOL"},
+         "title": "Évolution", "unit": "%", "format": "evolution", "detail": "inspiration",
+         "thresholds": {"step": 10}, "theme": True, "interval": 5, "max_interval": 30},
+        {"id": 110, "api_key_env": "KEY_CA_J1", "mapping": {"value": "CA", "ratio": "AVG"},
+         "title": "CA {max_date}", "unit": "€", "format": "amount", "detail": "trend",
+         "interval": 60, "max_interval": 900},
+        {"id": 109, "api_key_env": "KEY_CA_JN", "mapping": {"value": "CA", "ratio": "AVG"},
+         "title": "CA {now}", "unit": "€", "format": "amount", "detail": "trend",
+         "interval": 5, "max_interval": 30},
+    ],
+}
+PANEL_FORMATS = ("evolution", "amount")
+PANEL_DETAILS = ("inspiration", "trend", None)
+
+def load_panels(path: str | None, max_age: int | None = None) -> dict:
+    """Lit la configuration des panneaux (JSON) et complète chaque panneau.
+
+    Renvoie {"columns", "per_page", "page_seconds", "panels"}. Chaque panneau reçoit
+    sa clé API (lue dans la variable d'environnement `api_key_env`, les secrets
+    restent dans le .env), son max_age et le drapeau `pinned` du RefreshScheduler.
+    Un panneau dont `parameters` est une liste de jeux de paramètres devient un
+    panneau par jeu, à la suite : la rotation des pages passe de l'un à l'autre.
+    """
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                layout = json.load(f)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"Configuration des panneaux illisible ({path}): {e}")
+    else:
+        layout = DEFAULT_PANELS
+    panels = []
+    for i, raw in enumerate(_expand_parameters(layout.get("panels", []))):
+        panel = dict(raw)
+        if "id" not in panel or "mapping" not in panel:
+            raise SystemExit(f"Panneau {i} : 'id' et 'mapping' sont obligatoires")
+        panel.setdefault("title", f"Requête {panel['id']}")
+        panel.setdefault("unit", "")
+        panel.setdefault("format", "amount")
+        panel.setdefault("detail", "trend")
+        if panel["format"] not in PANEL_FORMATS or panel["detail"] not in PANEL_DETAILS:
+            raise SystemExit(f"Panneau {i} : format ou detail inconnu")
+        panel["api_key"] = panel.get("api_key") or os.getenv(panel.get("api_key_env", ""), "")
+        panel.setdefault("max_age", max_age)
+        if panel.get("parameters") is not None:
+            if not isinstance(panel["parameters"], dict):
+                raise SystemExit(f"Panneau {i} : 'parameters' doit être un objet ou une liste d'objets")
+            # Redash ne rafraîchit pas seul les résultats paramétrés : exécutés au-delà de max_age
+            if panel["max_age"] is None:
+                panel["max_age"] = PARAMETERS_MAX_AGE
+        # Le panneau qui colore l'écran et ceux qui déclenchent une célébration restent à pleine cadence
+        panel["pinned"] = bool(panel.get("theme") or panel.get("thresholds"))
+        panels.append(panel)
+    if not panels:
+        raise SystemExit("Aucun panneau configuré")
+    if sum(1 for p in panels if p.get("theme")) > 1:
+        raise SystemExit("Un seul panneau peut porter 'theme'")
+    return {
+        "columns": max(1, int(layout.get("columns", 2))),
+        "per_page": max(1, int(layout.get("per_page", 4))),
+        "page_seconds": float(layout.get("page_seconds", 20)),
+        "panels": panels,
+    }
+
+def _expand_parameters(raw_panels: list[dict]):
+    """Un panneau par jeu de paramètres ; {nom} dans le titre est remplacé par la valeur"""
+    for raw in raw_panels:
+        sets = raw.get("parameters")
+        if not isinstance(sets, list):
+            yield raw
+            continue
+        for params in sets:
+            panel = dict(raw, parameters=params)
+            if isinstance(params, dict) and "title" in raw:
+                for name, value in params.items():
+                    panel["title"] = panel["title"].replace("{" + name + "}", str(value))
+            yield panel
+
+def panel_key(panel: dict) -> int | str:
+    """Identifiant du panneau pour le cache d'état : l'id de la requête, suivi de ses paramètres"""
+    if panel.get("parameters") is None:
+        return panel["id"]
+    return f"{panel['id']}:{normalize_parameters(panel['parameters'])}"
+
+def panel_view(panel: dict, value: float | None, ratio: float | None, theme_ratio: float,
+               max_date: str | None = None) -> dict:
+    """Textes et couleurs d'un panneau, communs à l'UI Tk et au rendu framebuffer"""
+    color, arrow = panel_style(theme_ratio)
+    if value is None:
+        text = "--"
+    elif panel["format"] == "evolution":
+        text = f"{format_evolution(value)}{panel['unit']}"
+    else:
+        text = format_amount(value, panel["unit"])
+    detail, detail_color = None, color
+    if panel["detail"] == "trend":
+        # Pour les blocs CA, afficher seulement la flèche (pas le pourcentage d'évolution)
+        detail = arrow
+    elif panel["detail"] == "inspiration":
+        if ratio is None:
+            detail, detail_color = "", "#888888"
+        elif ratio > 0:
+            detail, detail_color = " 1% d'inspiration et 99% de transpiration.", "#000000"
+        elif ratio < 0:
+            detail, detail_color = " Il n'y a de vie que dans les marges.", "#FF6B6B"
+        else:
+            detail, detail_color = " L'équilibre est la clé du succès.", "#87CEEB"
+    return {"title": format_title(panel["title"], max_date), "value": text, "color": color,
+            "background": lighten(color, 0.85), "detail": detail, "detail_color": detail_color}
+
+def build_data_layer(base_url: str, cfgs: list[dict], deadline: float, on_update, on_cycle,
+                     subscribe_url: str | None = None, worker: bool = False):
+    """Source des panneaux selon le mode : (scrapers, fetcher, scheduler, subscriber)"""
+    if subscribe_url:
+        # Mode écran abonné : les valeurs viennent du démon partagé, pas de Redash
+        return [], None, None, PanelSubscriber(subscribe_url, [panel_key(c) for c in cfgs], on_update, on_cycle)
+    if worker:
+        # Redash, décodage et mapping dans un processus fils ; PanelWorker remplace le RefreshScheduler
+        return [], None, PanelWorker(base_url, cfgs, deadline, on_update, on_cycle), None
+    scrapers = [RedashScraper(c["api_key"], base_url) for c in cfgs]
+    fetcher = PanelFetcher(scrapers, cfgs, on_update)
+    return scrapers, fetcher, RefreshScheduler(fetcher, cfgs, deadline, on_cycle), None
+
+# ─────────────────────────────────────────────
+# Power (veille hors des heures d'ouverture)
+# ─────────────────────────────────────────────
+
+class BusinessHours:
+    """Plages d'ouverture hebdomadaires, ex. "lun-sam 07:30-20:30, dim 09:00-13:00".
+
+    Chaque entrée donne un jour ou un intervalle de jours (lun … dim, « * » pour tous)
+    puis une ou plusieurs plages HH:MM-HH:MM ; une plage qui passe minuit déborde sur
+    le jour suivant. Sans aucune plage, l'écran est toujours actif.
+    """
+
+    DAYS = ("lun", "mar", "mer", "jeu", "ven", "sam", "dim")
+    WEEK = 7 * 1440
+    # Re-vérification au moins toutes les N secondes : l'horloge d'un Pi sans RTC saute au boot (NTP)
+    CHECK_SECONDS = 300
+
+    def __init__(self, spec: str = ""):
+        self.spec = spec.strip()
+        self._ranges: list[tuple[int, int]] = []  # minutes depuis lundi 00:00, fin exclue
+        for entry in filter(None, (e.strip() for e in self.spec.split(","))):
+            days, *ranges = entry.split()
+            if not ranges:
+                raise ValueError(f"plage horaire manquante dans « {entry} »")
+            for day in self._days(days):
+                for text in ranges:
+                    bounds = text.split("-")
+                    if len(bounds) != 2:
+                        raise ValueError(f"plage « {text} » : HH:MM-HH:MM attendu")
+                    start, end = (self._minutes(b) for b in bounds)
+                    if end <= start:
+                        end += 1440
+                    start, end = start + day * 1440, end + day * 1440
+                    if end > self.WEEK:
+                        self._ranges += [(start, self.WEEK), (0, end - self.WEEK)]
+                    else:
+                        self._ranges.append((start, end))
+
+    @classmethod
+    def _days(cls, text: str) -> list[int]:
+        if text in ("*", "tous"):
+            return list(range(7))
+        first, _, last = text.lower().partition("-")
+        if first[:3] not in cls.DAYS or (last and last[:3] not in cls.DAYS):
+            raise ValueError(f"jours « {text} » : lun, mar, mer, jeu, ven, sam, dim ou *")
+        a = cls.DAYS.index(first[:3])
+        b = cls.DAYS.index(last[:3]) if last else a
+        # "sam-lun" passe par le dimanche
+        return [(a + i) % 7 for i in range((b - a) % 7 + 1)]
+
+    @staticmethod
+    def _minutes(text: str) -> int:
+        hours, _, minutes = text.partition(":")
+        try:
+            h, m = int(hours), int(minutes or 0)
+        except ValueError:
+            h = m = -1
+        if not (0 <= h <= 24 and 0 <= m < 60):
+            raise ValueError(f"heure « {text} » invalide (HH:MM attendu)")
+        return h * 60 + m
+
+    def __bool__(self) -> bool:
+        return bool(self._ranges)
+
+    @staticmethod
+    def _minute(now: datetime) -> float:
+        return now.weekday() * 1440 + now.hour * 60 + now.minute + now.second / 60
+
+    def is_open(self, now: datetime | None = None) -> bool:
+        if not self._ranges:
+            return True
+        m = self._minute(now or datetime.now())
+        return any(start <= m < end for start, end in self._ranges)
+
+    def check_delay(self, now: datetime | None = None) -> float:
+        """Secondes jusqu'à la prochaine ouverture ou fermeture, bornées à [1, CHECK_SECONDS]"""
+        if not self._ranges:
+            return self.CHECK_SECONDS
+        m = self._minute(now or datetime.now())
+        bounds = {b for r in self._ranges for b in r}
+        until = min(((b - m) % self.WEEK) or self.WEEK for b in bounds) * 60
+        return min(max(until, 1.0), self.CHECK_SECONDS)
+
+    def next_opening(self, now: datetime | None = None) -> str:
+        """Prochaine ouverture, ex. "lun 07:30" (pour l'écran et les logs)"""
+        now = now or datetime.now()
+        m = self._minute(now)
+        start = min((s for s, _ in self._ranges), key=lambda s: (s - m) % self.WEEK)
+        return f"{self.DAYS[start // 1440 % 7]} {start % 1440 // 60:02d}:{start % 60:02d}"
+
+async def suspend_data_layer(scheduler, suspended: bool):
+    """Veille : plus de requêtes ni de connexions ouvertes ; au réveil, un cycle de rattrapage immédiat"""
+    if scheduler is None:
+        return  # écran abonné : c'est le démon qui interroge Redash, selon ses propres heures
+    scheduler.paused = suspended
+    if suspended:
+        # Avec --worker, le processus fils ferme les siennes en recevant la pause
+        await RedashScraper.connections.aclose()
+    else:
+        scheduler.trigger()
+
+async def follow_business_hours(hours: BusinessHours, scheduler, on_change=None):
+    """Met la couche données en veille hors des heures d'ouverture (démon --serve et framebuffer).
+
+    À lancer avant scheduler.run() : hors des heures, la pause précède la première requête.
+    """
+    asleep = False
+    while True:
+        if hours.is_open() == asleep:
+            asleep = not asleep
+            if asleep:
+                logger.info(f"Hors des heures d'ouverture : veille jusqu'à {hours.next_opening()}")
+            else:
+                logger.info("Heures d'ouverture : reprise et rafraîchissement de rattrapage")
+            await suspend_data_layer(scheduler, asleep)
+            if on_change:
+                on_change(asleep)
+        await asyncio.sleep(hours.check_delay())
 
 # ─────────────────────────────────────────────
 # UI layer
 # ─────────────────────────────────────────────
 
-class DashboardApp(ctk.CTk):
-    COLORS = {"positive": "#00C853", "negative": "#FF1744", "neutral": "#9E9E9E"}
+class UpdateBus:
+    """Mises à jour de l'interface postées depuis n'importe quel thread, la plus récente l'emporte.
+
+    post() range l'appel sous une clé ; s'il en attendait déjà un pour cette clé, il est
+    remplacé. drain(), dans le thread Tk, applique en un seul lot tout ce qui attend.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: dict = {}
+        self.posted = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.batches = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def post(self, key, func, *args):
+        with self._lock:
+            self.posted += 1
+            if self._pending.pop(key, None) is not None:
+                self.coalesced += 1
+            # Réinséré en fin : l'ordre d'application suit la dernière mise à jour
+            self._pending[key] = (func, args)
+            self.max_depth = max(self.max_depth, len(self._pending))
+
+    def drain(self) -> int:
+        """Applique le lot en attente (thread Tk uniquement) ; retourne sa taille"""
+        if not self._pending:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for func, args in pending.values():
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error(f"Mise à jour de l'interface en échec : {e}")
+        self.applied += len(pending)
+        self.batches += 1
+        return len(pending)
+
+class WidgetState:
+    """Dernier état poussé à chaque widget : seules les propriétés modifiées sont reconfigurées.
+
+    Chaque `configure` d'un widget CTk redessine son cadre arrondi ; les appels sans
+    changement sont comptés dans `skipped` au lieu d'être envoyés.
+    """
+
+    def __init__(self):
+        self._state: dict[tuple, dict] = {}
+        self.applied = 0
+        self.skipped = 0
+
+    def push(self, key: tuple, widget, **props) -> bool:
+        last = self._state.setdefault(key, {})
+        changed = {k: v for k, v in props.items() if k not in last or last[k] != v}
+        if not changed:
+            self.skipped += 1
+            return False
+        widget.configure(**changed)
+        last.update(changed)
+        self.applied += 1
+        return True
+
+    def forget(self, key: tuple | None = None):
+        """Oublie l'état connu (d'un widget ou de tous), pour forcer le prochain configure"""
+        if key is None:
+            self._state.clear()
+        else:
+            self._state.pop(key, None)
+
+class DashboardApp(ctk.CTk if ctk else object):
+    COLORS = STYLE_COLORS
+    # Durée maximale d'un cycle de rafraîchissement (s), inférieure au plus petit intervalle
+    REFRESH_DEADLINE = 4.5
+    # Regroupe les écritures du cache d'état (ms)
+    STATE_SAVE_DELAY = 2_000
+    # Période du battement qui mesure les blocages de la boucle Tk (ms)
+    HEARTBEAT_MS = 100
+    # Période de vidage de l'UpdateBus : au plus un lot de mises à jour par frame (ms)
+    FRAME_MS = 40
+    SPARKLINE_HEIGHT = 70
 
-    def __init__(self, base_url: str, cfgs: list[dict]):
+    def __init__(self, base_url: str, layout: dict, state_file: str = DEFAULT_STATE_FILE,
+                 asset_memory_mb: int = 64, metrics_port: int | None = None, metrics_host: str = "127.0.0.1",
+                 subscribe_url: str | None = None, profile: StartupProfile | None = None,
+                 print_profile: bool = False, history_days: float = 1, worker: bool = False,
+                 hours: BusinessHours | None = None):
+        self.profile = profile or StartupProfile()
+        self._print_profile = print_profile
         super().__init__()
         self.title("Dashboard Ventes")
         self.attributes("-fullscreen", True)
         self.bind("<Escape>", lambda *_: self.attributes("-fullscreen", False))
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
+        self.profile.mark("fenêtre Tk")
 
         self.loop = asyncio.new_event_loop()
         threading.Thread(target=self.loop.run_forever, daemon=True).start()
-        self.scrapers = [RedashScraper(c["api_key"], base_url) for c in cfgs]
-        self.queries = [c["id"] for c in cfgs]
+        cfgs = self.panels = layout["panels"]
+        self.queries = [panel_key(c) for c in cfgs]
         self.mappings = [c["mapping"] for c in cfgs]
-        self.units = {0: "%", 1: "€", 2: "€"}
-        self.last_gift = {0: 0, 1: 0, 2: 0}
+        self.scrapers, self.fetcher, self.scheduler, self.subscriber = build_data_layer(
+            base_url, cfgs, self.REFRESH_DEADLINE, self._on_panel_fetched, self._on_cycle_done,
+            subscribe_url=subscribe_url, worker=worker)
+        self.units = {i: c["unit"] for i, c in enumerate(cfgs)}
+        self.last_gift = {i: 0 for i, c in enumerate(cfgs) if c.get("thresholds")}
+        # Panneau dont l'évolution colore tous les blocs et le fond du logo
+        self._theme_idx = next((i for i, c in enumerate(cfgs) if c.get("theme")), None)
+        # Pages de panneaux affichées en rotation ; les emplacements de la grille sont réutilisés
+        per_page = layout["per_page"]
+        self.pages = [list(range(i, min(i + per_page, len(cfgs)))) for i in range(0, len(cfgs), per_page)]
+        self._columns = layout["columns"]
+        self._slot_count = len(self.pages[0])
+        self._page_ms = int(layout["page_seconds"] * 1000)
+        self.page = 0
+        self._slots = {}
+        self._visible = {}  # index de panneau -> emplacement, pour la page affichée
+        self._values = {}
+        # Historique compact de chaque panneau (history_days jours d'échantillons à 5 s) et courbe du jour
+        self._history = [PanelHistory(int(history_days * 86400 / 5)) for _ in cfgs]
+        self._sparklines = [Sparkline() if c.get("sparkline", True) else None for c in cfgs]
         self._last_max_dates = {}  # Pour stocker les MAX_DATE du JSON
         self.test_mode = False
         self.logo_image = None
         self._last_ratios = {}  # Pour suivre les évolutions
-        self.load_logo()
-        self.confetti_animation = ConfettiAnimation(self)
+        self.view = WidgetState()
+        # Seul chemin de la boucle asyncio vers Tk : vidé par _pump_updates
+        self.updates = UpdateBus()
+        self._render_count = 0
+        self._last_panels = {}  # Dernières valeurs reçues de Redash, persistées dans le cache d'état
+        self.state_cache = StateCache(state_file)
+        self.history_store = HistoryStore(os.path.join(os.path.dirname(state_file), "history"))
+        self._state_save_pending = False
+        self.assets = AssetCache(memory_budget=asset_memory_mb * 1024 * 1024)
+        self.confetti_animation = ConfettiAnimation(self, self.assets)
+        self._metrics_port, self._metrics_host = metrics_port, metrics_host
+        # Veille hors des heures d'ouverture ; les after périodiques sont gardés pour être annulés
+        self.hours = hours or BusinessHours()
+        self.sleeping = False
+        self._page_job = None
+        self.profile.mark("données")
         self._build_ui()
         self.bind_all("<KeyPress>", self._on_keypress)
-        self._tick()
+        self.profile.mark("widgets")
+        self._restore_state()
+        self.profile.mark("cache d'état")
+        # Logo, GIF, réseau et métriques attendent que la première image soit à l'écran
+        self.after(0, self._on_first_paint)
+        self._heartbeat_at = time.perf_counter()
+        self._heartbeat_job = self.after(self.HEARTBEAT_MS, self._heartbeat)
+        self._pump_job = self.after(self.FRAME_MS, self._pump_updates)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        self._test_keys_pressed = set()
+        self._test_keys_timer = None
+        self._test_job = None
+
+    # ──────────────────────────────────────────
+    # Démarrage : premier affichage puis étapes différées, une par passage Tk
+    # ──────────────────────────────────────────
+    def _on_first_paint(self):
+        self.update_idletasks()
+        self.profile.mark("premier affichage")
+        logger.info(f"Premier affichage {self.profile.elapsed() * 1000:.0f} ms après le lancement")
+        steps = [
+            ("démarrage données", self._start_data_layer),
+            ("logo", self._build_logo),
+            ("préchargement GIF", self._start_asset_preload),
+        ]
+        self.after(1, self._run_startup_steps, steps)
+
+    def _run_startup_steps(self, steps: list):
+        phase, step = steps.pop(0)
+        try:
+            step()
+        except Exception as e:
+            logger.error(f"Démarrage : étape « {phase} » en échec : {e}")
+        self.profile.mark(phase)
+        if steps:
+            self.after(1, self._run_startup_steps, steps)
+            return
+        logger.info(f"Démarrage terminé en {self.profile.elapsed() * 1000:.0f} ms")
+        if self._print_profile:
+            print(self.profile.report(), flush=True)
         self.after(1000, self.check_confetti_prerequisites)
 
+    def _start_data_layer(self):
+        if self.hours:
+            # Avant scheduler.run() : lancé hors des heures, aucune requête avant l'ouverture
+            self._check_hours()
+        asyncio.run_coroutine_threadsafe((self.subscriber or self.scheduler).run(), self.loop)
+        asyncio.run_coroutine_threadsafe(monitor_loop_lag(), self.loop)
+        METRICS.register_collector(lambda: [
+            ("ui_configure_total", self.view.applied, {"result": "applied"}),
+            ("ui_configure_total", self.view.skipped, {"result": "skipped"}),
+            ("panel_history_bytes", sum(h.nbytes for h in self._history), {}),
+            ("ui_bus_depth", self.updates.depth, {}),
+            ("ui_bus_max_depth", self.updates.max_depth, {}),
+            ("ui_bus_updates_total", self.updates.posted, {"result": "posted"}),
+            ("ui_bus_updates_total", self.updates.coalesced, {"result": "coalesced"}),
+            ("ui_bus_batches_total", self.updates.batches, {}),
+        ])
+        if self._metrics_port:
+            asyncio.run_coroutine_threadsafe(METRICS.serve(self._metrics_host, self._metrics_port), self.loop)
 
-        self._test_keys_pressed = set()
+    def _start_asset_preload(self):
+        if self.sleeping:
+            return  # lancé hors des heures d'ouverture : préchargé au réveil
+        gif_paths = sorted(glob.glob("gifts/*.gif"))
+        self.assets.preload(gif_paths, ConfettiAnimation.GIF_SIZE)
+        self.assets.warm(self, gif_paths, ConfettiAnimation.GIF_SIZE)
+
+    def _build_logo(self):
+        self.load_logo()
+        if not self.logo_image:
+            return
+        # Créer un fond pour le logo (couleur par défaut)
+        self.logo_bg = ctk.CTkFrame(self, fg_color="#FFFFFF", corner_radius=12)
+        self.logo_bg.place(relx=0.0, rely=0.0, anchor="nw", x=20, y=20)
+
+        self.logo_label = ctk.CTkLabel(
+            self.logo_bg, image=self.logo_image, text="", fg_color="transparent"
+        )
+        self.logo_label.pack(padx=10, pady=10)
+        self.logo_label.lift()
+        # Le fond suit déjà l'évolution éventuellement restaurée depuis le cache
+        self._update_logo_background()
 
     def load_logo(self):
-        logo_extensions = ['*.png', '*.PNG', '*.jpg', '*.JPG', '*.jpeg', '*.JPEG']
-        for pattern in logo_extensions:
-            for path in glob.glob(pattern):
-                try:
-                    image = Image.open(path).convert('RGBA')
-                    # Resize ONLY, pas de fond blanc
-                    original_width, original_height = image.size
-                    
-                    # D'abord réduire la taille du logo à 80% de sa taille originale
-                    new_width = int(original_width * 0.8)
-                    new_height = int(original_height * 0.8)
-                    
-                    # Ensuite, s'assurer que la largeur ne dépasse pas 198px
-                    if new_width > 198:
-                        ratio = 198 / new_width
-                        new_width = 198
-                        new_height = int(new_height * ratio)
-                    elif new_width < 198:
-                        # Si trop petit après réduction, agrandir jusqu'à 198px
-                        ratio = 198 / new_width
-                        new_width = 198
-                        new_height = int(new_height * ratio)
-                        
-                    image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    self.logo_image = ctk.CTkImage(light_image=image, dark_image=image, size=image.size)
-                    logger.info(f"Logo chargé (sans fond ajouté) : {path}")
-                    return
-                except Exception as e:
-                    logger.warning(f"Erreur lors du chargement du logo {path}: {e}")
-        logger.warning("Aucun logo trouvé dans le répertoire courant")
+        image = load_logo_image(self.assets)
+        if image is not None:
+            self.logo_image = ctk.CTkImage(light_image=image, dark_image=image, size=image.size)
 
 
     def _build_ui(self):
-        self.grid_rowconfigure((0, 1), weight=1)
-        self.grid_columnconfigure((0, 1), weight=1)
-        titles_dict = get_dynamic_titles()
-        titles = [titles_dict[0], titles_dict[1], titles_dict[2]]
-        pos = [(0, 0), (0, 1), (1, 0)]
-        self.q = {}
-        for i, ((r, c), title) in enumerate(zip(pos, titles)):
-            frame = ctk.CTkFrame(self, corner_radius=14)
-            if i == 2:
-                frame.grid(row=r, column=c, columnspan=2, padx=14, pady=14, sticky="nsew")
-            else:
-                frame.grid(row=r, column=c, padx=14, pady=14, sticky="nsew")
-            header_frame = ctk.CTkFrame(frame, fg_color="transparent")
-            header_frame.pack(pady=12, fill="x")
-            title = ctk.CTkLabel(
-                header_frame,
-                text=title,
-                font=("Montserrat", 49, "bold"),
-                text_color="#000000",
-                anchor="center"
-            )
-            title.pack(anchor="center")
-            val = ctk.CTkLabel(frame, text="--", font=("Montserrat", 151, "bold"), text_color="#ffffff")
-            val.pack(expand=True)
-            if i == 0:
-                inspiration = ctk.CTkLabel(
-                    frame,
-                    text="",
-                    font=("Montserrat", 47, "italic"),
-                    text_color="#888888"
-                )
-                inspiration.pack(pady=(0, 20), expand=True)
-                self.q[i] = {"frame": frame, "val": val, "title": title, "inspiration": inspiration}
-            else:
-                trend = ctk.CTkLabel(frame, text="→", font=("Montserrat", 115), text_color="#ffffff")
-                trend.pack(pady=6)
-                self.q[i] = {"frame": frame, "val": val, "trend": trend, "title": title}
+        rows = math.ceil(self._slot_count / self._columns)
+        self.grid_rowconfigure(tuple(range(rows)), weight=1)
+        self.grid_columnconfigure(tuple(range(self._columns)), weight=1)
 
         # -- Config/test panel (hidden by default)
         self.test_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -446,20 +3072,90 @@ class DashboardApp(ctk.CTk):
         self.celebration_gift.pack()
         self.celebration_frame.place_forget()
 
-        if self.logo_image:
-            # Créer un fond pour le logo (couleur par défaut)
-            self.logo_bg = ctk.CTkFrame(self, fg_color="#FFFFFF", corner_radius=12)
-            self.logo_bg.place(relx=0.0, rely=0.0, anchor="nw", x=20, y=20)
-
-            self.logo_label = ctk.CTkLabel(
-                self.logo_bg, image=self.logo_image, text="", fg_color="transparent"
-            )
-            self.logo_label.pack(padx=10, pady=10)
-            self.logo_label.lift()
-            self.logo_label.update()
-
         self.ts = ctk.CTkLabel(self, text="", font=("Montserrat", 43), text_color="#888888")
         self.ts.place(relx=1, rely=1, anchor="se", x=-16, y=-16)
+        if len(self.pages) > 1:
+            self.page_label = ctk.CTkLabel(self, text="", font=("Montserrat", 43), text_color="#888888")
+            self.page_label.place(relx=0, rely=1, anchor="sw", x=16, y=-16)
+        self._show_page(0)
+
+    # ──────────────────────────────────────────
+    # Pages : emplacements construits à la demande et réutilisés
+    # ──────────────────────────────────────────
+    def _slot(self, i: int) -> dict:
+        """Emplacement i de la grille, construit au premier affichage"""
+        slot = self._slots.get(i)
+        if slot is not None:
+            return slot
+        r, c = divmod(i, self._columns)
+        # Le dernier emplacement d'une rangée incomplète occupe la largeur restante
+        span = self._columns - c if i == self._slot_count - 1 else 1
+        frame = ctk.CTkFrame(self, corner_radius=14)
+        frame.grid(row=r, column=c, columnspan=span, padx=14, pady=14, sticky="nsew")
+        frame.lower()  # sous le logo, l'horodatage et les calques de test/célébration
+        header_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        header_frame.pack(pady=12, fill="x")
+        title = ctk.CTkLabel(
+            header_frame,
+            text="",
+            font=("Montserrat", 49, "bold"),
+            text_color="#000000",
+            anchor="center"
+        )
+        title.pack(anchor="center")
+        val = ctk.CTkLabel(frame, text="--", font=("Montserrat", 151, "bold"), text_color="#ffffff")
+        val.pack(expand=True)
+        # Courbe du jour : une seule ligne de canvas, prolongée à chaque nouveau point
+        spark = tk.Canvas(frame, height=self.SPARKLINE_HEIGHT, highlightthickness=0, bd=0)
+        line = spark.create_line(0, 0, 0, 0, width=3, capstyle="round", joinstyle="round", state="hidden")
+        spark.bind("<Configure>", lambda _e, i=i: self._draw_sparkline(i, full=True))
+        detail = ctk.CTkLabel(frame, text="", text_color="#ffffff")
+        slot = self._slots[i] = {"frame": frame, "title": title, "val": val, "detail": detail,
+                                 "spark": spark, "line": line, "line_color": None, "drawn": None,
+                                 "layout": None, "idx": None}
+        return slot
+
+    def _bind_slot(self, i: int, idx: int):
+        """Associe le panneau idx à l'emplacement i ; courbe et ligne de détail changent de forme si besoin"""
+        slot = self._slot(i)
+        slot["idx"] = idx
+        slot["drawn"] = None  # courbe d'un autre panneau : à redessiner entièrement
+        kind = self.panels[idx]["detail"]
+        has_sparkline = self._sparklines[idx] is not None
+        if slot["layout"] != (kind, has_sparkline):
+            slot["layout"] = (kind, has_sparkline)
+            detail = slot["detail"]
+            detail.pack_forget()
+            slot["spark"].pack_forget()
+            if has_sparkline:
+                slot["spark"].pack(fill="x", padx=24)
+            if kind == "inspiration":
+                detail.configure(font=("Montserrat", 47, "italic"))
+                detail.pack(pady=(0, 20), expand=True)
+            elif kind == "trend":
+                detail.configure(font=("Montserrat", 115))
+                detail.pack(pady=6)
+            self.view.forget((i, "detail"))
+        slot["frame"].grid()
+
+    def _show_page(self, page: int):
+        self.page = page
+        indices = self.pages[page]
+        for i in range(self._slot_count):
+            if i < len(indices):
+                self._bind_slot(i, indices[i])
+            elif i in self._slots:
+                self._slots[i]["frame"].grid_remove()
+                self._slots[i]["idx"] = None
+        self._visible = {idx: i for i, idx in enumerate(indices)}
+        for i in self._visible.values():
+            self._render_slot(i)
+        if len(self.pages) > 1:
+            # Seule la page affichée est interrogée à pleine cadence
+            if self.scheduler is not None:
+                self.loop.call_soon_threadsafe(self.scheduler.set_visible, indices)
+            self.page_label.configure(text=f"{page + 1}/{len(self.pages)}")
+            self._page_job = self.after(self._page_ms, self._show_page, (page + 1) % len(self.pages))
 
     # ──────────────────────────────────────────
     # KEYBIND: Alt+2+3 → toggle test menu
@@ -474,14 +3170,20 @@ class DashboardApp(ctk.CTk):
                 self.test_frame.place(relx=0.02, rely=0.02)
             self._test_keys_pressed.clear()
         else:
-            # auto clear after 1s to éviter stuck
-            self.after(1000, lambda: self._test_keys_pressed.clear())
+            # auto clear after 1s to éviter stuck ; un seul after en attente, repoussé à chaque touche
+            if self._test_keys_timer is not None:
+                self.after_cancel(self._test_keys_timer)
+            self._test_keys_timer = self.after(1000, self._clear_test_keys)
+
+    def _clear_test_keys(self):
+        self._test_keys_timer = None
+        self._test_keys_pressed.clear()
 
     # ──────────────────────────────────────────
     # KEYBIND: Alt+T → toggle test menu
     # ──────────────────────────────────────────
     def _on_keypress(self, event):
-        print(f"KEYPRESS DEBUG: key={event.keysym} state={event.state} char={event.char} keycode={event.keycode}")
+        logger.debug("Touche : key=%s state=%s char=%r keycode=%s", event.keysym, event.state, event.char, event.keycode)
         is_mac = platform.system() == "Darwin"
         key = event.keysym.lower()
         shift = (event.state & 0x1) != 0
@@ -516,149 +3218,295 @@ class DashboardApp(ctk.CTk):
     def _toggle_test_mode(self):
         self.test_mode = not self.test_mode
         logger.info(f"Mode test: {'ACTIVÉ' if self.test_mode else 'DÉSACTIVÉ'}")
+        self.loop.call_soon_threadsafe(self._set_scheduler_paused, self.test_mode or self.sleeping)
+        if self._test_job is not None:
+            self.after_cancel(self._test_job)
+            self._test_job = None
+        if self.test_mode:
+            self._test_tick()
+
+    def _set_scheduler_paused(self, paused: bool):
+        if self.scheduler is None:
+            return
+        self.scheduler.paused = paused
+        if not paused:
+            self.scheduler.trigger()
 
     def _simulate_test_data(self, event=None):
         logger.info("Simulation de données de test")
         test_ratios = [5.0, 10.0, 20.0, -10.0, -20.0]
+        target = next(iter(self.last_gift), 0)
         for i, ratio in enumerate(test_ratios):
-            self.after(i * 2000, lambda r=ratio: self._update_quad(0, r, r))
+            self.after(i * 2000, lambda r=ratio: self._update_quad(target, r, r))
 
     def _reset_test_state(self, event=None):
         logger.info("Reset de l'état des tests")
-        self.last_gift = {0: 0, 1: 0, 2: 0}
+        self.last_gift = dict.fromkeys(self.last_gift, 0)
         self.confetti_animation.stop_animation()
         self._hide_celebration_block()
 
     def check_confetti_prerequisites(self):
-        logger.info("Vérification des prérequis confettis:")
-        logger.info(f"- Fenêtre dimensions: {self.winfo_width()}x{self.winfo_height()}")
-        logger.info(f"- Animation instance: {self.confetti_animation}")
-        logger.info(f"- Last gift status: {self.last_gift}")
-        try:
-            test_canvas = tk.Canvas(self, width=100, height=100)
-            test_canvas.destroy()
-            logger.info("- Canvas test: OK")
-        except Exception as e:
-            logger.error(f"- Canvas test: ERREUR {e}")
+        # Diagnostic de démarrage : seulement avec DASHBOARD_DEBUG (glob et winfo sur le thread Tk)
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug("Vérification des prérequis confettis:")
+        logger.debug(f"- Fenêtre dimensions: {self.winfo_width()}x{self.winfo_height()}")
+        logger.debug(f"- Animation instance: {self.confetti_animation}")
+        logger.debug(f"- Last gift status: {self.last_gift}")
+        logger.debug(f"- GIF disponibles: {len(glob.glob('gifts/*.gif'))}")
 
     # ──────────────────────────────────────────
-    # Scheduler
+    # Scheduler (mode test ; les données réelles passent par le RefreshScheduler)
     # ──────────────────────────────────────────
-    def _tick(self):
-        self._refresh()
-        self.after(5_000, self._tick)
+    def _test_tick(self):
+        self._test_job = None
+        if not self.test_mode or self.sleeping:
+            return
+        for idx, panel in enumerate(self.panels):
+            if panel["format"] == "evolution":
+                value = random.uniform(-30, 30)
+                ratio = value
+            else:
+                value = random.uniform(1000, 50000)
+                ratio = random.uniform(-10, 20)
+            self._update_quad(idx, value, ratio)
+        self.ts.configure(text=f"Mode TEST - {datetime.now():%H:%M:%S}")
+        self._test_job = self.after(5_000, self._test_tick)
 
     # ──────────────────────────────────────────
     # Data fetch
     # ──────────────────────────────────────────
-    def _refresh(self):
-        async def fetch():
-            if self.test_mode:
-                for idx in range(3):
-                    if idx == 0:
-                        value = random.uniform(-30, 30)
-                        ratio = value
-                    else:
-                        value = random.uniform(1000, 50000)
-                        ratio = random.uniform(-10, 20)
-                    self.after(0, self._update_quad, idx, value, ratio)
-                self.after(0, lambda: self.ts.configure(text=f"Mode TEST - {datetime.now():%H:%M:%S}"))
-                return
-            for idx, (scr, qid, mp) in enumerate(zip(self.scrapers, self.queries, self.mappings)):
-                t0 = time.perf_counter()
-                try:
-                    data = await scr.execute_query(qid)
-                    logger.info("Query %s en %.2fs", qid, time.perf_counter() - t0)
-                    rows = data.get("query_result", {}).get("data", {}).get("rows", [])
-                    if not rows:
-                        continue
-                    row = rows[0]
-                    value = float(row.get(mp["value"], 0))
-                    ratio = float(row.get(mp["ratio"], 0))
-                    
-                    # Extraire MAX_DATE si disponible (pour le bloc CA année dernière)
-                    if "MAX_DATE" in row:
-                        self._last_max_dates[idx] = row["MAX_DATE"]
-                    
-                    logger.info("Query %s: value=%s, ratio=%s", qid, value, ratio)
-                    self.after(0, self._update_quad, idx, value, ratio)
-                except Exception as e:
-                    logger.error(f"Erreur query {qid}: {e}")
-            self.after(0, lambda: self.ts.configure(text=f"Dernière mise à jour : {datetime.now():%H:%M:%S}"))
+    def _on_panel_fetched(self, idx: int, panel: dict):
+        """Appelé depuis la boucle asyncio dès qu'un panneau a été récupéré"""
+        # Les événements du démon partagé portent déjà leur heure de récupération
+        self.updates.post(("panel", idx), self._apply_panel, idx, panel, panel.get("fetched_at") or time.time())
+
+    def _on_cycle_done(self, stats: dict):
+        """Appelé depuis la boucle asyncio à la fin de chaque cycle du RefreshScheduler"""
+        if stats["updated"] or stats["unchanged"]:
+            self.updates.post("timestamp", self._set_timestamp, datetime.now())
+
+    def _apply_panel(self, idx: int, panel: dict, fetched_at: float):
+        if self.test_mode:
+            return
+        if panel.get("max_date") is not None:
+            self._last_max_dates[idx] = panel["max_date"]
+        self._last_panels[idx] = {"value": panel["value"], "ratio": panel["ratio"], "fetched_at": fetched_at}
+        self._update_quad(idx, panel["value"], panel["ratio"], at=fetched_at)
+        self._schedule_state_save()
+
+    def _set_timestamp(self, at: datetime):
+        self.ts.configure(text=f"Dernière mise à jour : {at:%H:%M:%S}")
+
+    def _pump_updates(self):
+        """Une frame : applique d'un bloc toutes les mises à jour postées depuis la précédente"""
+        batch = self.updates.drain()
+        if batch and self.updates.batches % 500 == 0:
+            logger.info("Mises à jour UI : %d postées, %d remplacées avant affichage, file max %d",
+                        self.updates.posted, self.updates.coalesced, self.updates.max_depth)
+        self._pump_job = self.after(self.FRAME_MS, self._pump_updates)
+
+    def _heartbeat(self):
+        """Mesure le retard de la boucle Tk : un battement en retard = l'UI était bloquée"""
+        now = time.perf_counter()
+        METRICS.observe("tk_stall_seconds", max(0.0, now - self._heartbeat_at - self.HEARTBEAT_MS / 1000))
+        self._heartbeat_at = now
+        self._heartbeat_job = self.after(self.HEARTBEAT_MS, self._heartbeat)
+
+    # ──────────────────────────────────────────
+    # Veille hors des heures d'ouverture
+    # ──────────────────────────────────────────
+    def _check_hours(self):
+        """Entre en veille ou en sort selon les heures d'ouverture, puis revient à la prochaine bascule"""
+        is_open = self.hours.is_open()
+        if is_open and self.sleeping:
+            self._wake_up()
+        elif not is_open and not self.sleeping:
+            self._go_to_sleep()
+        self.after(int(self.hours.check_delay() * 1000), self._check_hours)
+
+    def _go_to_sleep(self):
+        """Plus de requêtes, de frames, de battement ni de tick du mode test ; images et connexions libérées"""
+        opening = self.hours.next_opening()
+        logger.info(f"Hors des heures d'ouverture : veille jusqu'à {opening}")
+        self.sleeping = True
+        for job in (self._heartbeat_job, self._pump_job, self._page_job, self._test_job, self._test_keys_timer):
+            if job is not None:
+                self.after_cancel(job)
+        self._heartbeat_job = self._pump_job = self._page_job = self._test_job = self._test_keys_timer = None
+        self.confetti_animation.stop_animation()
+        self.confetti_animation.gift_frames = []
+        self.assets.clear()
+        self.ts.configure(text=f"En veille jusqu'à {opening}")
+        asyncio.run_coroutine_threadsafe(suspend_data_layer(self.scheduler, True), self.loop)
+
+    def _wake_up(self):
+        """Relance battement, frames, rotation des pages, GIF et mode test, puis un cycle de rattrapage"""
+        logger.info("Heures d'ouverture : reprise et rafraîchissement de rattrapage")
+        self.sleeping = False
+        self._heartbeat_at = time.perf_counter()
+        self._heartbeat_job = self.after(self.HEARTBEAT_MS, self._heartbeat)
+        self._pump_job = self.after(self.FRAME_MS, self._pump_updates)
+        self._show_page(self.page)
+        self._start_asset_preload()
+        self.ts.configure(text="Reprise – actualisation…")
+        if self._test_keys_pressed:
+            self._test_keys_timer = self.after(1000, self._clear_test_keys)
+        if self.test_mode:
+            self._test_tick()
+        if not self.test_mode:
+            asyncio.run_coroutine_threadsafe(suspend_data_layer(self.scheduler, False), self.loop)
+
+    def _on_close(self):
+        """Fermeture de la fenêtre : connexions HTTP et processus de données arrêtés avant de quitter"""
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        try:
+            future.result(timeout=4)
+        except Exception as e:
+            logger.warning(f"Fermeture du client HTTP incomplète : {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.destroy()
+
+    async def _shutdown(self):
+        if isinstance(self.scheduler, PanelWorker):
+            await self.scheduler.aclose()
+        await RedashScraper.connections.aclose()
+
+    # ──────────────────────────────────────────
+    # Cache d'état (dernières valeurs connues)
+    # ──────────────────────────────────────────
+    def _restore_state(self):
+        """Affiche immédiatement les dernières valeurs connues, marquées comme en cache"""
+        # Historique par clé de panneau : valable même si l'ordre des panneaux a changé
+        restore_histories(self.history_store, self.queries, self._history, self._sparklines)
+        state = self.state_cache.load()
+        if not state:
+            return
+        if state["queries"] is not None and state["queries"] != self.queries:
+            logger.info("Cache d'état ignoré : la configuration des panneaux a changé")
+            return
+        # last_gift d'abord : un redémarrage ne relance pas une célébration déjà jouée
+        self.last_gift.update({k: v for k, v in state["last_gift"].items() if k in self.last_gift})
+        self._last_max_dates.update(state["max_dates"])
+        panels = state["panels"]
+        for idx in sorted(panels):
+            if idx < len(self.panels):
+                self._last_panels[idx] = panels[idx]
+                self._update_quad(idx, panels[idx]["value"], panels[idx]["ratio"], at=panels[idx]["fetched_at"])
+        if panels:
+            cached_at = datetime.fromtimestamp(max(p["fetched_at"] for p in panels.values()))
+            self.ts.configure(text=f"Valeurs en cache du {cached_at:%d/%m %H:%M:%S} – actualisation…")
+
+    def _schedule_state_save(self):
+        if not self._state_save_pending:
+            self._state_save_pending = True
+            self.after(self.STATE_SAVE_DELAY, self._save_state)
 
-        asyncio.run_coroutine_threadsafe(fetch(), self.loop)
+    def _save_state(self):
+        self._state_save_pending = False
+        state = {
+            "panels": dict(self._last_panels),
+            "max_dates": dict(self._last_max_dates),
+            "last_gift": dict(self.last_gift),
+            "queries": list(self.queries),
+        }
+        history = self.history_store.pending(self.queries, self._history)
+        # Écriture disque hors du thread Tk
+        self.loop.call_soon_threadsafe(self.loop.run_in_executor, None, self.state_cache.save, state)
+        self.loop.call_soon_threadsafe(self.loop.run_in_executor, None, self.history_store.append, history)
 
     # ──────────────────────────────────────────
     # UI update
     # ──────────────────────────────────────────
-    def _update_quad(self, idx: int, value: float, ratio: float):
-        unit = self.units[idx]
-        
-        # Sauvegarder le ratio pour mise à jour du logo
+    def _update_quad(self, idx: int, value: float, ratio: float, at: float | None = None):
+        # Sauvegarder la valeur pour réafficher le panneau quand sa page revient
+        self._values[idx] = value
         self._last_ratios[idx] = ratio
-        
-        # NOUVEAU: Utiliser uniquement l'évolution (bloc 0) pour déterminer l'état de TOUS les blocs
-        evolution_ratio = self._last_ratios.get(0, 0) if idx != 0 else ratio
-        color, arrow = self._style(evolution_ratio)
-        
-        lighter = lighten(color, 0.85)
-        title_color = "#000000"
-        
-        # Mettre à jour les titres avec les bonnes dates
-        titles_dict = get_dynamic_titles(self._last_max_dates)
-        self.q[idx]["title"].configure(text=titles_dict[idx], text_color=title_color)
-        formatted_value = f"{format_evolution(value)}{unit}" if idx == 0 else self._fmt(value, unit)
-        self.q[idx]["val"].configure(text=formatted_value, text_color=color)
-        if idx == 0:
-            pass
-        else:
-            # Pour les blocs CA, afficher seulement la flèche (pas le pourcentage d'évolution)
-            trend_txt = arrow
-            self.q[idx]["trend"].configure(text=trend_txt, text_color=color)
-        self.q[idx]["frame"].configure(fg_color=lighter)
-        if idx == 0:
-            if ratio > 0:
-                self.q[idx]["inspiration"].configure(
-                    text=" 1% d'inspiration et 99% de transpiration.",
-                    text_color="#000000"
-                )
-            elif ratio < 0:
-                self.q[idx]["inspiration"].configure(
-                    text=" Il n'y a de vie que dans les marges.",
-                    text_color="#FF6B6B"
-                )
-            else:
-                self.q[idx]["inspiration"].configure(
-                    text=" L'équilibre est la clé du succès.",
-                    text_color="#87CEEB"
-                )
+        at = time.time() if at is None else at
+        self._history[idx].append(at, value, ratio)
+        if self._sparklines[idx] is not None:
+            self._sparklines[idx].add(at, value)
+
+        if idx == self._theme_idx:
+            # L'évolution de référence colore tous les blocs affichés
+            for slot in self._visible.values():
+                self._render_slot(slot)
+        elif idx in self._visible:
+            self._render_slot(self._visible[idx])
+
+        self._render_count += 1
+        if self._render_count % 100 == 0:
+            logger.info("Widgets : %d configure appliqués, %d évités (inchangés)", self.view.applied, self.view.skipped)
 
         # ----- FULLSCREEN CELEBRATION / WARNING -----
-        if idx == 0:
-            # Multiples de 10 positif (10, 20, 30, ...)
-            if ratio >= 10:
-                current_threshold = int(ratio // 10) * 10
-                if current_threshold > self.last_gift[idx]:
-                    self.last_gift[idx] = current_threshold
-                    message = f"{current_threshold}% Atteint"
-                    self.confetti_animation.start_animation(positive=True, message=message, threshold=current_threshold)
-                    self._show_celebration_block(current_threshold, positive=True)
-            # Multiples de 10 négatif (-10, -20, -30, ...)
-            elif ratio <= -10:
-                current_threshold = int(ratio // 10) * 10
-                if current_threshold < self.last_gift[idx]:
-                    self.last_gift[idx] = current_threshold
-                    message = f"{current_threshold}% En Baisse"  # Garde le signe négatif
-                    self.confetti_animation.start_animation(positive=False, message=message, threshold=current_threshold)
-                    self._show_celebration_block(current_threshold, positive=False)
-            else:
+        # Déclenchée même si le panneau n'est pas sur la page affichée
+        thresholds = self.panels[idx].get("thresholds")
+        if thresholds:
+            step = thresholds.get("step", 10)
+            # Multiples de step positifs (10, 20, ...) ou négatifs (-10, -20, ...)
+            current_threshold = threshold_crossed(ratio, step, self.last_gift[idx])
+            if current_threshold is not None:
+                self.last_gift[idx] = current_threshold
+                positive = current_threshold > 0
+                # Garde le signe négatif
+                message = f"{current_threshold}% {'Atteint' if positive else 'En Baisse'}"
+                self.confetti_animation.start_animation(positive=positive, message=message, threshold=current_threshold)
+                self._show_celebration_block(current_threshold, positive=positive)
+            elif -step < ratio < step:
                 # Auto-hide celebration if not at a multiple anymore
                 self._hide_celebration_block()
 
-        # Mettre à jour le fond du logo si c'est le premier quad
-        if idx == 0:
+        if idx == self._theme_idx:
             self._update_logo_background()
 
+    def _render_slot(self, i: int):
+        """Affiche dans l'emplacement i la dernière valeur connue de son panneau"""
+        slot = self._slots[i]
+        idx = slot["idx"]
+        theme_idx = idx if self._theme_idx is None else self._theme_idx
+        shown = panel_view(self.panels[idx], self._values.get(idx), self._last_ratios.get(idx),
+                           self._last_ratios.get(theme_idx, 0), self._last_max_dates.get(idx))
+        color = shown["color"]
+
+        # Seules les propriétés qui ont changé depuis le dernier rendu sont reconfigurées
+        view = self.view
+        view.push((i, "title"), slot["title"], text=shown["title"], text_color="#000000")
+        view.push((i, "val"), slot["val"], text=shown["value"], text_color=color)
+        view.push((i, "frame"), slot["frame"], fg_color=shown["background"])
+        if shown["detail"] is not None:
+            view.push((i, "detail"), slot["detail"], text=shown["detail"], text_color=shown["detail_color"])
+        if self._sparklines[idx] is not None:
+            view.push((i, "spark"), slot["spark"], bg=shown["background"])
+            if slot["line_color"] != color:
+                slot["line_color"] = color
+                slot["spark"].itemconfigure(slot["line"], fill=color)
+            self._draw_sparkline(i)
+
+    def _draw_sparkline(self, i: int, full: bool = False):
+        """Met à jour la courbe de l'emplacement i : seules les coordonnées modifiées sont envoyées à Tk"""
+        slot = self._slots[i]
+        sparkline = self._sparklines[slot["idx"]] if slot["idx"] is not None else None
+        if sparkline is None:
+            return
+        canvas = slot["spark"]
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        if width <= 1:
+            return  # pas encore affiché : <Configure> redessinera
+        full = full or slot["drawn"] is None
+        first, coords = sparkline.render(width, height, full=full)
+        if full or first == 0:
+            if len(sparkline.coords) >= 4:
+                canvas.coords(slot["line"], *sparkline.coords)
+                canvas.itemconfigure(slot["line"], state="normal")
+            else:
+                canvas.itemconfigure(slot["line"], state="hidden")
+        elif coords:
+            # Fin de courbe remplacée ou prolongée sans renvoyer toute la série
+            if first < slot["drawn"]:
+                canvas.dchars(slot["line"], first, "end")
+            canvas.insert(slot["line"], "end", coords)
+        slot["drawn"] = len(sparkline.coords)
+
     # ──────────────────────────────────────────
     # Fullscreen "celebration" block
     # ──────────────────────────────────────────
@@ -675,47 +3523,589 @@ class DashboardApp(ctk.CTk):
     # ──────────────────────────────────────────
     # Utils
     # ──────────────────────────────────────────
-    def _style(self, r: float):
-        if r > 0:
-            return self.COLORS["positive"], "↗"
-        if r < 0:
-            return self.COLORS["negative"], "↘"
-        return self.COLORS["neutral"], "→"
-
-    @staticmethod
-    def _fmt(num: float, unit: str):
-        if unit == "€":
-            return f"{ceil_signed(num):,}€".replace(",", " ")
-        return f"{ceil_signed(num)}{unit}"
+    # Partagés avec le rendu framebuffer
+    _style = staticmethod(panel_style)
+    _fmt = staticmethod(format_amount)
 
     def _update_logo_background(self):
-        """Met à jour le fond du logo selon l'évolution du premier quad (idx=0)"""
-        if hasattr(self, 'logo_bg') and len(self.q) > 0:
+        """Met à jour le fond du logo selon l'évolution du panneau de référence (theme)"""
+        if hasattr(self, 'logo_bg') and self._theme_idx is not None:
             try:
-                # Récupérer la dernière évolution du premier quad
-                if hasattr(self, '_last_ratios') and 0 in self._last_ratios:
-                    ratio = self._last_ratios[0]
+                if self._theme_idx in self._last_ratios:
+                    ratio = self._last_ratios[self._theme_idx]
                     color, _ = self._style(ratio)
                     lighter = lighten(color, 0.9)  # Un peu plus clair que les blocks
-                    self.logo_bg.configure(fg_color=lighter)
+                    self.view.push(("logo", "bg"), self.logo_bg, fg_color=lighter)
             except Exception as e:
                 logger.error(f"Erreur lors de la mise à jour du fond du logo: {e}")
 
+# ─────────────────────────────────────────────
+# Framebuffer (rendu Pillow, sans X ni Tk)
+# ─────────────────────────────────────────────
+
+class FramebufferSink:
+    """Écrit les zones modifiées dans /dev/fbN, ou dans un fichier brut au même format.
+
+    Formats pris en charge : 32 bits (BGRA, le cas des Pi avec HDMI) et 16 bits
+    (RGB565 little-endian, petits écrans SPI). Un fichier brut est en 32 bits.
+    """
+
+    # Tables de conversion RGB888 -> RGB565 : octet de poids fort (R5 G3) et faible (G3 B5)
+    _R_HIGH = [v & 0xF8 for v in range(256)]
+    _G_HIGH = [v >> 5 for v in range(256)]
+    _G_LOW = [(v << 3) & 0xE0 for v in range(256)]
+    _B_LOW = [v >> 3 for v in range(256)]
+
+    def __init__(self, path: str, size: tuple[int, int] = (1920, 1080), bpp: int = 32):
+        sysfs = os.path.join("/sys/class/graphics", os.path.basename(path))
+        if path.startswith("/dev/") and os.path.isdir(sysfs):
+            size, bpp, stride = self._probe(sysfs)
+            self.fd = os.open(path, os.O_RDWR)
+        else:
+            stride = size[0] * bpp // 8
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            os.ftruncate(self.fd, stride * size[1])
+        if bpp not in (16, 32):
+            raise SystemExit(f"Framebuffer {path} : {bpp} bits par pixel non pris en charge (16 ou 32)")
+        self.path, self.size, self.bpp, self.stride = path, size, bpp, stride
+        logger.info(f"Framebuffer {path} : {size[0]}x{size[1]}, {bpp} bits")
+
+    @staticmethod
+    def _probe(sysfs: str) -> tuple[tuple[int, int], int, int]:
+        """Résolution visible, profondeur et longueur de ligne lues dans /sys/class/graphics/fbN"""
+        def read(name):
+            with open(os.path.join(sysfs, name)) as f:
+                return f.read().strip()
+        # virtual_size peut doubler la hauteur (double tampon) : le mode courant donne la zone visible
+        try:
+            width, height = map(int, re.search(r"(\d+)x(\d+)", read("modes")).groups())
+        except (OSError, AttributeError):
+            width, height = map(int, read("virtual_size").split(","))
+        bpp = int(read("bits_per_pixel"))
+        try:
+            stride = int(read("stride"))
+        except OSError:
+            stride = width * bpp // 8
+        return (width, height), bpp, stride
+
+    def _encode(self, region) -> bytes:
+        if self.bpp == 32:
+            return region.convert("RGBA").tobytes("raw", "BGRA")
+        from PIL import Image, ImageChops
+        r, g, b = region.split()
+        high = ImageChops.add(r.point(self._R_HIGH), g.point(self._G_HIGH))
+        low = ImageChops.add(g.point(self._G_LOW), b.point(self._B_LOW))
+        return Image.merge("LA", (low, high)).tobytes()
+
+    def write(self, image, boxes: list[tuple]) -> int:
+        """Écrit les rectangles donnés de l'image, ligne par ligne ; retourne le nombre d'octets écrits"""
+        pixel = self.bpp // 8
+        written = 0
+        for x0, y0, x1, y1 in boxes:
+            data = memoryview(self._encode(image.crop((x0, y0, x1, y1))))
+            row = (x1 - x0) * pixel
+            if row == self.stride:
+                os.pwrite(self.fd, data, y0 * self.stride)
+            else:
+                for y in range(y1 - y0):
+                    os.pwrite(self.fd, data[y * row:(y + 1) * row], (y0 + y) * self.stride + x0 * pixel)
+            written += len(data)
+        return written
+
+    def close(self):
+        os.close(self.fd)
+
+class PngSink:
+    """Image complète réécrite en PNG à chaque changement (captures, contrôle sans écran)"""
+
+    def __init__(self, path: str, size: tuple[int, int] = (1920, 1080)):
+        self.path, self.size = path, size
+
+    def write(self, image, boxes: list[tuple]) -> int:
+        # Remplacement atomique : un lecteur ne voit jamais d'image à moitié écrite
+        tmp = f"{self.path}.tmp"
+        image.save(tmp, format="PNG")
+        os.replace(tmp, self.path)
+        return os.path.getsize(self.path)
+
+    def close(self):
+        pass
+
+def open_sink(target: str, size: tuple[int, int]):
+    """PngSink pour un .png, sinon FramebufferSink (/dev/fbN ou fichier brut)"""
+    if target.lower().endswith(".png"):
+        return PngSink(target, size)
+    return FramebufferSink(target, size)
+
+class FrameRenderer:
+    """Dessine la grille de panneaux avec Pillow, zone par zone.
+
+    Chaque zone (emplacement, pied de page, logo, célébration) garde la clé de ce
+    qu'elle affiche : render() ne redessine que les zones dont la clé a changé, plus
+    celles qui les recouvrent (le logo sur le premier bloc), et renvoie leurs rectangles.
+    """
+
+    BACKGROUND = "#242424"  # fond du thème sombre customtkinter
+    PAD = 14
+    RADIUS = 14
+    # Les tailles de police de l'UI Tk valent pour un écran de 1080 px de haut
+    REFERENCE_HEIGHT = 1080
+    # Cherchées par nom dans les répertoires de polices du système, DejaVu en repli
+    FONTS = {
+        "bold": ("Montserrat-Bold.ttf", "DejaVuSans-Bold.ttf"),
+        "regular": ("Montserrat-Regular.ttf", "DejaVuSans.ttf"),
+        "italic": ("Montserrat-Italic.ttf", "DejaVuSans-Oblique.ttf"),
+    }
+
+    def __init__(self, size: tuple[int, int], columns: int, slot_count: int, logo=None,
+                 assets: AssetCache | None = None, sparkline_height: int = 70):
+        from PIL import Image
+        self.size = size
+        self.image = Image.new("RGB", size, self.BACKGROUND)
+        self.logo = logo
+        self.assets = assets
+        self.scale = size[1] / self.REFERENCE_HEIGHT
+        self.sparkline_height = int(sparkline_height * self.scale)
+        self._fonts = {}
+        self._keys = {}
+        width, height = size
+        # Pied de page réservé à l'horodatage et au numéro de page
+        footer = self.px(43) + 2 * self.PAD
+        rows = math.ceil(slot_count / columns)
+        cell_w, cell_h = width / columns, (height - footer) / rows
+        self.slot_boxes = []
+        for i in range(slot_count):
+            r, c = divmod(i, columns)
+            # Le dernier emplacement d'une rangée incomplète occupe la largeur restante
+            span = columns - c if i == slot_count - 1 else 1
+            self.slot_boxes.append((int(c * cell_w), int(r * cell_h), int((c + span) * cell_w), int((r + 1) * cell_h)))
+        self.footer_box = (0, height - footer, width, height)
+        self.logo_box = (20, 20, 40 + logo.width, 40 + logo.height) if logo is not None else None
+        self.frames = 0
+        self.regions = 0
+
+    def px(self, size: float) -> int:
+        return max(1, int(size * self.scale))
+
+    def font(self, style: str, size: int):
+        font = self._fonts.get((style, size))
+        if font is None:
+            from PIL import ImageFont
+            for name in self.FONTS[style]:
+                try:
+                    font = ImageFont.truetype(name, size)
+                    break
+                except OSError:
+                    continue
+            else:
+                font = ImageFont.load_default(size)
+            self._fonts[(style, size)] = font
+        return font
+
+    def _fit(self, text: str, style: str, size: float, max_width: int):
+        """Police la plus grande (jusqu'à size) dans laquelle text tient sur max_width"""
+        size = self.px(size)
+        font = self.font(style, size)
+        while size > 8 and font.getlength(text) > max_width:
+            size = int(size * 0.9)
+            font = self.font(style, size)
+        return font
+
+    def sparkline_size(self, i: int) -> tuple[int, int]:
+        """Taille de la courbe du jour dans l'emplacement i (même marge que le canvas Tk)"""
+        x0, _, x1, _ = self.slot_boxes[i]
+        return x1 - x0 - 2 * self.PAD - 2 * self.px(24), self.sparkline_height
+
+    def render(self, scene: dict) -> list[tuple]:
+        """Redessine les zones modifiées de scene ; retourne leurs rectangles (vide si rien n'a changé)"""
+        from PIL import ImageDraw
+        celebration = scene.get("celebration")
+        if celebration is not None:
+            regions = [("celebration", (0, 0, *self.size), celebration, self._draw_celebration)]
+        else:
+            if "celebration" in self._keys:
+                # Fin de la célébration : tout l'écran est à refaire
+                self._keys.clear()
+            regions = [(("slot", i), box, key, self._draw_slot)
+                       for i, (box, key) in enumerate(zip(self.slot_boxes, scene["slots"]))]
+            regions.append(("footer", self.footer_box, scene["footer"], self._draw_footer))
+            if self.logo_box is not None:
+                regions.append(("logo", self.logo_box, scene["logo"], self._draw_logo))
+        draw = ImageDraw.Draw(self.image)
+        dirty = []
+        for name, box, key, paint in regions:
+            covered = any(box[0] < d[2] and d[0] < box[2] and box[1] < d[3] and d[1] < box[3] for d in dirty)
+            if name in self._keys and self._keys[name] == key and not covered:
+                continue
+            paint(draw, box, key)
+            self._keys[name] = key
+            dirty.append(box)
+        if dirty:
+            self.frames += 1
+            self.regions += len(dirty)
+        return dirty
+
+    def _draw_slot(self, draw, box, key):
+        draw.rectangle(box, fill=self.BACKGROUND)
+        if key is None:
+            return
+        kind, shown, coords = key
+        pad = self.PAD
+        x0, y0, x1, y1 = box[0] + pad, box[1] + pad, box[2] - pad, box[3] - pad
+        draw.rounded_rectangle((x0, y0, x1, y1), radius=self.RADIUS, fill=shown["background"])
+        cx, width = (x0 + x1) // 2, x1 - x0 - 2 * pad
+        top = y0 + self.px(12)
+        title_font = self._fit(shown["title"], "bold", 49, width)
+        draw.text((cx, top), shown["title"], font=title_font, fill="#000000", anchor="ma")
+        top += title_font.size + self.px(12)
+        bottom = y1
+        if shown["detail"]:
+            if kind == "inspiration":
+                font = self._fit(shown["detail"], "italic", 47, width)
+                bottom -= self.px(20)
+            else:
+                font = self.font("regular", self.px(115))
+                bottom -= self.px(6)
+            draw.text((cx, bottom), shown["detail"], font=font, fill=shown["detail_color"], anchor="md")
+            bottom -= font.size + self.px(6)
+        if coords is not None:
+            bottom -= self.sparkline_height
+            if len(coords) >= 4:
+                left = x0 + pad + self.px(24)
+                points = [(left + coords[n], bottom + coords[n + 1]) for n in range(0, len(coords), 2)]
+                draw.line(points, fill=shown["color"], width=self.px(3), joint="curve")
+        value_font = self._fit(shown["value"], "bold", 151, width)
+        draw.text((cx, (top + bottom) // 2), shown["value"], font=value_font, fill=shown["color"], anchor="mm")
+
+    def _draw_footer(self, draw, box, key):
+        page, timestamp = key
+        draw.rectangle(box, fill=self.BACKGROUND)
+        font = self.font("regular", self.px(43))
+        x0, _, x1, y1 = box
+        if page:
+            draw.text((x0 + 16, y1 - 16), page, font=font, fill="#888888", anchor="ld")
+        if timestamp:
+            draw.text((x1 - 16, y1 - 16), timestamp, font=font, fill="#888888", anchor="rd")
+
+    def _draw_logo(self, draw, box, color):
+        draw.rounded_rectangle(box, radius=12, fill=color)
+        mask = self.logo if self.logo.mode in ("RGBA", "LA") else None
+        self.image.paste(self.logo, (box[0] + 10, box[1] + 10), mask)
+
+    def _draw_celebration(self, draw, box, key):
+        message, positive, gif_path = key
+        draw.rectangle(box, fill="#1B5E20" if positive else "#B71C1C")
+        cx, cy = box[2] // 2, box[3] // 2
+        draw.text((cx, cy - self.px(150)), message, font=self._fit(message, "bold", 73, box[2] - 40),
+                  fill="#FFFFFF", anchor="mm")
+        if self.assets is None:
+            return
+        # Première frame du GIF : pas d'animation sur un framebuffer
+        try:
+            frames, _ = self.assets.frames(gif_path, ConfettiAnimation.GIF_SIZE)
+        except Exception as e:
+            logger.warning(f"GIF de célébration indisponible {gif_path}: {e}")
+            return
+        frame = frames[0]
+        mask = frame if frame.mode in ("RGBA", "LA") else None
+        self.image.paste(frame, (cx - frame.width // 2, cy + self.px(120) - frame.height // 2), mask)
+
+class FramebufferDashboard:
+    """Dashboard sans X ni Tk : même couche données que DashboardApp, rendu par FrameRenderer.
+
+    Tout tourne dans la boucle asyncio : les panneaux reçus mettent l'état à jour,
+    une image est calculée toutes les FRAME_SECONDS et seules les zones modifiées
+    partent vers le sink (/dev/fb0, fichier brut ou PNG).
+    """
+
+    FRAME_SECONDS = 0.25
+    STATE_SAVE_DELAY = 2.0
+    # Durée de la célébration (s), comme _show_celebration_block
+    CELEBRATION_SECONDS = {True: 3.5, False: 2.5}
+
+    def __init__(self, base_url: str, layout: dict, sink, state_file: str = DEFAULT_STATE_FILE,
+                 asset_memory_mb: int = 64, metrics_port: int | None = None, metrics_host: str = "127.0.0.1",
+                 subscribe_url: str | None = None, history_days: float = 1, worker: bool = False,
+                 hours: BusinessHours | None = None):
+        cfgs = self.panels = layout["panels"]
+        self.queries = [panel_key(c) for c in cfgs]
+        self.scrapers, self.fetcher, self.scheduler, self.subscriber = build_data_layer(
+            base_url, cfgs, DashboardApp.REFRESH_DEADLINE, self._on_panel_fetched, self._on_cycle_done,
+            subscribe_url=subscribe_url, worker=worker)
+        self.sink = sink
+        per_page = layout["per_page"]
+        self.pages = [list(range(i, min(i + per_page, len(cfgs)))) for i in range(0, len(cfgs), per_page)]
+        self._page_seconds = layout["page_seconds"]
+        self.page = 0
+        self.last_gift = {i: 0 for i, c in enumerate(cfgs) if c.get("thresholds")}
+        self._theme_idx = next((i for i, c in enumerate(cfgs) if c.get("theme")), None)
+        self._values, self._ratios, self._max_dates, self._last_panels = {}, {}, {}, {}
+        self._history = [PanelHistory(int(history_days * 86400 / 5)) for _ in cfgs]
+        self._sparklines = [Sparkline() if c.get("sparkline", True) else None for c in cfgs]
+        self.celebration = None  # (message, positif, GIF, fin en time.monotonic())
+        self.timestamp = ""
+        self.state_cache = StateCache(state_file)
+        self.history_store = HistoryStore(os.path.join(os.path.dirname(state_file), "history"))
+        self._state_dirty = False
+        self.assets = AssetCache(memory_budget=asset_memory_mb * 1024 * 1024)
+        self.renderer = FrameRenderer(sink.size, layout["columns"], len(self.pages[0]),
+                                      logo=load_logo_image(self.assets), assets=self.assets,
+                                      sparkline_height=DashboardApp.SPARKLINE_HEIGHT)
+        self._metrics_port, self._metrics_host = metrics_port, metrics_host
+        self.hours = hours or BusinessHours()
+        self._awake: asyncio.Event | None = None
+
+    def _on_panel_fetched(self, idx: int, panel: dict):
+        """Appelé dans la boucle asyncio : l'état change tout de suite, l'image à la prochaine frame"""
+        at = panel.get("fetched_at") or time.time()
+        if panel.get("max_date") is not None:
+            self._max_dates[idx] = panel["max_date"]
+        self._last_panels[idx] = {"value": panel["value"], "ratio": panel["ratio"], "fetched_at": at}
+        self._update_panel(idx, panel["value"], panel["ratio"], at)
+        self._state_dirty = True
+
+    def _on_cycle_done(self, stats: dict):
+        if stats["updated"] or stats["unchanged"]:
+            self.timestamp = f"Dernière mise à jour : {datetime.now():%H:%M:%S}"
+
+    def _update_panel(self, idx: int, value: float, ratio: float, at: float):
+        self._values[idx] = value
+        self._ratios[idx] = ratio
+        self._history[idx].append(at, value, ratio)
+        if self._sparklines[idx] is not None:
+            self._sparklines[idx].add(at, value)
+        thresholds = self.panels[idx].get("thresholds")
+        if thresholds:
+            step = thresholds.get("step", 10)
+            current_threshold = threshold_crossed(ratio, step, self.last_gift[idx])
+            if current_threshold is not None:
+                self.last_gift[idx] = current_threshold
+                positive = current_threshold > 0
+                message = f"{current_threshold}% {'Atteint' if positive else 'En Baisse'}"
+                gif_path = ConfettiAnimation.get_appropriate_gif(current_threshold)
+                self.celebration = (message, positive, gif_path,
+                                    time.monotonic() + self.CELEBRATION_SECONDS[positive])
+            elif -step < ratio < step:
+                self.celebration = None
+
+    def _restore_state(self):
+        """Dernières valeurs connues, marquées comme en cache (même cache d'état que l'UI Tk)"""
+        restore_histories(self.history_store, self.queries, self._history, self._sparklines)
+        state = self.state_cache.load()
+        if not state:
+            return
+        if state["queries"] is not None and state["queries"] != self.queries:
+            logger.info("Cache d'état ignoré : la configuration des panneaux a changé")
+            return
+        self.last_gift.update({k: v for k, v in state["last_gift"].items() if k in self.last_gift})
+        self._max_dates.update(state["max_dates"])
+        panels = {idx: p for idx, p in state["panels"].items() if idx < len(self.panels)}
+        for idx in sorted(panels):
+            self._last_panels[idx] = panels[idx]
+            self._update_panel(idx, panels[idx]["value"], panels[idx]["ratio"], panels[idx]["fetched_at"])
+        if panels:
+            cached_at = datetime.fromtimestamp(max(p["fetched_at"] for p in panels.values()))
+            self.timestamp = f"Valeurs en cache du {cached_at:%d/%m %H:%M:%S} – actualisation…"
+
+    def _show_page(self, page: int):
+        self.page = page
+        if len(self.pages) > 1 and self.scheduler is not None:
+            # Seule la page affichée est interrogée à pleine cadence
+            self.scheduler.set_visible(self.pages[page])
+
+    def scene(self) -> dict:
+        """Ce que l'écran doit montrer maintenant, zone par zone"""
+        slots = [None] * len(self.renderer.slot_boxes)
+        for i, idx in enumerate(self.pages[self.page]):
+            theme_idx = idx if self._theme_idx is None else self._theme_idx
+            shown = panel_view(self.panels[idx], self._values.get(idx), self._ratios.get(idx),
+                               self._ratios.get(theme_idx, 0), self._max_dates.get(idx))
+            coords = None
+            sparkline = self._sparklines[idx]
+            if sparkline is not None:
+                sparkline.render(*self.renderer.sparkline_size(i))
+                coords = tuple(sparkline.coords)
+            slots[i] = (self.panels[idx]["detail"], shown, coords)
+        logo = "#FFFFFF"
+        if self._theme_idx in self._ratios:
+            logo = lighten(panel_style(self._ratios[self._theme_idx])[0], 0.9)
+        page = f"{self.page + 1}/{len(self.pages)}" if len(self.pages) > 1 else ""
+        celebration = self.celebration[:3] if self.celebration else None
+        return {"slots": slots, "footer": (page, self.timestamp), "logo": logo, "celebration": celebration}
+
+    def draw(self) -> list[tuple]:
+        """Une frame : zones modifiées redessinées puis écrites dans le sink"""
+        t0 = time.perf_counter()
+        boxes = self.renderer.render(self.scene())
+        if boxes:
+            METRICS.inc("framebuffer_bytes_total", self.sink.write(self.renderer.image, boxes))
+            METRICS.observe("framebuffer_frame_seconds", time.perf_counter() - t0)
+        return boxes
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._restore_state()
+        self._show_page(0)
+        self.draw()
+        self._awake = asyncio.Event()
+        self._awake.set()
+        if self.hours:
+            asyncio.ensure_future(follow_business_hours(self.hours, self.scheduler, self._on_power_change))
+        asyncio.ensure_future((self.subscriber or self.scheduler).run())
+        asyncio.ensure_future(monitor_loop_lag())
+        METRICS.register_collector(lambda: [
+            ("panel_history_bytes", sum(h.nbytes for h in self._history), {}),
+        ])
+        if self._metrics_port:
+            asyncio.ensure_future(METRICS.serve(self._metrics_host, self._metrics_port))
+        page_due = loop.time() + self._page_seconds
+        saved_at = loop.time()
+        try:
+            while True:
+                await asyncio.sleep(self.FRAME_SECONDS)
+                if not self._awake.is_set():
+                    await self._awake.wait()
+                    page_due = loop.time() + self._page_seconds
+                now = loop.time()
+                if len(self.pages) > 1 and now >= page_due:
+                    self._show_page((self.page + 1) % len(self.pages))
+                    page_due = now + self._page_seconds
+                if self.celebration and time.monotonic() >= self.celebration[3]:
+                    self.celebration = None
+                self.draw()
+                if self._state_dirty and now - saved_at >= self.STATE_SAVE_DELAY:
+                    # Écriture disque hors de la boucle
+                    self._state_dirty, saved_at = False, now
+                    state = {"panels": dict(self._last_panels), "max_dates": dict(self._max_dates),
+                             "last_gift": dict(self.last_gift), "queries": list(self.queries)}
+                    loop.run_in_executor(None, self.state_cache.save, state)
+                    loop.run_in_executor(None, self.history_store.append,
+                                         self.history_store.pending(self.queries, self._history))
+        finally:
+            if isinstance(self.scheduler, PanelWorker):
+                await self.scheduler.aclose()
+            await RedashScraper.connections.aclose()
+            self.sink.close()
+
+    def _on_power_change(self, asleep: bool):
+        """Veille : plus aucune frame calculée ni écrite, images décodées libérées"""
+        if asleep:
+            self._awake.clear()
+            self.celebration = None
+            self.assets.clear()
+            self.timestamp = f"En veille jusqu'à {self.hours.next_opening()}"
+            self.draw()
+        else:
+            self.timestamp = "Reprise – actualisation…"
+            self._awake.set()
+
 # ─────────────────────────────────────────────
 # Main
 # ─────────────────────────────────────────────
 
 def main():
+    profile = StartupProfile()
+    profile.mark("imports")
+    parser = argparse.ArgumentParser(description="Dashboard Ventes Redash")
+    parser.add_argument("--serve", action="store_true",
+                        help="démon sans écran : interroge Redash et diffuse les panneaux aux écrans abonnés")
+    parser.add_argument("--subscribe", metavar="URL",
+                        help="écran abonné à un démon --serve (ex. http://pi-central:8765/events)")
+    parser.add_argument("--worker", action="store_true",
+                        help="interroge Redash depuis un processus fils supervisé (ou DASHBOARD_WORKER=1)")
+    parser.add_argument("--framebuffer", metavar="CIBLE",
+                        help="rendu Pillow sans X vers /dev/fb0, un fichier brut ou un .png (ou DASHBOARD_FRAMEBUFFER)")
+    parser.add_argument("--debug", action="store_true",
+                        help="logs DEBUG : touches, requêtes une à une, requêtes HTTP (ou DASHBOARD_DEBUG=1)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="affiche la durée de chaque phase du démarrage, jusqu'au premier affichage et au-delà")
+    args = parser.parse_args()
+
     load_dotenv()
+    # Logs écrits par un thread dédié ; au-delà de LOG_BURST messages semblables par
+    # fenêtre de LOG_INTERVAL secondes, une seule ligne de résumé (LOG_BURST=0 : tout écrire)
+    setup_logging(
+        debug=args.debug or os.getenv("DASHBOARD_DEBUG", "").strip().lower() in ("1", "true", "yes", "oui"),
+        burst=int(os.getenv("LOG_BURST", "5")),
+        interval=float(os.getenv("LOG_INTERVAL", "60")),
+    )
+    subscribe_url = args.subscribe or os.getenv("DASHBOARD_SUBSCRIBE", "").strip() or None
     base_url = os.getenv("REDASH_BASE_URL", "").strip()
-    if not base_url:
+    if not base_url and not subscribe_url:
         raise SystemExit("REDASH_BASE_URL manquant dans .env")
-    cfgs = [
-        {"id": 111, "api_key": os.getenv("KEY_EVOL", ""), "mapping": {"value": "EVOL", "ratio": "EVOL"}},
-        {"id": 110, "api_key": os.getenv("KEY_CA_J1", ""), "mapping": {"value": "CA", "ratio": "AVG"}},
-        {"id": 109, "api_key": os.getenv("KEY_CA_JN", ""), "mapping": {"value": "CA", "ratio": "AVG"}},
-    ]
-    DashboardApp(base_url, cfgs).mainloop()
+    # Fraîcheur maximale (s) exigée de Redash ; vide = dernier résultat en cache
+    max_age = os.getenv("REDASH_MAX_AGE", "").strip()
+    max_age = int(max_age) if max_age else None
+    # Panneaux, pages et cadences : DASHBOARD_PANELS (JSON), sinon les trois panneaux historiques
+    layout = load_panels(os.getenv("DASHBOARD_PANELS", "").strip() or None, max_age)
+    # Client HTTP partagé : pool, keep-alive et délais (s) ; HTTP/2 automatique si h2 est installé
+    http2 = os.getenv("HTTP2", "auto").strip().lower()
+    RedashScraper.connections = HttpConnections(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "6")),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+        connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+        read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "10")),
+        pool_timeout=float(os.getenv("HTTP_POOL_TIMEOUT", "10")),
+        http2=None if http2 == "auto" else http2 in ("1", "true", "yes", "oui"),
+    )
+    PanelFetcher.STREAM_DECODE = os.getenv("REDASH_DECODE", "stream").strip().lower() != "full"
+    # Lecture groupée : un appel au dashboard Redash par cycle au lieu d'un par panneau
+    dashboard_slug = os.getenv("REDASH_DASHBOARD", "").strip()
+    if dashboard_slug:
+        user_api_key = os.getenv("REDASH_USER_API_KEY", "").strip()
+        if not user_api_key:
+            raise SystemExit("REDASH_USER_API_KEY manquant dans .env (requis par REDASH_DASHBOARD)")
+        PanelFetcher.DASHBOARD = (dashboard_slug, user_api_key)
+    # Enregistrement des réponses Redash pour rejouer une journée avec soak.py
+    PanelFetcher.RECORD_PATH = os.getenv("REDASH_RECORD", "").strip() or None
+    # Requêtes paramétrées : résultats partagés entre panneaux pendant REDASH_CACHE_TTL secondes
+    PanelFetcher.RESULT_TTL = float(os.getenv("REDASH_CACHE_TTL", "10"))
+    PanelFetcher.RESULT_CACHE_SIZE = int(os.getenv("REDASH_CACHE_SIZE", "64"))
+    metrics_port = os.getenv("METRICS_PORT", "").strip()
+    metrics_port = int(metrics_port) if metrics_port else None
+    metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+    # Heures d'ouverture (ex. "lun-sam 07:30-20:30, dim 09:00-13:00") ; vide = toujours actif
+    try:
+        hours = BusinessHours(os.getenv("DASHBOARD_HOURS", ""))
+    except ValueError as e:
+        raise SystemExit(f"DASHBOARD_HOURS invalide : {e}")
+
+    if args.serve:
+        if not base_url:
+            raise SystemExit("REDASH_BASE_URL manquant dans .env")
+        host = os.getenv("BROADCAST_HOST", "0.0.0.0")
+        port = int(os.getenv("BROADCAST_PORT", "8765"))
+        asyncio.run(serve_panels(base_url, layout["panels"], host, port, DashboardApp.REFRESH_DEADLINE,
+                                 metrics_port=metrics_port, metrics_host=metrics_host, hours=hours))
+        return
+
+    state_file = os.getenv("DASHBOARD_STATE_FILE", "").strip() or DEFAULT_STATE_FILE
+    history_days = float(os.getenv("HISTORY_DAYS", "1"))
+    asset_memory_mb = int(os.getenv("ASSET_MEMORY_MB", "64"))
+    worker = args.worker or os.getenv("DASHBOARD_WORKER", "").strip().lower() in ("1", "true", "yes", "oui")
+    framebuffer = args.framebuffer or os.getenv("DASHBOARD_FRAMEBUFFER", "").strip() or None
+    if framebuffer:
+        # Taille de l'image pour un .png ou un fichier brut ; /dev/fbN donne la sienne
+        size = tuple(int(v) for v in os.getenv("FRAMEBUFFER_SIZE", "1920x1080").lower().split("x"))
+        sink = open_sink(framebuffer, size)
+        try:
+            asyncio.run(FramebufferDashboard(
+                base_url, layout, sink, state_file=state_file, asset_memory_mb=asset_memory_mb,
+                metrics_port=metrics_port, metrics_host=metrics_host, subscribe_url=subscribe_url,
+                history_days=history_days, worker=worker, hours=hours,
+            ).run())
+        except KeyboardInterrupt:
+            pass
+        return
+    if ctk is None:
+        raise SystemExit("Tk/customtkinter indisponibles : installer python3-tk et customtkinter, ou utiliser --framebuffer")
+    profile.mark("configuration")
+    DashboardApp(
+        base_url, layout, state_file=state_file, asset_memory_mb=asset_memory_mb,
+        metrics_port=metrics_port, metrics_host=metrics_host, subscribe_url=subscribe_url,
+        profile=profile, print_profile=args.profile_startup, history_days=history_days, worker=worker,
+        hours=hours,
+    ).mainloop()
 
 if __name__ == "__main__":
     main()
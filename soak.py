@@ -0,0 +1,494 @@
+"""Test d'endurance du dashboard : rejoue des réponses Redash enregistrées et surveille la mémoire.
+
+Une journée réelle s'enregistre avec REDASH_RECORD=journee.jsonl python dashboard.py ;
+`synth` en fabrique une, avec des paliers de célébration franchis. Le rejeu passe par
+toute la chaîne (transport HTTP simulé, RedashScraper, PanelFetcher, UpdateBus,
+panneaux, célébrations) à --speed fois la vitesse réelle. tracemalloc, RSS et objets
+Tk sont échantillonnés ; le script échoue si leur croissance après l'échauffement
+dépasse le budget.
+
+Les panneaux sont retrouvés par leur clé (id de la requête et paramètres) : deux jeux
+de paramètres de la même requête sont servis et affichés séparément.
+
+    python soak.py synth journee.jsonl --hours 24
+    python soak.py replay journee.jsonl --speed 500 --loops 7 --output soak.json
+    python soak.py check
+    xvfb-run python soak.py replay journee.jsonl --display
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+import dashboard
+from bench import NullAnimation, NullWidget
+from dashboard import (
+    DashboardApp,
+    HttpConnections,
+    PanelFetcher,
+    PanelHistory,
+    RedashScraper,
+    Sparkline,
+    UpdateBus,
+    WidgetState,
+    load_panels,
+    panel_key,
+)
+
+
+# ─────────────────────────────────────────────
+# Enregistrements
+# ─────────────────────────────────────────────
+
+def record_key(record: dict) -> int | str:
+    """Clé du panneau d'un enregistrement, comme panel_key() pour la configuration"""
+    return panel_key({"id": record["query"], "parameters": record.get("parameters")})
+
+
+def load_records(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+def synthesize(path: str, layout: dict, hours: float, change_every: float, seed: int = 1) -> int:
+    """Journée fictive : chaque panneau interrogé à son intervalle, résultat renouvelé toutes les change_every s.
+
+    Le ratio des panneaux à paliers monte puis redescend pour franchir plusieurs
+    seuils dans les deux sens ; les autres suivent une marche aléatoire.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 7, 10, 6, 0, tzinfo=timezone.utc).timestamp()
+    duration = hours * 3600
+    lines = []
+    for idx, panel in enumerate(layout["panels"]):
+        mapping = panel["mapping"]
+        step = (panel.get("thresholds") or {}).get("step", 10)
+        value, result_id, published = rng.uniform(1000, 5000), idx * 1_000_000, None
+        t = 0.0
+        while t < duration:
+            if published is None or t - published >= change_every:
+                published, result_id = t, result_id + 1
+                phase = t / duration
+                # Montée jusqu'à 2,5 paliers à mi-journée, puis descente sous -1,5 palier
+                ratio = step * (2.5 * min(1.0, 2 * phase) - 8 * max(0.0, phase - 0.5)) + rng.uniform(-1, 1)
+                value = max(0.0, value * (1 + rng.uniform(-0.01, 0.03)))
+                at = datetime.fromtimestamp(start + t, timezone.utc)
+                data = {"query_result": {
+                    "id": result_id,
+                    "retrieved_at": at.isoformat(),
+                    "data": {"rows": [{
+                        mapping["value"]: ratio if panel["format"] == "evolution" else value,
+                        mapping["ratio"]: ratio,
+                        "MAX_DATE": (at - timedelta(days=364)).strftime("%Y-%m-%d %H:%M"),
+                    }]},
+                }}
+            else:
+                data = None  # réponse inchangée
+            line = {"t": start + t, "query": panel["id"]}
+            if panel.get("parameters") is not None:
+                line["parameters"] = panel["parameters"]
+            line["data"] = data
+            lines.append(line)
+            t += panel["interval"]
+    lines.sort(key=lambda r: r["t"])
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    return len(lines)
+
+
+class RecordedRedash:
+    """Sert via httpx.MockTransport la dernière réponse publiée de chaque requête et jeu de paramètres"""
+
+    def __init__(self):
+        self.current: dict[int | str, tuple[int, bytes]] = {}
+
+    def publish(self, record: dict) -> bool:
+        """Publie un enregistrement ; False s'il n'y a encore rien à servir pour ce panneau"""
+        key = record_key(record)
+        if record.get("error"):
+            self.current[key] = (500, json.dumps({"message": record["error"]}).encode())
+        elif record["data"] is not None:
+            self.current[key] = (200, json.dumps(record["data"]).encode())
+        # "data": null : réponse inchangée, le corps précédent est resservi
+        return key in self.current
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        query_id = int(request.url.path.split("/")[3])
+        # Requête paramétrée : les paramètres sont dans le corps du POST
+        parameters = json.loads(request.content).get("parameters") if request.content else None
+        key = panel_key({"id": query_id, "parameters": parameters})
+        status, body = self.current.get(key, (404, b"{}"))
+        return httpx.Response(status, content=body, headers={"Content-Type": "application/json"})
+
+    def install(self):
+        RedashScraper.connections = HttpConnections(transport=httpx.MockTransport(self.handler))
+
+
+# ─────────────────────────────────────────────
+# Hôtes : DashboardApp réel (--display) ou sans Tk
+# ─────────────────────────────────────────────
+
+class HeadlessHost:
+    """Chemin de mise à jour de DashboardApp (UpdateBus, _apply_panel, _update_quad) sans Tk"""
+
+    COLORS = DashboardApp.COLORS
+    _on_panel_fetched = DashboardApp._on_panel_fetched
+    _apply_panel = DashboardApp._apply_panel
+    _update_quad = DashboardApp._update_quad
+    _render_slot = DashboardApp._render_slot
+    _draw_sparkline = DashboardApp._draw_sparkline
+    _style = staticmethod(DashboardApp._style)
+    _show_celebration_block = DashboardApp._show_celebration_block
+    _hide_celebration_block = DashboardApp._hide_celebration_block
+    _update_logo_background = DashboardApp._update_logo_background
+    _reset_test_state = DashboardApp._reset_test_state
+
+    def __init__(self, layout: dict, history_days: float):
+        cfgs = self.panels = layout["panels"]
+        self.queries = [c["id"] for c in cfgs]
+        self.last_gift = {i: 0 for i, c in enumerate(cfgs) if c.get("thresholds")}
+        self._theme_idx = next((i for i, c in enumerate(cfgs) if c.get("theme")), None)
+        self._values = {}
+        self._history = [PanelHistory(int(history_days * 86400 / 5)) for _ in cfgs]
+        self._sparklines = [Sparkline() if c.get("sparkline", True) else None for c in cfgs]
+        self._last_max_dates = {}
+        self._last_ratios = {}
+        self._last_panels = {}
+        self.test_mode = False
+        self.view = WidgetState()
+        self.updates = UpdateBus()
+        self._render_count = 0
+        self.confetti_animation = NullAnimation()
+        self.logo_bg = NullWidget()
+        # Première page seulement : les autres panneaux sont mis à jour sans être affichés
+        self._slots = {}
+        for i, idx in enumerate(range(min(layout["per_page"], len(cfgs)))):
+            self._slots[i] = {name: NullWidget() for name in ("frame", "val", "title", "detail", "spark")}
+            self._slots[i].update(idx=idx, line=1, line_color=None, drawn=None, layout=None)
+        self._visible = {slot["idx"]: i for i, slot in self._slots.items()}
+
+    def after(self, ms, func=None, *args):
+        return None
+
+    def _schedule_state_save(self):
+        pass
+
+
+def tk_counts(app) -> dict:
+    """Widgets, items de canvas, images Tk et after() en attente (thread Tk uniquement)"""
+    widgets = items = 0
+    stack = [app]
+    while stack:
+        widget = stack.pop()
+        widgets += 1
+        stack.extend(widget.winfo_children())
+        if isinstance(widget, dashboard.tk.Canvas):
+            items += len(widget.find_all())
+    return {
+        "widgets": widgets,
+        "canvas_items": items,
+        "images": len(app.tk.splitlist(app.tk.call("image", "names"))),
+        "after": len(app.tk.splitlist(app.tk.call("after", "info"))),
+    }
+
+
+# ─────────────────────────────────────────────
+# Rejeu et échantillons
+# ─────────────────────────────────────────────
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        # Pic et non valeur courante hors Linux (ko sous Linux, octets sous macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class Soak:
+    def __init__(self, records: list[dict], layout: dict, speed: float, loops: int, max_gap: float,
+                 sample_seconds: float):
+        self.records = records
+        self.layout = layout
+        self.speed = speed
+        self.loops = loops
+        self.max_gap = max_gap
+        self.sample_seconds = sample_seconds
+        # Clé -> panneaux : plusieurs panneaux peuvent afficher le même résultat
+        self.index: dict[int | str, list[int]] = {}
+        for i, c in enumerate(layout["panels"]):
+            self.index.setdefault(panel_key(c), []).append(i)
+        self.redash = RecordedRedash()
+        self.events = 0
+        self.celebrations = 0
+        self.virtual_seconds = 0.0
+        self.samples = []
+        self.done = threading.Event()
+        self._started = time.perf_counter()
+
+    def sample(self, host, counts: dict):
+        self.samples.append({
+            "elapsed_s": time.perf_counter() - self._started,
+            "virtual_h": self.virtual_seconds / 3600,
+            "events": self.events,
+            "heap_bytes": tracemalloc.get_traced_memory()[0],
+            "rss_bytes": rss_bytes(),
+            "celebrations": self.celebrations,
+            "tk": counts,
+        })
+
+    def count_celebrations(self, host):
+        start_animation = host.confetti_animation.start_animation
+
+        def counted(*args, **kwargs):
+            self.celebrations += 1
+            return start_animation(*args, **kwargs)
+
+        host.confetti_animation.start_animation = counted
+
+    def scale_result_cache(self, fetcher: PanelFetcher):
+        """Le cache des requêtes paramétrées compte en temps réel : durée ramenée à la vitesse du rejeu"""
+        fetcher.results.ttl = PanelFetcher.RESULT_TTL / self.speed
+
+    async def replay(self, host, fetcher: PanelFetcher, on_event=None):
+        """Rejoue les enregistrements loops fois ; un nouveau tour est une nouvelle journée (paliers remis à zéro)"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(self.loops):
+            host.updates.post("soak_day", host._reset_test_state)
+            previous = None
+            for record in self.records:
+                indices = self.index.get(record_key(record))
+                if indices is None:
+                    continue
+                if previous is not None:
+                    self.virtual_seconds += min(self.max_gap, max(0.0, record["t"] - previous))
+                    # Horloge virtuelle : le temps de traitement est pris sur l'attente
+                    delay = started + self.virtual_seconds / self.speed - loop.time()
+                    if delay > 0.001:
+                        await asyncio.sleep(delay)
+                previous = record["t"]
+                if self.redash.publish(record):
+                    await fetcher.refresh(deadline=DashboardApp.REFRESH_DEADLINE, indices=indices)
+                self.events += 1
+                if on_event:
+                    on_event()
+        self.done.set()
+
+    def run_headless(self, history_days: float):
+        host = HeadlessHost(self.layout, history_days)
+        self.count_celebrations(host)
+        scrapers = [RedashScraper(c["api_key"], "http://redash.soak") for c in self.layout["panels"]]
+        fetcher = PanelFetcher(scrapers, self.layout["panels"], host._on_panel_fetched)
+        self.scale_result_cache(fetcher)
+        last = [time.perf_counter()]
+
+        def on_event():
+            # Une frame Tk par événement : l'UpdateBus est vidé comme par _pump_updates
+            host.updates.drain()
+            if time.perf_counter() - last[0] >= self.sample_seconds:
+                last[0] = time.perf_counter()
+                self.sample(host, {})
+
+        async def run():
+            self.sample(host, {})
+            await self.replay(host, fetcher, on_event)
+            host.updates.drain()
+            self.sample(host, {})
+            await RedashScraper.connections.aclose()
+
+        asyncio.run(run())
+        return host
+
+    def run_display(self, history_days: float):
+        state_dir = tempfile.mkdtemp(prefix="soak-state-")
+        app = DashboardApp("http://redash.soak", self.layout, state_file=os.path.join(state_dir, "state.json"),
+                           history_days=history_days)
+        # Seul le rejeu interroge le faux Redash
+        app.scheduler.paused = True
+        self.scale_result_cache(app.fetcher)
+        self.count_celebrations(app)
+        app.after(500, lambda: asyncio.run_coroutine_threadsafe(self.replay(app, app.fetcher), app.loop))
+
+        def tick():
+            self.sample(app, tk_counts(app))
+            if self.done.is_set():
+                app._on_close()
+                return
+            app.after(int(self.sample_seconds * 1000), tick)
+
+        app.after(int(self.sample_seconds * 1000), tick)
+        app.mainloop()
+
+
+def growth(samples: list[dict], warmup: float) -> dict:
+    """Croissance entre le début et la fin de la partie stable (médianes de 3 échantillons)"""
+    stable = samples[int(len(samples) * warmup):]
+    if len(stable) < 2:
+        return {}
+    head, tail = stable[:3], stable[-3:]
+
+    def median(values):
+        return sorted(values)[len(values) // 2]
+
+    result = {
+        "heap_mb": (median([s["heap_bytes"] for s in tail]) - median([s["heap_bytes"] for s in head])) / 2**20,
+        "rss_mb": (median([s["rss_bytes"] for s in tail]) - median([s["rss_bytes"] for s in head])) / 2**20,
+    }
+    for key in stable[-1]["tk"]:
+        result[f"tk_{key}"] = median([s["tk"][key] for s in tail]) - median([s["tk"][key] for s in head])
+    return result
+
+
+def over_budget(measured: dict, args) -> list[str]:
+    failures = []
+    if measured.get("heap_mb", 0) > args.max_heap_growth_mb:
+        failures.append(f"tas Python +{measured['heap_mb']:.2f} Mo (budget {args.max_heap_growth_mb} Mo)")
+    if measured.get("rss_mb", 0) > args.max_rss_growth_mb:
+        failures.append(f"RSS +{measured['rss_mb']:.2f} Mo (budget {args.max_rss_growth_mb} Mo)")
+    for key, value in measured.items():
+        if key.startswith("tk_") and value > args.max_tk_growth:
+            failures.append(f"{key} +{value} (budget {args.max_tk_growth})")
+    return failures
+
+
+def check_parameter_sets() -> list[str]:
+    """Synthèse puis rejeu de deux jeux de paramètres de la même requête : chaque panneau garde les siens"""
+    workdir = tempfile.mkdtemp(prefix="soak-check-")
+    panels_path, records_path = os.path.join(workdir, "panels.json"), os.path.join(workdir, "journee.jsonl")
+    with open(panels_path, "w", encoding="utf-8") as f:
+        json.dump({"columns": 2, "per_page": 2, "panels": [
+            {"id": 130, "api_key": "soak", "mapping": {"value": "CA", "ratio": "EVOL"}, "title": "CA {magasin}",
+             "interval": 60, "parameters": [{"magasin": "Paris"}, {"magasin": "Lyon"}]},
+        ]}, f)
+    layout = load_panels(panels_path)
+    synthesize(records_path, layout, hours=2, change_every=300)
+    records = load_records(records_path)
+    # Dernière valeur publiée pour chaque jeu de paramètres
+    expected = {}
+    for record in records:
+        if record["data"] is not None:
+            expected[record_key(record)] = record["data"]["query_result"]["data"]["rows"][0]["CA"]
+    soak = Soak(records, layout, speed=1e6, loops=1, max_gap=300, sample_seconds=3600)
+    soak.redash.install()
+    host = soak.run_headless(history_days=0.05)
+    failures = []
+    if len(set(expected.values())) != len(layout["panels"]):
+        failures.append(f"enregistrement synthétique sans valeur distincte par jeu : {expected}")
+    for idx, panel in enumerate(layout["panels"]):
+        got, want = host._values.get(idx), expected.get(panel_key(panel))
+        if got != want:
+            failures.append(f"{panel['title']} : {got} affiché au lieu de {want}")
+    return failures
+
+
+# ─────────────────────────────────────────────
+# Main
+# ─────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--panels", help="configuration des panneaux (défaut : DASHBOARD_PANELS ou les trois historiques)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    synth = sub.add_parser("synth", help="fabrique un enregistrement fictif")
+    synth.add_argument("path")
+    synth.add_argument("--hours", type=float, default=24.0, help="durée simulée (h)")
+    synth.add_argument("--change-every", type=float, default=300.0, help="renouvellement des résultats Redash (s)")
+
+    sub.add_parser("check", help="rejoue deux jeux de paramètres d'une même requête et vérifie l'affichage")
+
+    replay = sub.add_parser("replay", help="rejoue un enregistrement et vérifie la stabilité mémoire")
+    replay.add_argument("path")
+    replay.add_argument("--output", help="fichier JSON de sortie (défaut : stdout)")
+    replay.add_argument("--display", action="store_true", help="vrai DashboardApp Tk (écran ou Xvfb requis)")
+    replay.add_argument("--speed", type=float, default=500.0, help="accélération du temps (100 à 1000)")
+    replay.add_argument("--loops", type=int, default=3, help="nombre de rejeux (une journée chacun)")
+    replay.add_argument("--max-gap", type=float, default=300.0, help="écart maximal entre deux réponses (s simulées)")
+    replay.add_argument("--sample-seconds", type=float, default=1.0, help="période d'échantillonnage (s réelles)")
+    replay.add_argument("--history-days", type=float, default=0.05,
+                        help="historique des panneaux : petit pour qu'il soit plein dès l'échauffement")
+    replay.add_argument("--warmup", type=float, default=0.25, help="part des échantillons ignorée au début")
+    replay.add_argument("--max-heap-growth-mb", type=float, default=2.0)
+    replay.add_argument("--max-rss-growth-mb", type=float, default=16.0)
+    replay.add_argument("--max-tk-growth", type=int, default=20, help="croissance tolérée de chaque compteur Tk")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    layout = load_panels(args.panels or os.getenv("DASHBOARD_PANELS", "").strip() or None)
+    for panel in layout["panels"]:
+        panel["api_key"] = "soak"
+
+    if args.command == "synth":
+        count = synthesize(args.path, layout, args.hours, args.change_every)
+        print(f"{count} réponses écrites dans {args.path}")
+        return
+
+    dashboard.logger.setLevel("WARNING")
+    logging.getLogger("httpx").setLevel("WARNING")
+    # Contrôle de correction avant le rejeu : un panneau mal aiguillé fausserait le scénario
+    failures = check_parameter_sets()
+    for line in failures:
+        print(f"REJEU {line}", file=sys.stderr)
+    if failures or args.command == "check":
+        sys.exit(1 if failures else 0)
+
+    records = load_records(args.path)
+    soak = Soak(records, layout, args.speed, args.loops, args.max_gap, args.sample_seconds)
+    soak.redash.install()
+    tracemalloc.start()
+    if args.display:
+        soak.run_display(args.history_days)
+    else:
+        soak.run_headless(args.history_days)
+    tracemalloc.stop()
+
+    measured = growth(soak.samples, args.warmup)
+    failures = over_budget(measured, args)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "display": args.display,
+            "records": len(records),
+            "speed": args.speed,
+            "loops": args.loops,
+        },
+        "events": soak.events,
+        "virtual_hours": soak.virtual_seconds / 3600,
+        "celebrations": soak.celebrations,
+        "growth": measured,
+        "failures": failures,
+        "samples": soak.samples,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for line in failures:
+        print(f"DÉPASSEMENT {line}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()